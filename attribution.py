@@ -0,0 +1,98 @@
+from math import factorial
+
+import numpy as np
+import plotly.graph_objs as go
+
+from batch_calculations import (DMPIM_CONV_RATES, NETEN_CONV_RATES, flatten_inputs, make_batch, pop_sizes_array,
+                                perform_batch_calculations, cumulative_efficiency_gain)
+from dashboard_helpers import YEARS, MANUAL_NETEN_POP_SIZES
+
+# Groups of dashboard.py inputs that attribution splits a change across
+INPUT_GROUPS = {
+    'Starting populations': ['neten_start_pop', 'dmpim_start_pop', 'dmpsc_start_pop', 'neten_pop_sizes'],
+    'Cost per visit': ['cost_per_visit'],
+    'NET-EN visits': ['neten_num_visits'],
+    'NET-EN product cost': ['neten_product_cost'],
+    'DMPA-IM visits': ['dmpim_num_visits'],
+    'DMPA-IM product cost': ['dmpim_product_cost'],
+    'DMPA-SC visits': ['dmpsc_num_visits'],
+    'DMPA-SC product cost': ['dmpsc_product_cost'],
+    'DMPA-SC first visit multiplier': ['dmpsc_first_visit_multiplier'],
+    'DMPA-IM to DMPA-SC conversion': DMPIM_CONV_RATES,
+    'NET-EN to DMPA-SC conversion': NETEN_CONV_RATES,
+    'Population sizes (manual)': ['user_pop_sizes'],
+}
+
+def _scenario_values(inputs):
+    """Every attributable input of a scenario, with user_pop_sizes as a (YEARS, 3) array."""
+    values = flatten_inputs(inputs)
+    values['dmpsc_start_pop'] = inputs['start_pops'][2] if len(inputs['start_pops']) > 2 else 0
+    values['neten_pop_sizes'] = np.asarray(inputs.get('neten_pop_sizes') or MANUAL_NETEN_POP_SIZES, dtype=float)
+    pop_sizes = pop_sizes_array(inputs.get('user_pop_sizes'))
+    values['user_pop_sizes'] = np.full((YEARS, 3), np.nan) if pop_sizes is None else pop_sizes[0]
+    return values
+
+def shapley_weights(k):
+    """Weight of a coalition of each size s < k in the Shapley value: s! (k - s - 1)! / k!."""
+    return np.array([factorial(s) * factorial(k - s - 1) / factorial(k) for s in range(k)])
+
+def shapley_values(values, k):
+    """Exact Shapley values from the metric of all 2^k coalitions (bit j of the index = group j)."""
+    index = np.arange(2 ** k)
+    members = (index[:, None] >> np.arange(k)) & 1
+    weights = shapley_weights(k)[np.maximum(members.sum(axis=1) - 1, 0)]
+    marginal = values[:, None] - values[index[:, None] ^ (1 << np.arange(k))]
+    return (marginal * members * weights[:, None]).sum(axis=0)
+
+def attribute_change(inputs_a, inputs_b, metric=cumulative_efficiency_gain, groups=None):
+    """Split the change in a metric from scenario A to scenario B into Shapley contributions.
+
+    Every coalition of input groups (taking B's values for the groups in the
+    coalition and A's for the rest) is evaluated in one batch, so 2^k model
+    runs for the k groups that differ between the scenarios. The
+    contributions sum to the metric of B minus that of A. Returns
+    {'start', 'end', 'contributions': {group: contribution}}.
+    """
+    mode = inputs_a.get('mode', 'static')
+    if inputs_b.get('mode', 'static') != mode:
+        raise ValueError("Both scenarios must use the same conversion mode")
+    groups = groups or INPUT_GROUPS
+    values_a, values_b = _scenario_values(inputs_a), _scenario_values(inputs_b)
+    changed = [name for name, parameters in groups.items()
+               if any(not np.array_equal(values_a[p], values_b[p], equal_nan=True) for p in parameters)]
+    k = len(changed)
+
+    members = ((np.arange(2 ** k)[:, None] >> np.arange(k)) & 1).astype(bool)
+    overrides = {name: value for name, value in values_a.items()}
+    for j, name in enumerate(changed):
+        for p in groups[name]:
+            take_b = members[:, j].reshape((-1,) + (1,) * np.ndim(values_a[p]))
+            overrides[p] = np.where(take_b, values_b[p], values_a[p])
+    outputs = metric(perform_batch_calculations(make_batch(dict(inputs_a, mode=mode), 2 ** k, **overrides)))
+
+    return {
+        'start': outputs[0],
+        'end': outputs[-1],
+        'contributions': dict(zip(changed, shapley_values(outputs, k))),
+    }
+
+def create_waterfall_chart(attribution, name_a='Scenario A', name_b='Scenario B'):
+    """Create a waterfall chart from the start value through each group's contribution to the end value."""
+    contributions = attribution['contributions']
+    fig = go.Figure(go.Waterfall(
+        x=[name_a] + list(contributions) + [name_b],
+        measure=['absolute'] + ['relative'] * len(contributions) + ['total'],
+        y=[v / 1e9 for v in [attribution['start'], *contributions.values(), 0]],
+        increasing=dict(marker=dict(color='#2ca02c')),
+        decreasing=dict(marker=dict(color='#d62728')),
+        totals=dict(marker=dict(color='#003f5c')),
+    ))
+
+    fig.update_layout(
+        title=f'Change in 4-year efficiency gain from {name_a} to {name_b}',
+        yaxis_title='Billions of Rand',
+        yaxis=dict(tickformat=".2f"),
+        showlegend=False
+    )
+
+    return fig
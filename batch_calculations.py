@@ -0,0 +1,338 @@
+import tracemalloc
+
+import numpy as np
+
+from dashboard_helpers import YEARS, MANUAL_NETEN_POP_SIZES, outcome_series
+
+# Scalar model inputs of dashboard.py, flattened to one name per form field
+PARAMETERS = [
+    'neten_start_pop', 'dmpim_start_pop', 'cost_per_visit',
+    'neten_num_visits', 'neten_product_cost',
+    'dmpim_num_visits', 'dmpim_product_cost',
+    'dmpsc_num_visits', 'dmpsc_product_cost', 'dmpsc_first_visit_multiplier',
+] + [f'dmpim_conv_rate_{i + 1}' for i in range(YEARS)] + [f'neten_conv_rate_{i + 1}' for i in range(YEARS)]
+
+PARAMETER_LABELS = {
+    'neten_start_pop': 'NET-EN Starting Population',
+    'dmpim_start_pop': 'DMPA-IM Starting Population',
+    'cost_per_visit': 'Cost per Visit',
+    'neten_num_visits': 'NET-EN Number of Visits',
+    'neten_product_cost': 'NET-EN Product Cost',
+    'dmpim_num_visits': 'DMPA-IM Number of Visits',
+    'dmpim_product_cost': 'DMPA-IM Product Cost',
+    'dmpsc_num_visits': 'DMPA-SC Number of Visits',
+    'dmpsc_product_cost': 'DMPA-SC Product Cost',
+    'dmpsc_first_visit_multiplier': 'DMPA-SC First Visit Multiplier',
+    **{f'dmpim_conv_rate_{i + 1}': f'DMPA-IM to DMPA-SC Conversion Year {i + 1} (%)' for i in range(YEARS)},
+    **{f'neten_conv_rate_{i + 1}': f'NET-EN to DMPA-SC Conversion Year {i + 1} (%)' for i in range(YEARS)},
+}
+
+DMPIM_CONV_RATES = [f'dmpim_conv_rate_{i + 1}' for i in range(YEARS)]
+NETEN_CONV_RATES = [f'neten_conv_rate_{i + 1}' for i in range(YEARS)]
+
+# Result series of perform_batch_calculations, as (group, key) with group None for top-level series
+COST_KEYS = ['neten_visit', 'neten_product', 'dmpim_visit', 'dmpim_product', 'dmpsc_visit', 'dmpsc_product']
+RESULT_SERIES = ([('populations', k) for k in ('neten', 'dmpim', 'dmpsc')] + [('costs', k) for k in COST_KEYS]
+                 + [(None, 'total_costs'), (None, 'baseline_costs')]
+                 + [('baseline_component_costs', k) for k in COST_KEYS] + [(None, 'efficiency_gains')])
+# Outcome series of outcome_series (CYP, cost per CYP, pregnancies averted), following the cost series
+OUTCOME_SERIES = ([(group, k) for group in ('cyp', 'cost_per_cyp', 'pregnancies_averted')
+                   for k in ('neten', 'dmpim', 'dmpsc')]
+                  + [(None, 'total_cyp'), (None, 'total_cost_per_cyp'), (None, 'total_pregnancies_averted')])
+RESULT_SERIES = RESULT_SERIES + OUTCOME_SERIES
+
+# Peak float64 values per scenario allocated by perform_batch_calculations, outputs included
+# (measured at about 31 rows of YEARS + 1 values)
+WORKING_VALUES_PER_SCENARIO = 33 * (YEARS + 1)
+
+def flatten_inputs(inputs):
+    """Flatten a perform_calculations inputs dict to {parameter: value}."""
+    flat = {
+        'neten_start_pop': inputs['start_pops'][0],
+        'dmpim_start_pop': inputs['start_pops'][1],
+        'cost_per_visit': inputs['cost_per_visit'],
+        'neten_num_visits': inputs['neten_costs'][0],
+        'neten_product_cost': inputs['neten_costs'][1],
+        'dmpim_num_visits': inputs['dmpim_costs'][0],
+        'dmpim_product_cost': inputs['dmpim_costs'][1],
+        'dmpsc_num_visits': inputs['dmpsc_costs'][0],
+        'dmpsc_product_cost': inputs['dmpsc_costs'][1],
+        'dmpsc_first_visit_multiplier': inputs.get('dmpsc_first_visit_multiplier', 1),
+    }
+    flat.update(zip(DMPIM_CONV_RATES, inputs['dmpim_conv_rates']))
+    flat.update(zip(NETEN_CONV_RATES, inputs['neten_conv_rates']))
+    return flat
+
+def unflatten_inputs(flat, user_pop_sizes=None):
+    """Inverse of flatten_inputs, building a perform_calculations inputs dict."""
+    return {
+        'start_pops': [flat['neten_start_pop'], flat['dmpim_start_pop']],
+        'cost_per_visit': flat['cost_per_visit'],
+        'neten_costs': [flat['neten_num_visits'], flat['neten_product_cost']],
+        'dmpim_costs': [flat['dmpim_num_visits'], flat['dmpim_product_cost']],
+        'dmpsc_costs': [flat['dmpsc_num_visits'], flat['dmpsc_product_cost']],
+        'dmpsc_first_visit_multiplier': flat['dmpsc_first_visit_multiplier'],
+        'dmpim_conv_rates': [flat[p] for p in DMPIM_CONV_RATES],
+        'neten_conv_rates': [flat[p] for p in NETEN_CONV_RATES],
+        'user_pop_sizes': user_pop_sizes or [None] * YEARS,
+    }
+
+def make_batch(inputs, n=1, **overrides):
+    """Build a batch of n scenarios from an inputs dict.
+
+    Every parameter is a float array of shape (n,); keyword arguments replace
+    individual parameters with scalars or arrays broadcastable to (n,).
+    Manually defined population sizes are kept as a (n, YEARS, 3) array with
+    NaN for years that follow the conversion rates. The conversion 'mode', the
+    yearly NET-EN populations of the static mode ('neten_pop_sizes', (n, YEARS))
+    and, for the dynamic mode, the 'dmpsc_start_pop' are carried along.
+    """
+    batch = {}
+    for name, value in flatten_inputs(inputs).items():
+        value = overrides.pop(name, value)
+        batch[name] = np.broadcast_to(np.asarray(value, dtype=float), (n,)).copy()
+    user_pop_sizes = overrides.pop('user_pop_sizes', inputs.get('user_pop_sizes'))
+    dmpsc_start_pop = overrides.pop('dmpsc_start_pop', inputs['start_pops'][2] if len(inputs['start_pops']) > 2 else 0)
+    neten_pop_sizes = overrides.pop('neten_pop_sizes', inputs.get('neten_pop_sizes') or MANUAL_NETEN_POP_SIZES)
+    if overrides:
+        raise KeyError(f"Unknown parameters: {', '.join(overrides)}")
+    batch['user_pop_sizes'] = pop_sizes_array(user_pop_sizes, n)
+    batch['mode'] = inputs.get('mode', 'static')
+    batch['dmpsc_start_pop'] = np.broadcast_to(np.asarray(dmpsc_start_pop, dtype=float), (n,)).copy()
+    batch['neten_pop_sizes'] = np.broadcast_to(np.asarray(neten_pop_sizes, dtype=float), (n, YEARS))
+    return batch
+
+def pop_sizes_array(user_pop_sizes, n=1):
+    """Convert manually defined population sizes to a (n, YEARS, 3) array (NaN where unset)."""
+    if user_pop_sizes is None:
+        return None
+    if isinstance(user_pop_sizes, np.ndarray):
+        return np.broadcast_to(user_pop_sizes.astype(float), (n, YEARS, 3))
+    pop_sizes = np.full((YEARS, 3), np.nan)
+    for i, sizes in enumerate(user_pop_sizes):
+        if sizes is not None:
+            pop_sizes[i] = sizes
+    if np.isnan(pop_sizes).all():
+        return None
+    return np.broadcast_to(pop_sizes, (n, YEARS, 3))
+
+def neten_pop_sizes_array(batch, n):
+    """Yearly NET-EN populations of the static mode as a (n, YEARS) array."""
+    return np.broadcast_to(np.asarray(batch.get('neten_pop_sizes', MANUAL_NETEN_POP_SIZES), dtype=float), (n, YEARS))
+
+def batch_size(batch):
+    """Number of scenarios in a batch."""
+    return int(np.broadcast_shapes(*(np.shape(batch[p]) for p in PARAMETERS))[0])
+
+def _static_populations(p, batch, n):
+    """Populations when conversion rates apply to the baseline year (perform_calculations)."""
+    neten_start_pop, dmpim_start_pop = p['neten_start_pop'], p['dmpim_start_pop']
+    dmpim_conv_rates = np.stack([p[name] for name in DMPIM_CONV_RATES], axis=1) / 100
+    neten_conv_rates = np.stack([p[name] for name in NETEN_CONV_RATES], axis=1) / 100
+    manual_neten = neten_pop_sizes_array(batch, n)
+
+    # Populations for the intervention years (columns) of every scenario (rows)
+    dmpim_start = dmpim_start_pop[:, None]
+    has_neten = (neten_start_pop > 0)[:, None]
+    dmpim_years = np.trunc(dmpim_start * (1 - dmpim_conv_rates))
+    neten_years = np.where(has_neten, np.trunc(manual_neten * (1 - neten_conv_rates)), 0)
+    dmpsc_years = np.trunc(dmpim_start * dmpim_conv_rates) + np.where(
+        has_neten, np.trunc(manual_neten * neten_conv_rates), 0)
+
+    user_pop_sizes = batch.get('user_pop_sizes')
+    if user_pop_sizes is not None:
+        override = ~np.isnan(user_pop_sizes[..., 0])
+        neten_years = np.where(override, user_pop_sizes[..., 0], neten_years)
+        dmpim_years = np.where(override, user_pop_sizes[..., 1], dmpim_years)
+        dmpsc_years = np.where(override, user_pop_sizes[..., 2], dmpsc_years)
+
+    neten = np.column_stack([neten_start_pop, neten_years])
+    dmpim = np.column_stack([dmpim_start_pop, dmpim_years])
+    dmpsc = np.column_stack([np.zeros(n), dmpsc_years])
+    return neten, dmpim, dmpsc
+
+def _dynamic_populations(p, batch, n):
+    """Populations when conversion rates apply year over year (perform_dynamic_calculations)."""
+    neten = np.empty((n, YEARS + 1))
+    dmpim = np.empty((n, YEARS + 1))
+    dmpsc = np.empty((n, YEARS + 1))
+    neten[:, 0], dmpim[:, 0] = p['neten_start_pop'], p['dmpim_start_pop']
+    dmpsc[:, 0] = np.broadcast_to(np.asarray(batch.get('dmpsc_start_pop', 0), dtype=float), (n,))
+    user_pop_sizes = batch.get('user_pop_sizes')
+
+    for i in range(YEARS):
+        converted_dmpim = np.trunc(dmpim[:, i] * (p[DMPIM_CONV_RATES[i]] / 100))
+        n_dmpim, n_dmpsc = dmpim[:, i] - converted_dmpim, dmpsc[:, i] + converted_dmpim
+        converted_neten = np.trunc(neten[:, i] * (p[NETEN_CONV_RATES[i]] / 100))
+        n_neten, n_dmpsc = neten[:, i] - converted_neten, n_dmpsc + converted_neten
+        if user_pop_sizes is not None:
+            override = ~np.isnan(user_pop_sizes[:, i, 0])
+            n_neten = np.where(override, user_pop_sizes[:, i, 0], n_neten)
+            n_dmpim = np.where(override, user_pop_sizes[:, i, 1], n_dmpim)
+            n_dmpsc = np.where(override, user_pop_sizes[:, i, 2], n_dmpsc)
+        neten[:, i + 1], dmpim[:, i + 1], dmpsc[:, i + 1] = n_neten, n_dmpim, n_dmpsc
+    return neten, dmpim, dmpsc
+
+def perform_batch_calculations(batch):
+    """Vectorized perform_calculations over a batch of scenarios.
+
+    Returns the same result structure as perform_calculations, with every
+    series an array of shape (n, YEARS + 1). Arithmetic follows
+    perform_calculations operation by operation, so each row matches the
+    scalar model exactly. batch['mode'] selects the 'static' (default) or
+    'dynamic' conversion model as in perform_calculations.
+    """
+    n = batch_size(batch)
+    p = {name: np.broadcast_to(np.asarray(batch[name], dtype=float), (n,)) for name in PARAMETERS}
+    neten_start_pop, dmpim_start_pop = p['neten_start_pop'], p['dmpim_start_pop']
+    cost_per_visit = p['cost_per_visit']
+    dynamic = batch.get('mode', 'static') == 'dynamic'
+
+    if dynamic:
+        neten, dmpim, dmpsc = _dynamic_populations(p, batch, n)
+    else:
+        neten, dmpim, dmpsc = _static_populations(p, batch, n)
+
+    # Calculate costs; products are formed in place in their output buffers, factor by factor
+    col = lambda x: x[:, None]
+
+    def scaled(users, *factors):
+        costs = users * col(factors[0])
+        for factor in factors[1:]:
+            costs *= col(factor)
+        return costs
+
+    dmpim_visit_costs = scaled(dmpim, p['dmpim_num_visits'], cost_per_visit)
+    dmpsc_visit_costs = scaled(dmpsc, p['dmpsc_num_visits'], cost_per_visit)
+    neten_visit_costs = scaled(neten, p['neten_num_visits'], cost_per_visit)
+    neten_visit_costs[~(neten > 0)] = 0
+
+    dmpim_product_costs = scaled(dmpim, p['dmpim_product_cost'])
+    dmpsc_product_costs = scaled(dmpsc, p['dmpsc_product_cost'])
+    neten_product_costs = scaled(neten, p['neten_product_cost'])
+    neten_product_costs[~(neten > 0)] = 0
+
+    # Apply first visit multiplier for DMPA-SC in all intervention years
+    dmpsc_visit_costs[:, 1:] += dmpsc[:, 1:] * col(cost_per_visit) * col(p['dmpsc_first_visit_multiplier'] - 1)
+
+    costs = {
+        'neten_visit': neten_visit_costs,
+        'neten_product': neten_product_costs,
+        'dmpim_visit': dmpim_visit_costs,
+        'dmpim_product': dmpim_product_costs,
+        'dmpsc_visit': dmpsc_visit_costs,
+        'dmpsc_product': dmpsc_product_costs,
+    }
+    # Summed in place, in the order of perform_calculations
+    total_costs = dmpim_visit_costs + dmpim_product_costs
+    for component in (dmpsc_visit_costs, dmpsc_product_costs, neten_visit_costs, neten_product_costs):
+        total_costs += component
+
+    if dynamic:
+        # The baseline keeps the starting populations (and their costs) in every year
+        baseline_component_costs = {k: np.repeat(v[:, :1], YEARS + 1, axis=1) for k, v in costs.items()}
+        baseline_costs = np.repeat(total_costs[:, :1], YEARS + 1, axis=1)
+    else:
+        baseline_dmpim = np.where(
+            dmpim_start_pop > 0,
+            dmpim_start_pop * (p['dmpim_num_visits'] * cost_per_visit + p['dmpim_product_cost']), 0)
+        neten_populations = np.column_stack([neten_start_pop, neten_pop_sizes_array(batch, n)])
+        baseline_costs = scaled(neten_populations, p['neten_num_visits'] * cost_per_visit + p['neten_product_cost'])
+        baseline_costs[~(neten_start_pop > 0)] = 0
+        baseline_costs += col(baseline_dmpim)
+
+        # Split of the baseline into visit and product costs per method
+        baseline_dmpim_pop = np.broadcast_to(col(np.where(dmpim_start_pop > 0, dmpim_start_pop, 0)), (n, YEARS + 1))
+        neten_populations[~(neten_start_pop > 0)] = 0
+        baseline_component_costs = {
+            'neten_visit': scaled(neten_populations, p['neten_num_visits'], cost_per_visit),
+            'neten_product': scaled(neten_populations, p['neten_product_cost']),
+            'dmpim_visit': scaled(baseline_dmpim_pop, p['dmpim_num_visits'], cost_per_visit),
+            'dmpim_product': scaled(baseline_dmpim_pop, p['dmpim_product_cost']),
+            'dmpsc_visit': np.zeros((n, YEARS + 1)),
+            'dmpsc_product': np.zeros((n, YEARS + 1)),
+        }
+
+    efficiency_gains = baseline_costs - total_costs
+    populations = {'neten': neten, 'dmpim': dmpim, 'dmpsc': dmpsc}
+
+    return {
+        'populations': populations,
+        'costs': costs,
+        'total_costs': total_costs,
+        'baseline_costs': baseline_costs,
+        'baseline_component_costs': baseline_component_costs,
+        'efficiency_gains': efficiency_gains,
+        **outcome_series(populations, costs, total_costs),
+    }
+
+def slice_batch(batch, rows):
+    """Scenarios rows (a slice) of a batch."""
+    n = batch_size(batch)
+    sliced = dict(batch)
+    for name, value in batch.items():
+        if name == 'mode' or value is None:
+            continue
+        sliced[name] = np.broadcast_to(value, (n,) + np.shape(value)[1:])[rows]
+    return sliced
+
+def allocate_results(n, dtype='float64'):
+    """Preallocated output buffers in the perform_batch_calculations layout."""
+    results = {}
+    for group, key in RESULT_SERIES:
+        target = results.setdefault(group, {}) if group else results
+        target[key] = np.empty((n, YEARS + 1), dtype=dtype)
+    return results
+
+def _store_rows(results, chunk, rows):
+    """Copy the results of a chunk into rows of the output buffers."""
+    for group, key in RESULT_SERIES:
+        target, source = (results[group], chunk[group]) if group else (results, chunk)
+        target[key][rows] = source[key]
+
+def perform_chunked_calculations(batch, memory_limit=256 * 2 ** 20, dtype='float64', out=None,
+                                 trace_memory=True):
+    """perform_batch_calculations in chunks that fit a memory budget (bytes).
+
+    Results are written chunk by chunk into preallocated output buffers (out,
+    or buffers allocated by allocate_results), so temporaries of the cost
+    formulas only ever exist for one chunk. Each chunk is evaluated in
+    float64; with dtype='float32' results are stored in single precision
+    (about 7 significant digits), halving the memory of the outputs. Returns
+    the results and a report of the chunk size, number of chunks and, when
+    trace_memory is set, the peak memory traced during the run.
+    """
+    n = batch_size(batch)
+    itemsize = np.dtype(dtype).itemsize
+    output_bytes = 0 if out is not None else n * len(RESULT_SERIES) * (YEARS + 1) * itemsize
+    chunk_size = (memory_limit - output_bytes) // (WORKING_VALUES_PER_SCENARIO * 8)
+    if chunk_size < 1:
+        remedy = "use dtype='float32' or " if itemsize > 4 else ""
+        raise ValueError(f"A memory limit of {memory_limit} bytes cannot hold the outputs of {n} scenarios "
+                         f"({output_bytes} bytes); {remedy}write chunks to a PSAStore")
+    chunk_size = min(chunk_size, n)
+
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        results = out if out is not None else allocate_results(n, dtype)
+        for start in range(0, n, chunk_size):
+            rows = slice(start, start + chunk_size)
+            _store_rows(results, perform_batch_calculations(slice_batch(batch, rows)), rows)
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    report = {'chunk_size': chunk_size, 'n_chunks': -(-n // chunk_size), 'peak_memory': peak_memory}
+    return results, report
+
+def batch_results_row(results, k):
+    """Extract scenario k of a batch result in the perform_calculations (list) format."""
+    if isinstance(results, dict):
+        return {key: batch_results_row(value, k) for key, value in results.items()}
+    return results[k].tolist()
+
+def cumulative_efficiency_gain(results):
+    """Efficiency gain summed over the intervention years (scalar or per scenario)."""
+    return np.sum(np.asarray(results['efficiency_gains'])[..., 1:], axis=-1)
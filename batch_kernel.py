@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+
+from batch_calculations import (PARAMETERS, RESULT_SERIES, batch_size, neten_pop_sizes_array,
+                                perform_batch_calculations)
+from dashboard_helpers import YEARS, outcome_factors
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+def _scenario_kernel(params, user_pop_sizes, manual_neten, dynamic, dmpsc_start_pop, outcome_factors, out):
+    """Year loop of perform_calculations for every scenario (row of params), written into out.
+
+    params is (n, len(PARAMETERS)) in PARAMETERS order, user_pop_sizes is
+    (1 or n, YEARS, 3) with NaN where unset, manual_neten (the NET-EN
+    populations of the static mode) is (1 or n, YEARS), outcome_factors
+    (2, 3) holds the CYP per user and pregnancies averted per CYP of NET-EN,
+    DMPA-IM and DMPA-SC, and out is
+    (n, len(RESULT_SERIES), YEARS + 1). Branches and operation order follow
+    perform_calculations, perform_dynamic_calculations and outcome_series
+    line by line.
+    """
+    n, years = params.shape[0], manual_neten.shape[1]
+    shared_pop_sizes = user_pop_sizes.shape[0] == 1
+    shared_neten = manual_neten.shape[0] == 1
+    for k in range(n):
+        neten_start_pop, dmpim_start_pop, cost_per_visit = params[k, 0], params[k, 1], params[k, 2]
+        neten_num_visits, neten_product_cost = params[k, 3], params[k, 4]
+        dmpim_num_visits, dmpim_product_cost = params[k, 5], params[k, 6]
+        dmpsc_num_visits, dmpsc_product_cost = params[k, 7], params[k, 8]
+        dmpsc_first_visit_multiplier = params[k, 9]
+        pop_sizes = user_pop_sizes[0] if shared_pop_sizes else user_pop_sizes[k]
+        neten_pop_sizes = manual_neten[0] if shared_neten else manual_neten[k]
+        o = out[k]
+
+        # Populations (series 0-2: neten, dmpim, dmpsc)
+        n_neten, n_dmpim = neten_start_pop, dmpim_start_pop
+        n_dmpsc = dmpsc_start_pop[k] if dynamic else 0.0
+        o[0, 0], o[1, 0], o[2, 0] = n_neten, n_dmpim, n_dmpsc
+        for i in range(years):
+            dmpim_conv_rate = params[k, 10 + i] / 100
+            neten_conv_rate = params[k, 10 + years + i] / 100
+            if not math.isnan(pop_sizes[i, 0]):
+                n_neten, n_dmpim, n_dmpsc = pop_sizes[i, 0], pop_sizes[i, 1], pop_sizes[i, 2]
+            elif dynamic:
+                converted = math.trunc(n_dmpim * dmpim_conv_rate)
+                n_dmpim, n_dmpsc = n_dmpim - converted, n_dmpsc + converted
+                converted = math.trunc(n_neten * neten_conv_rate)
+                n_neten, n_dmpsc = n_neten - converted, n_dmpsc + converted
+            elif neten_start_pop > 0:
+                n_dmpim = float(math.trunc(dmpim_start_pop * (1 - dmpim_conv_rate)))
+                n_neten = float(math.trunc(neten_pop_sizes[i] * (1 - neten_conv_rate)))
+                n_dmpsc = float(math.trunc(dmpim_start_pop * dmpim_conv_rate)
+                                + math.trunc(neten_pop_sizes[i] * neten_conv_rate))
+            elif neten_start_pop == 0:
+                n_dmpim = float(math.trunc(dmpim_start_pop * (1 - dmpim_conv_rate)))
+                n_neten = 0.0
+                n_dmpsc = float(math.trunc(dmpim_start_pop * dmpim_conv_rate))
+            o[0, i + 1], o[1, i + 1], o[2, i + 1] = n_neten, n_dmpim, n_dmpsc
+
+        # Costs (series 3-8), total (9), baseline (10), baseline components (11-16), efficiency gain (17)
+        for j in range(years + 1):
+            neten, dmpim, dmpsc = o[0, j], o[1, j], o[2, j]
+            dmpim_visit = dmpim * dmpim_num_visits * cost_per_visit
+            dmpsc_visit = dmpsc * dmpsc_num_visits * cost_per_visit
+            neten_visit = neten * neten_num_visits * cost_per_visit if dynamic or neten > 0 else 0.0
+            dmpim_product = dmpim * dmpim_product_cost
+            dmpsc_product = dmpsc * dmpsc_product_cost
+            neten_product = neten * neten_product_cost if dynamic or neten > 0 else 0.0
+            if j > 0:
+                dmpsc_visit += dmpsc * cost_per_visit * (dmpsc_first_visit_multiplier - 1)
+            o[3, j], o[4, j], o[5, j] = neten_visit, neten_product, dmpim_visit
+            o[6, j], o[7, j], o[8, j] = dmpim_product, dmpsc_visit, dmpsc_product
+            o[9, j] = dmpim_visit + dmpim_product + dmpsc_visit + dmpsc_product + neten_visit + neten_product
+
+            if dynamic:
+                for s in range(6):
+                    o[11 + s, j] = o[3 + s, 0]
+                o[10, j] = o[9, 0]
+            else:
+                neten_population = neten_start_pop if j == 0 else neten_pop_sizes[j - 1]
+                baseline_dmpim = (dmpim_start_pop * (dmpim_num_visits * cost_per_visit + dmpim_product_cost)
+                                  if dmpim_start_pop > 0 else 0.0)
+                baseline_dmpsc = 0.0 * (dmpsc_num_visits * cost_per_visit + dmpsc_product_cost)
+                baseline_neten = (neten_population * (neten_num_visits * cost_per_visit + neten_product_cost)
+                                  if neten_start_pop > 0 else 0.0)
+                o[10, j] = baseline_dmpim + baseline_dmpsc + baseline_neten
+                baseline_neten_pop = neten_population if neten_start_pop > 0 else 0.0
+                baseline_dmpim_pop = dmpim_start_pop if dmpim_start_pop > 0 else 0.0
+                o[11, j] = baseline_neten_pop * neten_num_visits * cost_per_visit
+                o[12, j] = baseline_neten_pop * neten_product_cost
+                o[13, j] = baseline_dmpim_pop * dmpim_num_visits * cost_per_visit
+                o[14, j] = baseline_dmpim_pop * dmpim_product_cost
+                o[15, j] = 0.0 * dmpsc_num_visits * cost_per_visit
+                o[16, j] = 0.0 * dmpsc_product_cost
+            o[17, j] = o[10, j] - o[9, j]
+
+            # CYP (18-20), cost per CYP (21-23) and pregnancies averted (24-26) per method, then totals (27-29)
+            for m in range(3):
+                o[18 + m, j] = o[m, j] * outcome_factors[0, m]
+                visit_product = o[3 + 2 * m, j] + o[4 + 2 * m, j]
+                o[21 + m, j] = visit_product / o[18 + m, j] if o[18 + m, j] > 0 else 0.0
+                o[24 + m, j] = o[18 + m, j] * outcome_factors[1, m]
+            o[27, j] = 0 + o[18, j] + o[19, j] + o[20, j]
+            o[28, j] = o[9, j] / o[27, j] if o[27, j] > 0 else 0.0
+            o[29, j] = 0 + o[24, j] + o[25, j] + o[26, j]
+
+_compiled_kernel = njit(cache=True, nogil=True)(_scenario_kernel) if NUMBA_AVAILABLE else None
+
+def results_from_buffer(out):
+    """Results dict in the perform_batch_calculations layout, as views of a kernel output buffer."""
+    results = {}
+    for s, (group, key) in enumerate(RESULT_SERIES):
+        target = results.setdefault(group, {}) if group else results
+        target[key] = out[:, s]
+    return results
+
+def perform_kernel_calculations(batch, use_numba=None, kernel=None):
+    """perform_batch_calculations through the compiled per-scenario kernel when Numba is installed.
+
+    Without Numba (or with use_numba=False) this is perform_batch_calculations.
+    kernel overrides the compiled kernel (e.g. _scenario_kernel to run it in
+    plain Python).
+    """
+    kernel = kernel or (_compiled_kernel if use_numba is not False else None)
+    if kernel is None:
+        return perform_batch_calculations(batch)
+    n = batch_size(batch)
+    params = np.column_stack([np.broadcast_to(np.asarray(batch[name], dtype=float), (n,)) for name in PARAMETERS])
+    user_pop_sizes = batch.get('user_pop_sizes')
+    user_pop_sizes = (np.full((1, YEARS, 3), np.nan) if user_pop_sizes is None
+                      else np.ascontiguousarray(user_pop_sizes[:1] if user_pop_sizes.strides[0] == 0 else user_pop_sizes))
+    dmpsc_start_pop = np.broadcast_to(np.asarray(batch.get('dmpsc_start_pop', 0), dtype=float), (n,)).copy()
+    neten_pop_sizes = neten_pop_sizes_array(batch, n)
+    neten_pop_sizes = np.ascontiguousarray(neten_pop_sizes[:1] if neten_pop_sizes.strides[0] == 0 else neten_pop_sizes)
+    out = np.empty((n, len(RESULT_SERIES), YEARS + 1))
+    kernel(params, user_pop_sizes, neten_pop_sizes, batch.get('mode', 'static') == 'dynamic', dmpsc_start_pop,
+           np.stack(outcome_factors(['neten', 'dmpim', 'dmpsc'])), out)
+    return results_from_buffer(out)
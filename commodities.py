@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from dashboard_helpers import METHODS, result_methods
+
+# Period lengths of the forecast: periods per year
+PERIODS = {'Year': 1, 'Quarter': 4}
+
+def units_matrix(methods):
+    """Commodities used by methods (keys of METHODS) and the (m, c) matrix of units per user per year."""
+    commodities = list(dict.fromkeys(name for key in methods for name in METHODS[key]['commodities']))
+    matrix = np.array([[METHODS[key]['commodities'].get(name, 0) for name in commodities] for key in methods],
+                      dtype=float)
+    return commodities, matrix
+
+def units_required(results):
+    """Units of each commodity needed per month from perform_calculations populations.
+
+    Works on single results (lists of YEARS + 1 values) and on batched
+    results (arrays with leading axes, e.g. (n, YEARS + 1)). Use is spread
+    evenly over the months of each year. Returns the commodities and the use
+    of the intervention years, months first: (12 * YEARS, ..., c).
+    """
+    methods = result_methods(results)
+    commodities, matrix = units_matrix(methods)
+    populations = np.stack([np.asarray(results['populations'][key], dtype=float) for key in methods], axis=-1)
+    yearly = np.moveaxis(populations[..., 1:, :], -2, 0) @ matrix
+    return commodities, np.repeat(yearly / 12, 12, axis=0)
+
+def forecast_inventory(demand, opening_stock, min_months=3, max_months=6, lead_time_months=3, review_months=3,
+                       months_per_period=1):
+    """Orders and stock levels under a min/max inventory rule, simulated month by month.
+
+    demand is (T, ...) units per month, months first so each month is one
+    contiguous slice; opening_stock broadcasts to demand[0]. Every review_months the stock on hand plus stock on
+    order is compared with the minimum level, (min_months +
+    lead_time_months) of the coming month's use; below it an order is placed
+    for whole units up to the maximum level, (max_months + lead_time_months)
+    of that use, arriving lead_time_months later. Orders are placed at the
+    end of a month, so the lead time is rounded to whole months of at least
+    one, and the same lead time sets the levels. Unmet demand is lost. All
+    leading axes (scenarios, geographies, commodities) are handled at once.
+    Returns arrays (..., T / months_per_period), periods last, summed over
+    each period, with the closing stock and months of stock (against the
+    period's average monthly use) at the end of each period.
+    """
+    demand = np.asarray(demand, dtype=float)
+    months = len(demand)
+    lead = max(1, round(lead_time_months))
+    coming = np.concatenate([demand[1:], demand[-1:]])
+
+    arrivals = np.zeros((months + lead,) + demand.shape[1:])
+    orders, closing_stock, stockouts = (np.zeros(demand.shape) for _ in range(3))
+    stock = np.broadcast_to(np.asarray(opening_stock, dtype=float), demand.shape[1:]).copy()
+    on_order = np.zeros_like(stock)
+    for t in range(months):
+        stock += arrivals[t]
+        on_order -= arrivals[t]
+        issued = np.minimum(stock, demand[t])
+        stockouts[t] = demand[t] - issued
+        stock -= issued
+        closing_stock[t] = stock
+
+        if (t + 1) % review_months == 0:
+            position = stock + on_order
+            order = np.where(position < (min_months + lead) * coming[t],
+                             np.ceil((max_months + lead) * coming[t] - position), 0)
+            orders[t] = order
+            arrivals[t + lead] += order
+            on_order += order
+
+    def periods(values):
+        return values.reshape((-1, months_per_period) + values.shape[1:])
+    forecast = {
+        'demand': periods(demand).sum(axis=1),
+        'orders': periods(orders).sum(axis=1),
+        'arrivals': periods(arrivals[:months]).sum(axis=1),
+        'closing_stock': periods(closing_stock)[:, -1],
+        'stockouts': periods(stockouts).sum(axis=1),
+    }
+    monthly = forecast['demand'] / months_per_period
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forecast['months_of_stock'] = np.where(monthly > 0, forecast['closing_stock'] / monthly, np.nan)
+    return {key: np.moveaxis(values, 0, -1) for key, values in forecast.items()}
+
+def commodity_forecast(results, period='Year', min_months=3, max_months=6, lead_time_months=3, review_months=3,
+                       opening_stock=None):
+    """Commodity forecast for perform_calculations (or batched) results, per year or quarter.
+
+    The supply chain is simulated month by month and reported per period. opening_stock (units per commodity, broadcast over
+    leading axes) defaults to max_months of the first month's use, i.e.
+    stock positioned to plan, including for commodities new to the
+    programme such as DMPA-SC devices. Returns the forecast_inventory
+    arrays (..., c, periods) with the commodities and period.
+    """
+    commodities, demand = units_required(results)
+    if opening_stock is None:
+        opening_stock = max_months * demand[0]
+    forecast = forecast_inventory(demand, opening_stock, min_months, max_months, lead_time_months, review_months,
+                                  12 // PERIODS[period])
+    forecast['commodities'] = commodities
+    forecast['period'] = period
+    return forecast
+
+def forecast_regions(region_results, **options):
+    """commodity_forecast for several geographies at once (region_results maps a name to results).
+
+    Results are stacked along a leading region axis, so batched results of
+    every region must have the same shape.
+    """
+    names = list(region_results)
+    first = region_results[names[0]]
+    stacked = {'populations': {key: np.stack([np.asarray(region_results[name]['populations'][key], dtype=float)
+                                              for name in names]) for key in first['populations']}}
+    forecast = commodity_forecast(stacked, **options)
+    forecast['regions'] = names
+    return forecast
+
+def forecast_table(forecast, labels=None):
+    """Long table of a forecast: one row per (region or scenario,) commodity and period.
+
+    labels names the entries of the leading axis, if any (default the
+    regions of forecast_regions).
+    """
+    values = forecast['demand']
+    periods_per_year = PERIODS[forecast['period']]
+    periods = [f"Year {t // periods_per_year + 1}" + (f" Q{t % periods_per_year + 1}" if periods_per_year > 1 else '')
+               for t in range(values.shape[-1])]
+    leading = values.shape[:-2]
+    table = {}
+    if leading:
+        labels = labels or forecast.get('regions') or [str(i) for i in range(int(np.prod(leading)))]
+        table['Region'] = np.repeat(labels, len(forecast['commodities']) * len(periods))
+    count = int(np.prod(leading))
+    table['Commodity'] = np.tile(np.repeat(forecast['commodities'], len(periods)), count)
+    table['Period'] = np.tile(periods, count * len(forecast['commodities']))
+    for column, key in [('Units Required', 'demand'), ('Order Quantity', 'orders'), ('Units Received', 'arrivals'),
+                        ('Closing Stock', 'closing_stock'), ('Stockout Units', 'stockouts'),
+                        ('Months of Stock', 'months_of_stock')]:
+        table[column] = forecast[key].ravel()
+    return pd.DataFrame(table)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from batch_calculations import (PARAMETERS, PARAMETER_LABELS, batch_results_row, make_batch, perform_batch_calculations,
+                                unflatten_inputs)
+from dashboard_helpers import YEARS, MANUAL_NETEN_POP_SIZES, METHODS
+
+# Columns of the country-parameter table besides PARAMETERS: the yearly NET-EN populations
+# of the static mode (blank for the starting population every year), currency and exchange rate
+NETEN_POP_SIZES = [f'neten_pop_size_{i + 1}' for i in range(YEARS)]
+COUNTRY_COLUMNS = ['country', 'currency', 'exchange_rate'] + PARAMETERS + NETEN_POP_SIZES
+COUNTRY_LABELS = {
+    'country': 'Country',
+    'currency': 'Currency',
+    'exchange_rate': 'Exchange Rate (per USD)',
+    **PARAMETER_LABELS,
+    **{name: f'NET-EN Population Year {i + 1}' for i, name in enumerate(NETEN_POP_SIZES)},
+}
+
+# Result series in currency, converted to USD by to_usd
+MONETARY_SERIES = ['costs', 'total_costs', 'baseline_costs', 'baseline_component_costs', 'efficiency_gains',
+                   'cost_per_cyp', 'total_cost_per_cyp']
+
+# The dashboard's South African inputs; the exchange rate (Rand per USD) is an assumption to update
+SOUTH_AFRICA = {
+    'country': 'South Africa', 'currency': 'ZAR', 'exchange_rate': 18.5,
+    'neten_start_pop': 552108, 'dmpim_start_pop': 1701061, 'cost_per_visit': 329,
+    'neten_num_visits': METHODS['neten']['num_visits'], 'neten_product_cost': METHODS['neten']['product_cost'],
+    'dmpim_num_visits': METHODS['dmpim']['num_visits'], 'dmpim_product_cost': METHODS['dmpim']['product_cost'],
+    'dmpsc_num_visits': METHODS['dmpsc']['num_visits'], 'dmpsc_product_cost': METHODS['dmpsc']['product_cost'],
+    'dmpsc_first_visit_multiplier': METHODS['dmpsc']['first_visit_multiplier'],
+    'dmpim_conv_rate_1': 10, 'dmpim_conv_rate_2': 15, 'dmpim_conv_rate_3': 20, 'dmpim_conv_rate_4': 25,
+    'neten_conv_rate_1': 25, 'neten_conv_rate_2': 35, 'neten_conv_rate_3': 50, 'neten_conv_rate_4': 65,
+    **dict(zip(NETEN_POP_SIZES, MANUAL_NETEN_POP_SIZES)),
+}
+
+def default_country_table():
+    """Country-parameter table with one row per country (South Africa to start with)."""
+    return pd.DataFrame([SOUTH_AFRICA], columns=COUNTRY_COLUMNS)
+
+def required_values(table, columns):
+    """Numeric values of the required columns of a country-parameter table, as {column: (n,) array}.
+
+    Raises ValueError naming each country with a blank or non-numeric value
+    (or an exchange rate that is not positive), rather than letting it run as
+    NaN or 0.
+    """
+    values = {name: pd.to_numeric(table[name], errors='coerce').to_numpy(dtype=float) for name in columns}
+    invalid = {name: np.isnan(value) | ((value <= 0) if name == 'exchange_rate' else False)
+               for name, value in values.items()}
+    names = table['country'].fillna('').astype(str) if 'country' in table else pd.Series([''] * len(table))
+    problems = [f"{names.iloc[i] or f'row {i + 1}'}: "
+                + ', '.join(COUNTRY_LABELS[name] for name in columns if invalid[name][i])
+                for i in range(len(table)) if any(invalid[name][i] for name in columns)]
+    if problems:
+        raise ValueError(f"Missing or invalid values ({'; '.join(problems)})")
+    return values
+
+def countries_batch(table):
+    """One static-mode batch holding every country (row) of a country-parameter table.
+
+    Blank yearly NET-EN populations default to the country's NET-EN starting
+    population; every other parameter and the exchange rate are required.
+    """
+    table = pd.DataFrame(table)
+    missing = [column for column in PARAMETERS + ['exchange_rate'] if column not in table]
+    if missing:
+        raise KeyError(f"The country table is missing the columns {', '.join(missing)}")
+    n = len(table)
+    overrides = required_values(table, PARAMETERS + ['exchange_rate'])
+    del overrides['exchange_rate']
+    start = overrides['neten_start_pop'][:, None]
+    neten_pop_sizes = np.column_stack([pd.to_numeric(table[name], errors='coerce').to_numpy(dtype=float)
+                                       if name in table else np.full(n, np.nan) for name in NETEN_POP_SIZES])
+    overrides['neten_pop_sizes'] = np.where(np.isnan(neten_pop_sizes), start, neten_pop_sizes)
+    first = unflatten_inputs({name: values[0] for name, values in overrides.items() if name in PARAMETERS})
+    return make_batch(dict(first, mode='static'), n, **overrides)
+
+def to_usd(results, exchange_rates):
+    """Results with every monetary series divided by the exchange rate (local currency per USD) of its row."""
+    rates = np.asarray(exchange_rates, dtype=float)[:, None]
+
+    def convert(values):
+        if isinstance(values, dict):
+            return {key: convert(value) for key, value in values.items()}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(rates > 0, values / rates, np.nan)
+    return dict(results, **{key: convert(results[key]) for key in MONETARY_SERIES if key in results})
+
+def country_results(table):
+    """Results of every country in one vectorized pass, in local currency and in USD.
+
+    Returns the country names and the two batched results (one row per
+    country), {'local': ..., 'usd': ...}.
+    """
+    table = pd.DataFrame(table)
+    batch = countries_batch(table)
+    local = perform_batch_calculations(batch)
+    usd = to_usd(local, required_values(table, ['exchange_rate'])['exchange_rate'])
+    names = table['country'].fillna('').astype(str).tolist() if 'country' in table else [str(i + 1) for i in range(len(table))]
+    return names, {'local': local, 'usd': usd}
+
+def country_row(results, k):
+    """Country k of country_results results in the perform_calculations (list) format."""
+    return batch_results_row(results, k)
+
+def countries_export(table, names, results):
+    """Combined table of all countries: one row per country and year, in local currency and USD."""
+    table = pd.DataFrame(table)
+    local, usd = results['local'], results['usd']
+    years = ['Baseline (Year 1-4)'] + [f'Intervention Year {i + 1}' for i in range(YEARS)]
+    export = pd.DataFrame({
+        'Country': np.repeat(names, YEARS + 1),
+        'Currency': np.repeat(table['currency'].fillna('').astype(str).tolist() if 'currency' in table
+                              else [''] * len(names), YEARS + 1),
+        'Year': np.tile(years, len(names)),
+    })
+    for key, users in local['populations'].items():
+        export[f"{METHODS[key]['label']} Users"] = users.ravel()
+    for column, key in [('Total Costs', 'total_costs'), ('Total Baseline Costs', 'baseline_costs'),
+                        ('Efficiency gain', 'efficiency_gains'), ('Cost per CYP', 'total_cost_per_cyp')]:
+        export[column] = local[key].ravel()
+        export[f'{column} (USD)'] = usd[key].ravel()
+    export['Total CYP'] = local['total_cyp'].ravel()
+    export['Pregnancies Averted'] = local['total_pregnancies_averted'].ravel()
+    return export
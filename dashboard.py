@@ -1,11 +1,37 @@
 import dash
 from dash import dcc, html, dash_table
 from dash.dependencies import Input, Output, State
-import pandas as pd
 import dash_daq as daq
 
 # Import helper functions
-from dashboard_helpers import parse_pop_sizes, perform_calculations, create_plot, prepare_combined_data
+from dashboard_helpers import METHODS, parse_pop_sizes, perform_calculations, create_plot, prepare_combined_data, plot_data
+from scenario_store import ScenarioStore, create_comparison_plot
+from batch_calculations import PARAMETER_LABELS
+from goal_seek import goal_seek, SCHEDULE_LABELS
+from sensitivity import sensitivity_table
+from discounting import apply_discounting
+from sampling import default_bounds
+from quantiles import psa_quantiles, create_fan_chart
+from attribution import attribute_change, create_waterfall_chart
+from pareto import pareto_search, create_pareto_plot
+from uptake_optimizer import optimize_uptake
+from commodities import PERIODS, commodity_forecast, forecast_table
+from pricing import CURVE_KINDS, apply_price_curves, parse_price_curve, product_costs
+from countries import COUNTRY_COLUMNS, COUNTRY_LABELS, default_country_table, country_results, country_row, countries_export
+from workload import MINUTES_PER_VISIT, MINUTES_PER_FTE, facility_workload, workload_table, parse_facility_table
+
+# Saved scenarios, seeded with the scenarios described in the README
+scenario_store = ScenarioStore()
+scenario_store.seed_readme_scenarios()
+
+# Form fields holding the model inputs, in the order used by build_inputs
+INPUT_FIELDS = ['neten-start-pop', 'dmpim-start-pop', 'visit-cost', 'neten-visits', 'neten-product-cost',
+                'dmpim-visits', 'dmpim-product-cost', 'dmpsc-visits', 'dmpsc-first-visit-multiplier',
+                'dmpsc-product-cost', 'dmpim-conv-rate-1', 'dmpim-conv-rate-2', 'dmpim-conv-rate-3',
+                'dmpim-conv-rate-4', 'neten-conv-rate-1', 'neten-conv-rate-2', 'neten-conv-rate-3',
+                'neten-conv-rate-4', 'pop-sizes-year-1', 'pop-sizes-year-2', 'pop-sizes-year-3',
+                'pop-sizes-year-4']
+COLOR_FIELDS = ['neten-color', 'dmpim-color', 'dmpsc-color', 'cost-saving-color']
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
@@ -91,190 +117,493 @@ app.index_string = '''
 
 # App layout
 app.layout = html.Div([
-    html.Div([
-        html.H1("Budget Impact Analysis of DMPA-SC Introduction in South Africa Over 4 Years"),
-        
-        html.Div([
-            html.P("This model evaluates the efficiency gains of introducing DMPA-SC for self injection resulting from transitioning users from DMPA-IM and NET-EN to DMPA-SC over a period of 4 years. "
-                   "Input initial injectables user population sizes, annual method specific visit costs, annual method specific product costs, and yearly conversion rates. The model uses hypothetical product costs and is for exploratory purposes only."),
-            html.H3("Starting Population Sizes"),
+    dcc.Tabs([
+        dcc.Tab(label='Budget Impact', children=[
             html.Div([
+                html.H1("Budget Impact Analysis of DMPA-SC Introduction in South Africa Over 4 Years"),
+        
                 html.Div([
-                    html.Label("NET-EN Starting Population"),
-                    dcc.Input(id='neten-start-pop', type='number', value=552108)
-                ], className='input-group'),
-                html.Div([
-                    html.Label("DMPA-IM Starting Population"),
-                    dcc.Input(id='dmpim-start-pop', type='number', value=1701061)
-                ], className='input-group'),
-            ]),
-        ], className='container'),
+                    html.P("This model evaluates the efficiency gains of introducing DMPA-SC for self injection resulting from transitioning users from DMPA-IM and NET-EN to DMPA-SC over a period of 4 years. "
+                           "Input initial injectables user population sizes, annual method specific visit costs, annual method specific product costs, and yearly conversion rates. The model uses hypothetical product costs and is for exploratory purposes only."),
+                    html.H3("Starting Population Sizes"),
+                    html.Div([
+                        html.Div([
+                            html.Label("NET-EN Starting Population"),
+                            dcc.Input(id='neten-start-pop', type='number', value=552108)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-IM Starting Population"),
+                            dcc.Input(id='dmpim-start-pop', type='number', value=1701061)
+                        ], className='input-group'),
+                    ]),
+                ], className='container'),
         
-        html.Div([
-            html.H3("Annual Costs per User (Rand)"),
-            html.P("Specify the cost per visit (this should be the same for each intervention), the number of annual visits required for each intervention, and the annual method specific costs per user for each type of intervention. If the new intervention (DMPSA-SC) will require more intensive first visits use the multiplier option (default value 2) which will increase the cost for the first visit of the year to account for a longer first visit."),
-            html.Div([
                 html.Div([
-                    html.Label("Cost per Visit"),
-                    dcc.Input(id='visit-cost', type='number', value=329)
-                ], className='input-group'),
+                    html.H3("Annual Costs per User (Rand)"),
+                    html.P("Specify the cost per visit (this should be the same for each intervention), the number of annual visits required for each intervention, and the annual method specific costs per user for each type of intervention. If the new intervention (DMPSA-SC) will require more intensive first visits use the multiplier option (default value 2) which will increase the cost for the first visit of the year to account for a longer first visit."),
+                    html.Div([
+                        html.Div([
+                            html.Label("Cost per Visit"),
+                            dcc.Input(id='visit-cost', type='number', value=329)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("NET-EN Number of Visits"),
+                            dcc.Input(id='neten-visits', type='number', value=METHODS['neten']['num_visits'])
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("NET-EN Product Cost (6 Units/Year)"),
+                            dcc.Input(id='neten-product-cost', type='number', value=METHODS['neten']['product_cost'])
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-IM Number of Visits"),
+                            dcc.Input(id='dmpim-visits', type='number', value=METHODS['dmpim']['num_visits'])
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-IM Product Cost (4 Units/Year)"),
+                            dcc.Input(id='dmpim-product-cost', type='number', value=METHODS['dmpim']['product_cost'])
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-SC Number of Visits"),
+                            dcc.Input(id='dmpsc-visits', type='number', value=METHODS['dmpsc']['num_visits'])
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-SC First Visit Multiplier"),
+                            dcc.Input(id='dmpsc-first-visit-multiplier', type='number', value=METHODS['dmpsc']['first_visit_multiplier'])
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-SC Product Cost (4 Units/Year)"),
+                            dcc.Input(id='dmpsc-product-cost', type='number', value=METHODS['dmpsc']['product_cost'])
+                        ], className='input-group'),
+                    ])
+                ], className='container'),
+        
                 html.Div([
-                    html.Label("NET-EN Number of Visits"),
-                    dcc.Input(id='neten-visits', type='number', value=6)
-                ], className='input-group'),
+                    html.H3("Yearly Market Share Conversion"),
+                    html.P("Specify the yearly market share conversions from NET-EN and DMPA-IM to DMPA-SC."),
+                    html.Div([
+                        html.H4("NET-EN to DMPA-SC Market Share Conversion (%)"),
+                        html.Div([
+                            html.Div([
+                                html.Label("Year 1"),
+                                dcc.Input(id='neten-conv-rate-1', type='number', value=25)
+                            ], className='input-group'),
+                            html.Div([
+                                html.Label("Year 2"),
+                                dcc.Input(id='neten-conv-rate-2', type='number', value=35)
+                            ], className='input-group'),
+                            html.Div([
+                                html.Label("Year 3"),
+                                dcc.Input(id='neten-conv-rate-3', type='number', value=50)
+                            ], className='input-group'),
+                            html.Div([
+                                html.Label("Year 4"),
+                                dcc.Input(id='neten-conv-rate-4', type='number', value=65)
+                            ], className='input-group'),
+                        ])
+                    ]),
+                    html.Div([
+                        html.H4("DMPA-IM to DMPA-SC Market Share Conversion (%)"),
+                        html.Div([
+                            html.Div([
+                                html.Label("Year 1"),
+                                dcc.Input(id='dmpim-conv-rate-1', type='number', value=10) #15.8417599
+                            ], className='input-group'),
+                            html.Div([
+                                html.Label("Year 2"),
+                                dcc.Input(id='dmpim-conv-rate-2', type='number', value=15)
+                            ], className='input-group'),
+                            html.Div([
+                                html.Label("Year 3"),
+                                dcc.Input(id='dmpim-conv-rate-3', type='number', value=20)
+                            ], className='input-group'),
+                            html.Div([
+                                html.Label("Year 4"),
+                                dcc.Input(id='dmpim-conv-rate-4', type='number', value=25)
+                            ], className='input-group'),
+                        ])
+                    ])
+                ], className='container'),
+        
                 html.Div([
-                    html.Label("NET-EN Product Cost (6 Units/Year)"),
-                    dcc.Input(id='neten-product-cost', type='number', value=143.52)
-                ], className='input-group'),
+                    html.H3("Manually Defined Population Sizes (Optional)"),
+                    html.P("Optionally, specify the injectables user population sizes for each year if you want to override the model's calculations."),
+                    html.Button('Show/Hide Population Sizes', id='pop-size-button', n_clicks=0),
+                    html.Div(id='pop-size-div', style={'display': 'none'}, children=[
+                        html.Div([
+                            html.Label("Year 1 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
+                            dcc.Input(id='pop-sizes-year-1', type='text', placeholder='e.g., 450000, 1600000, 50000')
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Year 2 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
+                            dcc.Input(id='pop-sizes-year-2', type='text', placeholder='e.g., 400000, 1500000, 100000')
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Year 3 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
+                            dcc.Input(id='pop-sizes-year-3', type='text', placeholder='e.g., 350000, 1400000, 150000')
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Year 4 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
+                            dcc.Input(id='pop-sizes-year-4', type='text', placeholder='e.g., 300000, 1300000, 200000')
+                        ], className='input-group'),
+                    ])
+                ], className='container'),
+        
                 html.Div([
-                    html.Label("DMPA-IM Number of Visits"),
-                    dcc.Input(id='dmpim-visits', type='number', value=4)
-                ], className='input-group'),
+                    html.H3("Discounting and Inflation (Optional)"),
+                    html.P("Specify an annual discount rate and annual inflation rates for visit and product costs to add present-value figures to the data table. Intervention year 1 is valued at current prices."),
+                    html.Div([
+                        html.Div([
+                            html.Label("Discount Rate (%)"),
+                            dcc.Input(id='discount-rate', type='number', value=0)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Visit Cost Inflation (%)"),
+                            dcc.Input(id='visit-inflation-rate', type='number', value=0)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Product Cost Inflation (%)"),
+                            dcc.Input(id='product-inflation-rate', type='number', value=0)
+                        ], className='input-group'),
+                    ])
+                ], className='container'),
+
                 html.Div([
-                    html.Label("DMPA-IM Product Cost (4 Units/Year)"),
-                    dcc.Input(id='dmpim-product-cost', type='number', value=63.4)
-                ], className='input-group'),
+                    html.H3("Volume-Tiered DMPA-SC Pricing (Optional)"),
+                    html.P("Price DMPA-SC by procurement volume instead of the flat product cost above. Enter annual user volumes at which each price starts (the first usually 0) and the price per user per year from that volume. "
+                           "Tiered pricing charges the price of the tier the year's DMPA-SC users fall in; continuous pricing interpolates between the points."),
+                    html.Div([
+                        html.Div([
+                            html.Label("Pricing"),
+                            dcc.Dropdown(id='dmpsc-price-kind', value='tiered', clearable=False,
+                                         options=[{'label': kind.capitalize(), 'value': kind} for kind in CURVE_KINDS])
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Volumes (users)"),
+                            dcc.Input(id='dmpsc-price-volumes', type='text', placeholder='e.g., 0, 250000, 500000')
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Prices (R per user per year)"),
+                            dcc.Input(id='dmpsc-price-tiers', type='text', placeholder='e.g., 116, 105, 95')
+                        ], className='input-group'),
+                    ]),
+                    html.Div(id='price-curve-error'),
+                ], className='container'),
+
                 html.Div([
-                    html.Label("DMPA-SC Number of Visits"),
-                    dcc.Input(id='dmpsc-visits', type='number', value=2)
-                ], className='input-group'),
+                    html.H3("Commodity Forecast"),
+                    html.P("Units of each commodity needed for the users above, with orders and stock levels under a min/max inventory rule reviewed every few months. Stock starts at the maximum level. The forecast is exported with the cost CSV."),
+                    html.Div([
+                        html.Div([
+                            html.Label("Forecast Period"),
+                            dcc.Dropdown(id='commodity-period', value='Year', clearable=False,
+                                         options=list(PERIODS))
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Minimum Stock (months)"),
+                            dcc.Input(id='commodity-min-months', type='number', value=3)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Maximum Stock (months)"),
+                            dcc.Input(id='commodity-max-months', type='number', value=6)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Lead Time (months)"),
+                            dcc.Input(id='commodity-lead-time', type='number', value=3)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Review Period (months)"),
+                            dcc.Input(id='commodity-review-months', type='number', value=3)
+                        ], className='input-group'),
+                    ])
+                ], className='container'),
+
                 html.Div([
-                    html.Label("DMPA-SC First Visit Multiplier"),
-                    dcc.Input(id='dmpsc-first-visit-multiplier', type='number', value=2)
-                ], className='input-group'),
+                    html.H3("Uncertainty (Optional)"),
+                    html.P("Draw inputs uniformly within the given range around the values above and show percentile bands of total costs and efficiency gain in a fan chart. Set the number of draws to 0 to skip."),
+                    html.Div([
+                        html.Div([
+                            html.Label("Number of Draws"),
+                            dcc.Input(id='psa-draws', type='number', value=10000)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Input Range (+/- %)"),
+                            dcc.Input(id='psa-spread', type='number', value=20)
+                        ], className='input-group'),
+                    ])
+                ], className='container'),
+
                 html.Div([
-                    html.Label("DMPA-SC Product Cost (4 Units/Year)"),
-                    dcc.Input(id='dmpsc-product-cost', type='number', value=116)
-                ], className='input-group'),
-            ])
-        ], className='container'),
+                    html.H3("Color Palette Picker (Optional)"),
+                    html.P("Select the colors for the different categories in the graph."),
+                    html.Button('Show/Hide Color Pickers', id='color-picker-button', n_clicks=0),
+                    html.Div(id='color-picker-div', style={'display': 'none'}, children=[
+                        html.Div([
+                            html.Label("NETEN Color"),
+                            daq.ColorPicker(
+                                id='neten-color',
+                                value=dict(hex='#003f5c')
+                            )
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPIM Color"),
+                            daq.ColorPicker(
+                                id='dmpim-color',
+                                value=dict(hex='#7a5195')
+                            )
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPSC Color"),
+                            daq.ColorPicker(
+                                id='dmpsc-color',
+                                value=dict(hex='#ef5675')
+                            )
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Efficiency Gain Color"),
+                            daq.ColorPicker(
+                                id='cost-saving-color',
+                                value=dict(hex='#ffa600')
+                            )
+                        ], className='input-group')
+                    ])
+                ], className='container'),
         
-        html.Div([
-            html.H3("Yearly Market Share Conversion"),
-            html.P("Specify the yearly market share conversions from NET-EN and DMPA-IM to DMPA-SC."),
-            html.Div([
-                html.H4("NET-EN to DMPA-SC Market Share Conversion (%)"),
                 html.Div([
+                    html.H3("Saved Scenarios"),
+                    html.P("Save the current inputs as a named scenario, load a saved scenario into the form, or compare saved scenarios side by side. Attributing the change splits the difference in 4-year efficiency gain between the first two selected scenarios across the input groups."),
                     html.Div([
-                        html.Label("Year 1"),
-                        dcc.Input(id='neten-conv-rate-1', type='number', value=25)
-                    ], className='input-group'),
+                        html.Div([
+                            html.Label("Scenario Name"),
+                            dcc.Input(id='scenario-name', type='text', placeholder='e.g., Scenario 4')
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("Tags (comma separated)"),
+                            dcc.Input(id='scenario-tags', type='text', placeholder='e.g., provincial, draft')
+                        ], className='input-group'),
+                        html.Button('Save Scenario', id='save-scenario-button', n_clicks=0),
+                    ]),
+                    dcc.Dropdown(id='scenario-dropdown', multi=True,
+                                 options=[s['name'] for s in scenario_store.list_scenarios()]),
+                    html.Button('Load Scenario', id='load-scenario-button', n_clicks=0),
+                    html.Button('Compare Scenarios', id='compare-scenarios-button', n_clicks=0),
+                    html.Button('Attribute Change', id='attribute-change-button', n_clicks=0),
+                    dcc.Graph(id='scenario-comparison-plot'),
+                    dcc.Graph(id='attribution-waterfall'),
+                ], className='container'),
+
+                html.Div([
+                    html.H3("Goal Seek"),
+                    html.P("Find the value of one input (or the scale of a whole conversion schedule) that gives a target 4-year efficiency gain, keeping all other inputs as entered above."),
                     html.Div([
-                        html.Label("Year 2"),
-                        dcc.Input(id='neten-conv-rate-2', type='number', value=35)
-                    ], className='input-group'),
+                        dcc.Dropdown(id='goal-seek-parameter', value='dmpsc_product_cost',
+                                     options=[{'label': label, 'value': name}
+                                              for name, label in {**PARAMETER_LABELS, **SCHEDULE_LABELS}.items()]),
+                        html.Div([
+                            html.Label("Target 4-Year Efficiency Gain (Rand)"),
+                            dcc.Input(id='goal-seek-target', type='number', value=0)
+                        ], className='input-group'),
+                        html.Button('Solve', id='goal-seek-button', n_clicks=0),
+                        html.Div(id='goal-seek-result'),
+                    ])
+                ], className='container'),
+
+                html.Div([
+                    html.H3("Pareto Search"),
+                    html.P("Search conversion schedules (non-decreasing over the years) and DMPA-SC product costs within the range below for the candidates that no other candidate beats on 4-year efficiency gain, peak annual spend and DMPA-SC uptake together. All other inputs are as entered above."),
                     html.Div([
-                        html.Label("Year 3"),
-                        dcc.Input(id='neten-conv-rate-3', type='number', value=50)
-                    ], className='input-group'),
+                        html.Div([
+                            html.Label("Number of Candidates"),
+                            dcc.Input(id='pareto-candidates', type='number', value=65536)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-SC Product Cost From"),
+                            dcc.Input(id='pareto-cost-min', type='number', value=58)
+                        ], className='input-group'),
+                        html.Div([
+                            html.Label("DMPA-SC Product Cost To"),
+                            dcc.Input(id='pareto-cost-max', type='number', value=174)
+                        ], className='input-group'),
+                        html.Button('Search', id='pareto-button', n_clicks=0),
+                    ]),
+                    dcc.Graph(id='pareto-plot'),
+                ], className='container'),
+
+                html.Div([
+                    html.H3("Budget-Constrained Uptake"),
+                    html.P("Find the fastest conversion from DMPA-IM and NET-EN to DMPA-SC, never falling from one year to the next, whose total cost stays within the annual budget cap in each year, keeping all other inputs as entered above. Years whose cap is below even the cheapest schedule are marked not feasible. This solves the inputs above as one national region; subnational regions are solved with optimize_uptake in uptake_optimizer.py."),
                     html.Div([
-                        html.Label("Year 4"),
-                        dcc.Input(id='neten-conv-rate-4', type='number', value=65)
-                    ], className='input-group'),
-                ])
-            ]),
+                        html.Div([
+                            html.Label("Annual Budget Cap (Rand)"),
+                            dcc.Input(id='budget-cap', type='number', value=3400000000)
+                        ], className='input-group'),
+                        html.Button('Optimize Uptake', id='optimize-uptake-button', n_clicks=0),
+                    ]),
+                    dash_table.DataTable(
+                        id='uptake-table',
+                        columns=[],
+                        data=[],
+                        style_table={'overflowX': 'auto'},
+                        style_cell={'textAlign': 'left', 'padding': '5px'},
+                        style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
+                    ),
+                ], className='container'),
+
+                html.Button('Update Plot', id='submit-button', n_clicks=0),
+                html.Button('Export CSV', id='export-button', n_clicks=0),
+
+                dcc.Download(id="download-dataframe-csv"),
+                dcc.Download(id="download-commodity-csv"),
+
+                html.Div([
+                    dcc.Graph(id='stacked-bar-plot', style={'flex': '1'}),
+                    dcc.Graph(id='fan-chart', style={'flex': '1'}),
+                ], style={'display': 'flex'}),
+
+                html.H3("Combined Data"),
+                html.P("Couple-years of protection (CYP) assume one CYP per year of injectable use; pregnancies averted assume 85 pregnancies per 100 women-years without a method and a typical-use failure rate of 4% for injectables."),
+                dash_table.DataTable(
+                    id='combined-data-table',
+                    columns=[],
+                    data=[],
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'left', 'padding': '5px'},
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
+                ),
+
+                html.H3("Commodity Forecast"),
+                dash_table.DataTable(
+                    id='commodity-table',
+                    columns=[],
+                    data=[],
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'left', 'padding': '5px'},
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
+                ),
+
+                html.H3("Sensitivity"),
+                html.P("Exact partial derivatives and elasticities of the 4-year total cost and efficiency gain with respect to each input, and the value of each input (others held fixed) at which the 4-year efficiency gain is zero."),
+                dash_table.DataTable(
+                    id='sensitivity-table',
+                    columns=[],
+                    data=[],
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'left', 'padding': '5px'},
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
+                )
+            ], className='container')
+        ]),
+        dcc.Tab(label='Workload and Capacity', children=[
             html.Div([
-                html.H4("DMPA-IM to DMPA-SC Market Share Conversion (%)"),
+                html.H3("Health-Worker Workload and Facility Capacity"),
+                html.P("Convert the visits of the Budget Impact tab into health-worker minutes and FTEs per facility, and flag facilities whose family planning workload exceeds the FTEs available. "
+                       "Upload a facility table (CSV or Excel) with one row per facility and the columns 'Facility', 'FTE Available' and users per method ('NET-EN Users', 'DMPA-IM Users'). "
+                       "New DMPA-SC users are shared in proportion to each facility's injectable users."),
+                dcc.Upload(id='facility-upload', children=html.Button('Upload Facility Table'), multiple=False),
+                html.Div(id='facility-upload-name'),
                 html.Div([
                     html.Div([
-                        html.Label("Year 1"),
-                        dcc.Input(id='dmpim-conv-rate-1', type='number', value=10) #15.8417599
+                        html.Label("NET-EN Minutes per Visit"),
+                        dcc.Input(id='neten-visit-minutes', type='number', value=MINUTES_PER_VISIT)
                     ], className='input-group'),
                     html.Div([
-                        html.Label("Year 2"),
-                        dcc.Input(id='dmpim-conv-rate-2', type='number', value=15)
+                        html.Label("DMPA-IM Minutes per Visit"),
+                        dcc.Input(id='dmpim-visit-minutes', type='number', value=MINUTES_PER_VISIT)
                     ], className='input-group'),
                     html.Div([
-                        html.Label("Year 3"),
-                        dcc.Input(id='dmpim-conv-rate-3', type='number', value=20)
+                        html.Label("DMPA-SC Minutes per Visit"),
+                        dcc.Input(id='dmpsc-visit-minutes', type='number', value=MINUTES_PER_VISIT)
                     ], className='input-group'),
                     html.Div([
-                        html.Label("Year 4"),
-                        dcc.Input(id='dmpim-conv-rate-4', type='number', value=25)
+                        html.Label("Working Minutes per FTE per Year"),
+                        dcc.Input(id='minutes-per-fte', type='number', value=MINUTES_PER_FTE)
                     ], className='input-group'),
-                ])
-            ])
-        ], className='container'),
-        
-        html.Div([
-            html.H3("Manually Defined Population Sizes (Optional)"),
-            html.P("Optionally, specify the injectables user population sizes for each year if you want to override the model's calculations."),
-            html.Button('Show/Hide Population Sizes', id='pop-size-button', n_clicks=0),
-            html.Div(id='pop-size-div', style={'display': 'none'}, children=[
-                html.Div([
-                    html.Label("Year 1 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
-                    dcc.Input(id='pop-sizes-year-1', type='text', placeholder='e.g., 450000, 1600000, 50000')
-                ], className='input-group'),
-                html.Div([
-                    html.Label("Year 2 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
-                    dcc.Input(id='pop-sizes-year-2', type='text', placeholder='e.g., 400000, 1500000, 100000')
-                ], className='input-group'),
-                html.Div([
-                    html.Label("Year 3 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
-                    dcc.Input(id='pop-sizes-year-3', type='text', placeholder='e.g., 350000, 1400000, 150000')
-                ], className='input-group'),
-                html.Div([
-                    html.Label("Year 4 Population Sizes (NET-EN, DMPA-IM, DMPA-SC)"),
-                    dcc.Input(id='pop-sizes-year-4', type='text', placeholder='e.g., 300000, 1300000, 200000')
-                ], className='input-group'),
-            ])
-        ], className='container'),
-        
-        html.Div([
-            html.H3("Color Palette Picker (Optional)"),
-            html.P("Select the colors for the different categories in the graph."),
-            html.Button('Show/Hide Color Pickers', id='color-picker-button', n_clicks=0),
-            html.Div(id='color-picker-div', style={'display': 'none'}, children=[
-                html.Div([
-                    html.Label("NETEN Color"),
-                    daq.ColorPicker(
-                        id='neten-color',
-                        value=dict(hex='#003f5c')
-                    )
-                ], className='input-group'),
-                html.Div([
-                    html.Label("DMPIM Color"),
-                    daq.ColorPicker(
-                        id='dmpim-color',
-                        value=dict(hex='#7a5195')
-                    )
-                ], className='input-group'),
-                html.Div([
-                    html.Label("DMPSC Color"),
-                    daq.ColorPicker(
-                        id='dmpsc-color',
-                        value=dict(hex='#ef5675')
-                    )
-                ], className='input-group'),
+                ]),
+                html.Button('Compute Workload', id='workload-button', n_clicks=0),
+                html.P(id='workload-summary'),
+                dash_table.DataTable(
+                    id='workload-table',
+                    columns=[],
+                    data=[],
+                    page_size=25,
+                    sort_action='native',
+                    filter_action='native',
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'left', 'padding': '5px'},
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'},
+                    style_data_conditional=[{'if': {'filter_query': '{Over Capacity} = "Yes"'},
+                                             'backgroundColor': '#f8d7da'}]
+                ),
+            ], className='container'),
+        ]),
+        dcc.Tab(label='Countries', children=[
+            html.Div([
+                html.H3("Multi-Country Budget Impact"),
+                html.P("Run the budget impact analysis for several countries at once. Edit the country-parameter table (one row per country, in local currency with its exchange rate per USD) or add rows; "
+                       "blank NET-EN populations default to the NET-EN starting population. Costs are reported in local currency and in USD, and the export holds every country."),
+                dash_table.DataTable(
+                    id='country-table',
+                    columns=[{'name': COUNTRY_LABELS[c], 'id': c, 'type': 'text' if c in ('country', 'currency') else 'numeric'}
+                             for c in COUNTRY_COLUMNS],
+                    data=default_country_table().to_dict('records'),
+                    editable=True,
+                    row_deletable=True,
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'left', 'padding': '5px', 'minWidth': '120px'},
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold', 'whiteSpace': 'normal'}
+                ),
+                html.Button('Add Country', id='add-country-button', n_clicks=0),
                 html.Div([
-                    html.Label("Efficiency Gain Color"),
-                    daq.ColorPicker(
-                        id='cost-saving-color',
-                        value=dict(hex='#ffa600')
-                    )
-                ], className='input-group')
-            ])
-        ], className='container'),
-        
-        html.Button('Update Plot', id='submit-button', n_clicks=0),
-        html.Button('Export CSV', id='export-button', n_clicks=0),
-
-        dcc.Download(id="download-dataframe-csv"),
-
-        dcc.Graph(id='stacked-bar-plot'),
-
-        html.H3("Combined Data"),
-        dash_table.DataTable(
-            id='combined-data-table',
-            columns=[],
-            data=[],
-            style_table={'overflowX': 'auto'},
-            style_cell={'textAlign': 'left', 'padding': '5px'},
-            style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
-        )
-    ], className='container')
+                    html.Div([
+                        html.Label("Country"),
+                        dcc.Dropdown(id='country-selector', value=0, clearable=False,
+                                     options=[{'label': 'South Africa', 'value': 0}])
+                    ], className='input-group'),
+                    html.Div([
+                        html.Label("Currency"),
+                        dcc.RadioItems(id='country-currency', value='local', inline=True,
+                                       options=[{'label': 'Local currency', 'value': 'local'},
+                                                {'label': 'USD', 'value': 'usd'}])
+                    ], className='input-group'),
+                ]),
+                html.Div(id='country-error'),
+                dcc.Graph(id='country-plot'),
+                dash_table.DataTable(
+                    id='country-results-table',
+                    columns=[],
+                    data=[],
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'left', 'padding': '5px'},
+                    style_header={'backgroundColor': 'rgb(230, 230, 230)', 'fontWeight': 'bold'}
+                ),
+                html.Button("Export All Countries", id="export-countries-button", n_clicks=0),
+                dcc.Download(id="download-countries-csv"),
+            ], className='container'),
+        ]),
+    ]),
 ])
 
+def build_inputs(args):
+    """Build the model inputs from the form field values (INPUT_FIELDS then COLOR_FIELDS)."""
+    return {
+        'start_pops': list(args[:2]),
+        'cost_per_visit': args[2],
+        'neten_costs': list(args[3:5]),
+        'dmpim_costs': list(args[5:7]),
+        'dmpsc_costs': [args[7], args[9]],
+        'dmpsc_first_visit_multiplier': args[8],
+        'dmpim_conv_rates': list(args[10:14]),
+        'neten_conv_rates': list(args[14:18]),
+        'user_pop_sizes': [parse_pop_sizes(pop_size) for pop_size in args[18:22]],
+        'colors': {k: v['hex'] for k, v in zip(['neten', 'dmpim', 'dmpsc', 'efficiency_gain'], args[22:26])}
+    }
+
+def form_values(inputs):
+    """Inverse of build_inputs: form field values (INPUT_FIELDS order) for stored inputs."""
+    pop_sizes = [', '.join(str(x) for x in p) if p is not None else None for p in inputs['user_pop_sizes']]
+    return [*inputs['start_pops'], inputs['cost_per_visit'], *inputs['neten_costs'], *inputs['dmpim_costs'],
+            inputs['dmpsc_costs'][0], inputs['dmpsc_first_visit_multiplier'], inputs['dmpsc_costs'][1],
+            *inputs['dmpim_conv_rates'], *inputs['neten_conv_rates'], *pop_sizes]
+
 # Callback functions
 @app.callback(
     Output('pop-size-div', 'style'),
@@ -302,7 +631,13 @@ def toggle_color_picker(n_clicks, style):
     [Output('stacked-bar-plot', 'figure'),
      Output('download-dataframe-csv', 'data'),
      Output('combined-data-table', 'data'),
-     Output('combined-data-table', 'columns')],
+     Output('combined-data-table', 'columns'),
+     Output('sensitivity-table', 'data'),
+     Output('sensitivity-table', 'columns'),
+     Output('commodity-table', 'data'),
+     Output('commodity-table', 'columns'),
+     Output('download-commodity-csv', 'data'),
+     Output('price-curve-error', 'children')],
     [Input('submit-button', 'n_clicks'),
      Input('export-button', 'n_clicks')],
     [State('neten-start-pop', 'value'),
@@ -330,47 +665,59 @@ def toggle_color_picker(n_clicks, style):
      State('neten-color', 'value'),
      State('dmpim-color', 'value'),
      State('dmpsc-color', 'value'),
-     State('cost-saving-color', 'value')]
+     State('cost-saving-color', 'value'),
+     State('discount-rate', 'value'),
+     State('visit-inflation-rate', 'value'),
+     State('product-inflation-rate', 'value'),
+     State('commodity-period', 'value'),
+     State('commodity-min-months', 'value'),
+     State('commodity-max-months', 'value'),
+     State('commodity-lead-time', 'value'),
+     State('commodity-review-months', 'value'),
+     State('dmpsc-price-kind', 'value'),
+     State('dmpsc-price-volumes', 'value'),
+     State('dmpsc-price-tiers', 'value')]
 )
 
 def update_graph(submit_n_clicks, export_n_clicks, *args):
     # Prepare input data
-    inputs = {
-        'start_pops': args[:2],
-        'cost_per_visit': args[2],
-        'neten_costs': args[3:5],
-        'dmpim_costs': args[5:7],
-        'dmpsc_costs': [args[7], args[9]],
-        'dmpsc_first_visit_multiplier': args[8],
-        'dmpim_conv_rates': args[10:14],
-        'neten_conv_rates': args[14:18],
-        'user_pop_sizes': [parse_pop_sizes(pop_size) for pop_size in args[18:22]],
-        'colors': {k: v['hex'] for k, v in zip(['neten', 'dmpim', 'dmpsc', 'efficiency_gain'], args[22:])}
-    }
+    inputs = build_inputs(args)
+
+    # Perform calculations, reusing stored results for saved scenarios
+    results = scenario_store.find_results(inputs) or perform_calculations(inputs)
 
-    # Perform calculations
-    results = perform_calculations(inputs)
+    # Price DMPA-SC by volume if a price curve is given
+    price_kind, price_volumes, price_tiers = args[34:37]
+    price_error = None
+    try:
+        dmpsc_curve = parse_price_curve(price_volumes, price_tiers, price_kind or 'tiered')
+    except ValueError as error:
+        dmpsc_curve = None
+        price_error = f"Could not use the price curve, the flat product cost is used instead: {error}"
+    if dmpsc_curve is not None:
+        # The baseline keeps the starting DMPA-SC users in every year (both modes)
+        dmpsc_users = results['populations']['dmpsc']
+        results = apply_price_curves(results, {'dmpsc': dmpsc_curve}, product_costs(inputs),
+                                     {'dmpsc': [dmpsc_users[0]] * len(dmpsc_users)})
 
     # Prepare data for plotting and tables
-    df = pd.DataFrame({
-        'NET-EN Product': results['costs']['neten_product'],
-        'NET-EN Visit': results['costs']['neten_visit'],
-        'DMPA-IM Product': results['costs']['dmpim_product'],
-        'DMPA-IM Visit': results['costs']['dmpim_visit'],
-        'DMPA-SC Product': results['costs']['dmpsc_product'],
-        'DMPA-SC Visit': results['costs']['dmpsc_visit'],
-        'Total Costs': results['total_costs'],
-        'Efficiency gain': results['efficiency_gains']
-    })
-
-    # Convert costs to billions
-    df = df / 1e9
+    df = plot_data(results)
 
     # Create the plot
     fig = create_plot(df, inputs['colors'])
 
     # Prepare the combined data table
     df_combined = prepare_combined_data(results, inputs)
+    if dmpsc_curve is not None:
+        df_combined['DMPA-SC Unit Price'] = results['unit_prices']['dmpsc'].round(2)
+
+    # Add present-value figures
+    discount_rate, visit_inflation, product_inflation = [(rate or 0) / 100 for rate in args[26:29]]
+    discounted = apply_discounting(results, discount_rate, {'visit': visit_inflation, 'product': product_inflation})
+    df_combined['Total Costs (PV)'] = discounted['total_costs'].round(2)
+    df_combined['Total Baseline Costs (PV)'] = discounted['baseline_costs'].round(2)
+    df_combined['Efficiency gain (PV)'] = discounted['efficiency_gains'].round(2)
+    df_combined['Cumulative Efficiency gain (PV)'] = discounted['cumulative']['efficiency_gains'].round(2)
 
     # Prepare CSV data
     csv_data = dcc.send_data_frame(df_combined.to_csv, "user_population_and_costs.csv", index=False)
@@ -379,10 +726,233 @@ def update_graph(submit_n_clicks, export_n_clicks, *args):
     table_columns = [{"name": i, "id": i} for i in df_combined.columns]
     table_data = df_combined.to_dict('records')
 
+    # Prepare the sensitivity table
+    df_sensitivity = sensitivity_table(inputs)
+    sensitivity_columns = [{"name": i, "id": i} for i in df_sensitivity.columns]
+    sensitivity_data = df_sensitivity.to_dict('records')
+
+    # Prepare the commodity forecast
+    period, min_months, max_months, lead_time, review_months = args[29:34]
+    df_commodities = forecast_table(commodity_forecast(results, period or 'Year', min_months or 0, max_months or 0,
+                                                       lead_time or 0, int(review_months or 1))).round(2)
+    commodity_columns = [{"name": i, "id": i} for i in df_commodities.columns]
+    commodity_data = df_commodities.to_dict('records')
+    commodity_csv = dcc.send_data_frame(df_commodities.to_csv, "commodity_forecast.csv", index=False)
+
     if export_n_clicks > 0:
-        return fig, csv_data, table_data, table_columns
+        return (fig, csv_data, table_data, table_columns, sensitivity_data, sensitivity_columns,
+                commodity_data, commodity_columns, commodity_csv, price_error)
     else:
-        return fig, None, table_data, table_columns
+        return (fig, None, table_data, table_columns, sensitivity_data, sensitivity_columns,
+                commodity_data, commodity_columns, None, price_error)
+
+@app.callback(
+    Output('fan-chart', 'figure'),
+    Input('submit-button', 'n_clicks'),
+    [State('psa-draws', 'value'),
+     State('psa-spread', 'value')] +
+    [State(field, 'value') for field in INPUT_FIELDS + COLOR_FIELDS]
+)
+def update_fan_chart(n_clicks, n_draws, spread, *args):
+    if not n_draws:
+        return {}
+    inputs = build_inputs(args)
+    bands = psa_quantiles(inputs, int(n_draws), default_bounds(inputs, (spread or 0) / 100))
+    return create_fan_chart(bands, colors=inputs['colors'])
+
+@app.callback(
+    Output('scenario-dropdown', 'options'),
+    Input('save-scenario-button', 'n_clicks'),
+    [State('scenario-name', 'value'),
+     State('scenario-tags', 'value')] +
+    [State(field, 'value') for field in INPUT_FIELDS + COLOR_FIELDS]
+)
+def save_scenario(n_clicks, name, tags, *args):
+    if n_clicks > 0 and name:
+        scenario_store.save(name, build_inputs(args), tags=(tags or '').split(','))
+    return [s['name'] for s in scenario_store.list_scenarios()]
+
+@app.callback(
+    [Output(field, 'value') for field in INPUT_FIELDS],
+    Input('load-scenario-button', 'n_clicks'),
+    State('scenario-dropdown', 'value'),
+    prevent_initial_call=True
+)
+def load_scenario(n_clicks, selected):
+    if not selected:
+        return [dash.no_update] * len(INPUT_FIELDS)
+    inputs, _ = scenario_store.load(selected[0])
+    return form_values(inputs)
+
+@app.callback(
+    Output('scenario-comparison-plot', 'figure'),
+    Input('compare-scenarios-button', 'n_clicks'),
+    State('scenario-dropdown', 'value')
+)
+def compare_scenarios(n_clicks, selected):
+    # Results come straight from the store rather than being recomputed
+    scenarios = {name: scenario_store.load(name) for name in selected or []}
+    currencies = sorted({inputs.get('currency') or 'Rand' for inputs, _ in scenarios.values()}) or ['Rand']
+    return create_comparison_plot({name: results for name, (_, results) in scenarios.items()},
+                                  currency=' / '.join(currencies))
+
+@app.callback(
+    Output('attribution-waterfall', 'figure'),
+    Input('attribute-change-button', 'n_clicks'),
+    State('scenario-dropdown', 'value'),
+    prevent_initial_call=True
+)
+def attribute_scenario_change(n_clicks, selected):
+    if not selected or len(selected) < 2:
+        return {}
+    name_a, name_b = selected[:2]
+    attribution = attribute_change(scenario_store.load(name_a)[0], scenario_store.load(name_b)[0])
+    return create_waterfall_chart(attribution, name_a, name_b)
+
+@app.callback(
+    Output('pareto-plot', 'figure'),
+    Input('pareto-button', 'n_clicks'),
+    [State('pareto-candidates', 'value'),
+     State('pareto-cost-min', 'value'),
+     State('pareto-cost-max', 'value')] +
+    [State(field, 'value') for field in INPUT_FIELDS],
+    prevent_initial_call=True
+)
+def search_pareto_front(n_clicks, n_candidates, cost_min, cost_max, *args):
+    inputs = build_inputs(args)
+    cost_range = (cost_min, cost_max) if cost_min is not None and cost_max is not None else None
+    front, samples = pareto_search(inputs, int(n_candidates or 65536), cost_range)
+    return create_pareto_plot(front, samples)
+
+@app.callback(
+    [Output('uptake-table', 'data'),
+     Output('uptake-table', 'columns')],
+    Input('optimize-uptake-button', 'n_clicks'),
+    [State('budget-cap', 'value')] +
+    [State(field, 'value') for field in INPUT_FIELDS],
+    prevent_initial_call=True
+)
+def optimize_uptake_schedule(n_clicks, budget_cap, *args):
+    schedule = optimize_uptake({'Current inputs': build_inputs(args)}, {'Current inputs': budget_cap or 0})
+    schedule = schedule.drop(columns='Region').round(2)
+    return schedule.to_dict('records'), [{'name': col, 'id': col} for col in schedule.columns]
+
+@app.callback(
+    Output('goal-seek-result', 'children'),
+    Input('goal-seek-button', 'n_clicks'),
+    [State('goal-seek-parameter', 'value'),
+     State('goal-seek-target', 'value')] +
+    [State(field, 'value') for field in INPUT_FIELDS],
+    prevent_initial_call=True
+)
+def solve_goal_seek(n_clicks, parameter, target, *args):
+    inputs = build_inputs(args)
+    solution = goal_seek(inputs, parameter, target or 0)
+    label = {**PARAMETER_LABELS, **SCHEDULE_LABELS}[parameter]
+    if not solution['converged'][0]:
+        return f"No value of {label} within the search range gives a 4-year efficiency gain of R{target or 0:,.2f}."
+    return (f"{label} = {solution['value'][0]:,.4f} gives a 4-year efficiency gain of "
+            f"R{(target or 0) + solution['residual'][0]:,.2f}.")
+
+@app.callback(
+    Output('facility-upload-name', 'children'),
+    Input('facility-upload', 'filename')
+)
+def show_facility_upload(filename):
+    return f"Facility table: {filename}" if filename else "No facility table uploaded."
+
+@app.callback(
+    [Output('workload-table', 'data'),
+     Output('workload-table', 'columns'),
+     Output('workload-summary', 'children')],
+    Input('workload-button', 'n_clicks'),
+    [State('facility-upload', 'contents'),
+     State('facility-upload', 'filename'),
+     State('neten-visit-minutes', 'value'),
+     State('dmpim-visit-minutes', 'value'),
+     State('dmpsc-visit-minutes', 'value'),
+     State('minutes-per-fte', 'value')] +
+    [State(field, 'value') for field in INPUT_FIELDS + COLOR_FIELDS],
+    prevent_initial_call=True
+)
+def update_workload(n_clicks, contents, filename, neten_minutes, dmpim_minutes, dmpsc_minutes, minutes_per_fte, *args):
+    if contents is None:
+        return [], [], "Upload a facility table to compute the workload."
+    try:
+        facilities = parse_facility_table(contents, filename or '')
+        inputs = build_inputs(args)
+        results = perform_calculations(inputs)
+        minutes_per_visit = {'neten': neten_minutes or MINUTES_PER_VISIT, 'dmpim': dmpim_minutes or MINUTES_PER_VISIT,
+                             'dmpsc': dmpsc_minutes or MINUTES_PER_VISIT}
+        workload = facility_workload(results, inputs['cost_per_visit'], facilities, minutes_per_visit,
+                                     minutes_per_fte or MINUTES_PER_FTE)
+    except (ValueError, KeyError) as error:
+        return [], [], f"Could not compute the workload: {error}"
+
+    table = workload_table(facilities, workload).round(2)
+    over_capacity = int(table['Over Capacity'].sum())
+    table['Over Capacity'] = table['Over Capacity'].map({True: 'Yes', False: 'No'})
+    freed = workload['fte_freed'][:, 1:].sum(axis=0)
+    summary = (f"{over_capacity:,} of {len(table):,} facilities exceed their FTEs available in at least one year. "
+               f"FTEs freed across all facilities: "
+               + ', '.join(f"Year {year}: {value:,.1f}" for year, value in enumerate(freed, 1)) + '.')
+    return table.to_dict('records'), [{'name': i, 'id': i} for i in table.columns], summary
+
+@app.callback(
+    Output('country-table', 'data'),
+    Input('add-country-button', 'n_clicks'),
+    State('country-table', 'data'),
+    prevent_initial_call=True
+)
+def add_country(n_clicks, rows):
+    template = dict(rows[-1]) if rows else default_country_table().to_dict('records')[0]
+    return rows + [dict(template, country=f"Country {len(rows) + 1}")]
+
+@app.callback(
+    [Output('country-selector', 'options'),
+     Output('country-selector', 'value'),
+     Output('country-plot', 'figure'),
+     Output('country-results-table', 'data'),
+     Output('country-results-table', 'columns'),
+     Output('country-error', 'children')],
+    [Input('country-table', 'data'),
+     Input('country-selector', 'value'),
+     Input('country-currency', 'value')],
+    [State(field, 'value') for field in COLOR_FIELDS]
+)
+def update_countries(rows, selected, currency, *colors):
+    if not rows:
+        return [], None, {}, [], [], "Add a country to the table."
+    try:
+        names, results = country_results(rows)
+    except (KeyError, ValueError, IndexError) as error:
+        return [], None, {}, [], [], f"Could not compute the countries: {error}"
+    # Countries are selected by row, since names may repeat or be blank
+    options = [{'label': name or f'Row {i + 1}', 'value': i} for i, name in enumerate(names)]
+    k = selected if isinstance(selected, int) and 0 <= selected < len(names) else 0
+    row = country_row(results[currency or 'local'], k)
+    currency_label = 'USD' if currency == 'usd' else rows[k].get('currency') or 'local currency'
+
+    colors = {key: color['hex'] for key, color in zip(['neten', 'dmpim', 'dmpsc', 'efficiency_gain'], colors)}
+    fig = create_plot(plot_data(row), colors, country=names[k], currency=currency_label)
+    df_country = prepare_combined_data(row, rows[k])
+    return (options, k, fig, df_country.to_dict('records'),
+            [{"name": i, "id": i} for i in df_country.columns], None)
+
+@app.callback(
+    Output('download-countries-csv', 'data'),
+    Input('export-countries-button', 'n_clicks'),
+    State('country-table', 'data'),
+    prevent_initial_call=True
+)
+def export_countries(n_clicks, rows):
+    # Invalid tables are reported under the country plot (update_countries)
+    try:
+        names, results = country_results(rows)
+    except (KeyError, ValueError, IndexError):
+        return dash.no_update
+    df_export = countries_export(rows, names, results).round(2)
+    return dcc.send_data_frame(df_export.to_csv, "countries_budget_impact.csv", index=False)
 
 if __name__ == '__main__':
     app.run_server(debug=True)
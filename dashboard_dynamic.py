@@ -2,11 +2,14 @@
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
-import plotly.graph_objs as go
-import pandas as pd
-import numpy as np
 import dash_daq as daq
 
+# Import helper functions
+from dashboard_helpers import parse_pop_sizes, perform_calculations, create_plot, prepare_combined_data, plot_data
+from scenario_store import ScenarioStore
+
+scenario_store = ScenarioStore()
+
 app = dash.Dash(__name__)
 server = app.server
 
@@ -259,20 +262,6 @@ app.layout = html.Div([
     ], className='container')
 ])
 
-def parse_pop_sizes(pop_sizes_str):
-    if pop_sizes_str:
-        try:
-            return [int(x.strip()) for x in pop_sizes_str.split(',')]
-        except ValueError:
-            return None
-    return None
-
-def convert(n_source, n_sink, Conv):
-    efflux = int(n_source * Conv)
-    n_source -= efflux
-    n_sink += efflux
-    return n_source, n_sink
-
 # Add this callback function
 @app.callback(
     Output('pop-size-div', 'style'),
@@ -329,154 +318,37 @@ def toggle_color_picker(n_clicks, style):
      State('dmpsc-color', 'value'),
      State('cost-saving-color', 'value')]
 )
-def update_graph(submit_n_clicks, export_n_clicks, 
-                 neten_start_pop, dmpim_start_pop, 
-                 dmpsc_start_pop, 
-                 neten_visit_cost, neten_product_cost, 
-                 dmpim_visit_cost, 
-                 dmpim_product_cost, dmpsc_visit_cost, 
-                 dmpsc_product_cost,
-                 dmpim_conv_rate_1, dmpim_conv_rate_2, 
-                 dmpim_conv_rate_3, dmpim_conv_rate_4, 
-                 neten_conv_rate_1, neten_conv_rate_2, 
-                 neten_conv_rate_3, neten_conv_rate_4, 
-                 pop_sizes_year_1, pop_sizes_year_2, 
-                 pop_sizes_year_3, pop_sizes_year_4,
-                 neten_color, dmpim_color, 
-                 dmpsc_color, cost_saving_color):
-    
-    dmpim_conv_rates = [dmpim_conv_rate_1, dmpim_conv_rate_2, dmpim_conv_rate_3, dmpim_conv_rate_4]
-    neten_conv_rates = [neten_conv_rate_1, neten_conv_rate_2, neten_conv_rate_3, neten_conv_rate_4]
-    user_pop_sizes = [parse_pop_sizes(pop_sizes_year_1), parse_pop_sizes(pop_sizes_year_2), 
-                      parse_pop_sizes(pop_sizes_year_3), parse_pop_sizes(pop_sizes_year_4)]
-    
-    n_neten, n_dmpim, n_dmpsc = neten_start_pop, dmpim_start_pop, dmpsc_start_pop
-
-    tot_start_pop = n_neten + n_dmpim + n_dmpsc
-    
-    # convert pct to proportion
-    dmpim_Conv = [rate / 100 for rate in dmpim_conv_rates]
-    neten_Conv = [rate / 100 for rate in neten_conv_rates]
-    years = 4
-
-    dmpim, dmpsc, neten = [n_dmpim], [n_dmpsc], [n_neten]
-
-    for i in range(years):
-        if user_pop_sizes[i] is not None:
-            n_neten, n_dmpim, n_dmpsc = user_pop_sizes[i]
-        else:
-            n_dmpim, n_dmpsc = convert(n_dmpim, n_dmpsc, dmpim_Conv[i])
-            n_neten, n_dmpsc = convert(n_neten, n_dmpsc, neten_Conv[i])
-        
-        dmpim.append(n_dmpim)
-        neten.append(n_neten)
-        dmpsc.append(n_dmpsc)
-
-    dmpim_visit_costs = [d * dmpim_visit_cost for d in dmpim]
-    dmpsc_visit_costs = [d * dmpsc_visit_cost for d in dmpsc]
-    neten_visit_costs = [n * neten_visit_cost for n in neten]
-
-    dmpim_product_costs = [d * dmpim_product_cost for d in dmpim]
-    neten_product_costs = [n * neten_product_cost for n in neten]
-    dmpsc_product_costs = [d * dmpsc_product_cost for d in dmpsc]
-
-    baselinecost = sum(x[0] for x in [dmpim_visit_costs, dmpim_product_costs, neten_visit_costs, neten_product_costs, dmpsc_visit_costs, dmpsc_product_costs]) # adding sc costs in case there is a baseline with sc
-    tot_costs = [sum(x) for x in zip(dmpim_visit_costs, dmpim_product_costs, 
-                                     dmpsc_visit_costs, dmpsc_product_costs, 
-                                     neten_visit_costs, neten_product_costs)]
-    baseline_diff = [x - baselinecost for x in tot_costs]
-
-    df = pd.DataFrame({
-        'NET-EN Product': neten_product_costs,
-        'NET-EN Visit': neten_visit_costs,
-        'DMPA-IM Product': dmpim_product_costs,
-        'DMPA-IM Visit': dmpim_visit_costs,
-        'DMPA-SC Product': dmpsc_product_costs,
-        'DMPA-SC Visit': dmpsc_visit_costs,
-        'Efficiency gain': np.abs(baseline_diff)
-    })
-    
-    df_users = pd.DataFrame({
-        'Year': ['Baseline (Year 1-4)', 'Intervention Year 1', 'Intervention Year 2', 'Intervention Year 3', 'Intervention Year 4'],
-        'NET-EN': neten,
-        'DMPA-IM': dmpim,
-        'DMPA-SC': dmpsc,
-    })
-
-    # Divide all costs by 1 billion
-    for column in df.columns:
-        df[column] = df[column] / 1e9
-
-    # Picker colors
-    colors = {
-        'NET-EN': neten_color['hex'],
-        'DMPA-IM': dmpim_color['hex'],
-        'DMPA-SC': dmpsc_color['hex'],
-        'Efficiency gain': cost_saving_color['hex']
+def update_graph(submit_n_clicks, export_n_clicks, *args):
+    # Prepare input data; visit costs are entered as annual totals per method,
+    # so the cost per visit is folded into the number of visits
+    inputs = {
+        'mode': 'dynamic',
+        'start_pops': list(args[:3]),
+        'cost_per_visit': 1,
+        'neten_costs': list(args[3:5]),
+        'dmpim_costs': list(args[5:7]),
+        'dmpsc_costs': list(args[7:9]),
+        'dmpsc_first_visit_multiplier': 1,
+        'dmpim_conv_rates': list(args[9:13]),
+        'neten_conv_rates': list(args[13:17]),
+        'user_pop_sizes': [parse_pop_sizes(pop_size) for pop_size in args[17:21]],
+        'colors': {k: v['hex'] for k, v in zip(['neten', 'dmpim', 'dmpsc', 'efficiency_gain'], args[21:25])}
     }
 
-    fig = go.Figure()
+    # Perform calculations, reusing stored results for saved scenarios
+    results = scenario_store.find_results(inputs) or perform_calculations(inputs)
 
-    x_labels = ['Baseline<br>(Years 1-4)', 'Intervention<br>Year 1', 'Intervention<br>Year 2', 'Intervention<br>Year 3', 'Intervention<br>Year 4']
-
-    for column in df.columns:
-        if 'Visit' in column:
-            fig.add_trace(go.Bar(x=x_labels, y=df[column], name=column, 
-                                 marker_color=colors[column.split()[0]], opacity=0.65))
-        elif 'Product' in column:
-            fig.add_trace(go.Bar(x=x_labels, y=df[column], name=column, 
-                                 marker_color=colors[column.split()[0]], opacity=1))
-        else:  # Efficiency gain
-            fig.add_trace(go.Bar(x=x_labels, y=df[column], name=column, 
-                                 marker_color=colors[column], opacity=1))
-
-    fig.update_layout(
-        barmode='stack',
-        title=f'Budget impact analysis of DMPA-SC for self injection introduction in South Africa over 4 years with specified conversion rates from DMPA-IM and NET-EN to DMPA-SC',
-        xaxis_title='Year',
-        yaxis_title='Costs in Billions of Rand',
-        yaxis=dict(tickformat=".2f"),
-        legend=dict(x=1.05, y=1)
-    )
-
-# make output df for csv
-    df_users = pd.DataFrame({
-        'Year': ['Baseline (Year 1-4)', 'Intervention Year 1', 'Intervention Year 2', 'Intervention Year 3', 'Intervention Year 4'],
-        'NET-EN Users': neten,
-        'DMPA-IM Users': dmpim,
-        'DMPA-SC Users': dmpsc,
-        'NET-EN + DMPA-IM Users': [sum(x) for x in zip(neten, dmpim)],
-        })
-    df_costs = pd.DataFrame({
-        'Year': ['Baseline (Years 1-4)', 'Intervention Year 1', 'Intervention Year 2', 'Intervention Year 3', 'Intervention Year 4'],
-        'NET-EN Product': neten_product_costs,
-        'NET-EN Visit': neten_visit_costs,
-        'DMPA-IM Product': dmpim_product_costs,
-        'DMPA-IM Visit': dmpim_visit_costs,
-        'DMPA-SC Product': dmpsc_product_costs,
-        'DMPA-SC Visit': dmpsc_visit_costs,
-        'Efficiency gain': np.abs(baseline_diff)
-        })
-    
-    df_combined = pd.merge(df_users, df_costs, on='Year')
-    
-    # add a column that combines NET-EN and DMPA-IM for visit, and for product
-    df_combined['NET-EN Visit + DMPA-IM Visit'] = df_combined['NET-EN Visit'] + df_combined['DMPA-IM Visit']
-    df_combined['NET-EN Product + DMPA-IM Product'] = df_combined['NET-EN Product'] + df_combined['DMPA-IM Product']
-    
-    # # add a baseline row
-    # df_combined.loc[-1] = ['Baseline (Years 1-4)', neten[0], dmpim[0], dmpsc[0], neten[0] + dmpim[0], neten_visit_costs[0], dmpim_visit_costs[0], neten_product_costs[0], dmpim_product_costs[0], neten[0] + dmpim[0], neten_product_costs[0] + dmpim_product_costs[0]]
+    # Prepare data for plotting
+    df = plot_data(results)
 
+    fig = create_plot(df, inputs['colors'])
 
+    # make output df for csv
+    df_combined = prepare_combined_data(results, inputs)
     csv_data = dcc.send_data_frame(df_combined.to_csv, "user_population_and_costs.csv", index=False)
-    
-    # csv_data_user = dcc.send_data_frame(df_users.to_csv, "user_population.csv", index=False)
-
-    # csv_data_cost = dcc.send_data_frame(df_costs.to_csv, "costs.csv", index=False)
 
-# not exporting individually, not producing baseline values. TO FIX
     if export_n_clicks > 0:
-        return fig, csv_data #, csv_data_user, csv_data_cost
+        return fig, csv_data
     else:
         return fig, None
 
@@ -2,6 +2,55 @@ import pandas as pd
 import plotly.graph_objs as go
 import numpy as np
 
+# Version of the calculation engine; bump whenever results change for the same inputs
+MODEL_VERSION = 3
+
+YEARS = 4
+
+# Manual NET-EN population sizes (as provided)
+MANUAL_NETEN_POP_SIZES = [552108, 557630, 563206, 568838]
+
+# Contraceptive methods known to the model, in display order. Visits are per year
+# and product costs annualised (Rand); the first visit multiplier scales the cost
+# of the first visit in every intervention year.
+METHODS = {}
+
+# Pregnancies per woman-year among sexually active women using no method (Trussell 2011)
+NO_METHOD_PREGNANCY_RATE = 0.85
+
+def register_method(key, label, num_visits, product_cost, first_visit_multiplier=1, color='#808080',
+                    commodities=None, cyp_per_user=1, continuation=1, failure_rate=0, introduced=False):
+    """Add (or replace) a contraceptive method in METHODS.
+
+    commodities maps each commodity a user needs to units per user per year
+    (default one '{label} units' per visit). cyp_per_user is the couple-years
+    of protection of a year's supply, continuation the share of a year's
+    users protected for the whole year and failure_rate the typical-use
+    pregnancies per user-year. introduced marks the method being introduced,
+    which users of the other methods switch to.
+    """
+    METHODS[key] = {
+        'label': label,
+        'num_visits': num_visits,
+        'product_cost': product_cost,
+        'first_visit_multiplier': first_visit_multiplier,
+        'color': color,
+        'commodities': commodities or {f'{label} units': num_visits},
+        'cyp_per_user': cyp_per_user,
+        'continuation': continuation,
+        'failure_rate': failure_rate,
+        'introduced': introduced,
+    }
+
+# One injection every 8 weeks (NET-EN) or 13 weeks (DMPA); DMPA-SC users self-inject between visits.
+# A year's injections give one CYP (6 NET-EN or 4 DMPA doses per CYP); typical-use failure 4% for injectables.
+register_method('neten', 'NET-EN', 6, 143.52, color='#003f5c', commodities={'NET-EN vials': 6, 'Syringes': 6},
+                failure_rate=0.04)
+register_method('dmpim', 'DMPA-IM', 4, 63.4, color='#7a5195', commodities={'DMPA-IM vials': 4, 'Syringes': 4},
+                failure_rate=0.04)
+register_method('dmpsc', 'DMPA-SC', 2, 116, first_visit_multiplier=2, color='#ef5675',
+                commodities={'DMPA-SC devices': 4}, failure_rate=0.04, introduced=True)
+
 def parse_pop_sizes(pop_sizes_str):
     """Parse population sizes from a string input."""
     if pop_sizes_str:
@@ -22,8 +71,65 @@ def calculate_costs(population, visit_cost, product_cost):
     """Calculate visit and product costs for a given population."""
     return population * visit_cost, population * product_cost
 
+def per_cyp(costs, cyp):
+    """Cost per couple-year of protection, 0 where no CYP is delivered."""
+    costs, cyp = np.asarray(costs, dtype=float), np.asarray(cyp, dtype=float)
+    return np.divide(costs, cyp, out=np.zeros(np.broadcast_shapes(costs.shape, cyp.shape)), where=cyp > 0)
+
+def outcome_factors(methods, pregnancy_rate=NO_METHOD_PREGNANCY_RATE):
+    """CYP per user (cyp_per_user times continuation) and pregnancies averted per CYP of each method."""
+    cyp = np.array([METHODS[key]['cyp_per_user'] * METHODS[key]['continuation'] for key in methods], dtype=float)
+    averted = np.array([max(pregnancy_rate - METHODS[key]['failure_rate'], 0) for key in methods], dtype=float)
+    return cyp, averted
+
+def outcome_series(populations, costs, total_costs, pregnancy_rate=NO_METHOD_PREGNANCY_RATE):
+    """CYP delivered, cost per CYP and pregnancies averted per method and year, and in total.
+
+    Works on lists of YEARS + 1 values and on arrays with leading scenario
+    axes. A method's CYP are its users times cyp_per_user and continuation
+    (METHODS); each CYP averts pregnancy_rate less the method's failure rate
+    pregnancies, compared with using no method.
+    """
+    cyp_per_user, averted_per_cyp = outcome_factors(populations, pregnancy_rate)
+    cyp, cost_per_cyp, pregnancies_averted = {}, {}, {}
+    for j, (key, users) in enumerate(populations.items()):
+        cyp[key] = np.asarray(users, dtype=float) * cyp_per_user[j]
+        cost_per_cyp[key] = per_cyp(np.asarray(costs[f'{key}_visit'], dtype=float) + costs[f'{key}_product'], cyp[key])
+        pregnancies_averted[key] = cyp[key] * averted_per_cyp[j]
+    total_cyp = sum(cyp.values())
+    return {
+        'cyp': cyp,
+        'cost_per_cyp': cost_per_cyp,
+        'pregnancies_averted': pregnancies_averted,
+        'total_cyp': total_cyp,
+        'total_cost_per_cyp': per_cyp(total_costs, total_cyp),
+        'total_pregnancies_averted': sum(pregnancies_averted.values()),
+    }
+
+def as_lists(values):
+    """Arrays (in nested dicts) as lists, the format of perform_calculations results."""
+    if isinstance(values, dict):
+        return {key: as_lists(value) for key, value in values.items()}
+    return values.tolist()
+
 def perform_calculations(inputs):
-    """Perform main calculations for the dashboard."""
+    """Perform main calculations for the dashboard.
+
+    inputs['mode'] selects the conversion model: 'static' (default) applies the
+    conversion rates to the baseline year populations, 'dynamic' applies them
+    year over year to the previous year's populations. The static model takes
+    the NET-EN population of each year from inputs['neten_pop_sizes'] if
+    given, else MANUAL_NETEN_POP_SIZES.
+
+    Inputs keyed by method (with inputs['methods'], see
+    method_engine.make_method_batch) may name any methods in METHODS; they
+    are evaluated by the method engine and give results in the same format.
+    """
+    if 'methods' in inputs:
+        from method_engine import perform_method_calculations
+        return perform_method_calculations(inputs)
+    if inputs.get('mode', 'static') == 'dynamic':
+        return perform_dynamic_calculations(inputs)
     dmpsc_start_pop = 0
     neten_start_pop, dmpim_start_pop = inputs['start_pops']
     neten_num_visits, neten_product_cost = inputs['neten_costs']
@@ -44,12 +150,11 @@ def perform_calculations(inputs):
     dmpim_conv_rates = [rate / 100 for rate in dmpim_conv_rates]
     neten_conv_rates = [rate / 100 for rate in neten_conv_rates]
 
-    years = 4
+    years = YEARS
     # number of users
     dmpim, dmpsc, neten = [n_dmpim], [n_dmpsc], [n_neten]
 
-    # Manual NET-EN population sizes (as provided)
-    manual_neten_pop_sizes = [552108, 557630, 563206, 568838]
+    manual_neten_pop_sizes = list(inputs.get('neten_pop_sizes') or MANUAL_NETEN_POP_SIZES)
 
     for i in range(years):
         if user_pop_sizes[i] is not None:
@@ -105,6 +210,18 @@ def perform_calculations(inputs):
 
     baseline_costs = [sum(x) for x in zip(baseline_dmpim_costs, baseline_dmpsc_costs, baseline_neten_costs)]
 
+    # Split of the baseline into visit and product costs per method
+    baseline_dmpim_pop = dmpim_start_pop if dmpim_start_pop > 0 else 0
+    baseline_neten_pops = neten_populations if neten_start_pop > 0 else [0] * (years + 1)
+    baseline_component_costs = {
+        'neten_visit': [n * neten_num_visits * cost_per_visit for n in baseline_neten_pops],
+        'neten_product': [n * neten_product_cost for n in baseline_neten_pops],
+        'dmpim_visit': [baseline_dmpim_pop * dmpim_num_visits * cost_per_visit] * (years + 1),
+        'dmpim_product': [baseline_dmpim_pop * dmpim_product_cost] * (years + 1),
+        'dmpsc_visit': [dmpsc_start_pop * dmpsc_num_visits * cost_per_visit] * (years + 1),
+        'dmpsc_product': [dmpsc_start_pop * dmpsc_product_cost] * (years + 1),
+    }
+
     # Calculate efficiency gains
     efficiency_gains = [b - t for b, t in zip(baseline_costs, total_costs)]
 
@@ -112,7 +229,7 @@ def perform_calculations(inputs):
     def pad_array(arr, target_length=5):
         return [arr[0]] * (target_length - len(arr)) + arr if len(arr) < target_length else arr
 
-    return {
+    results = {
         'populations': {
             'neten': pad_array(neten),
             'dmpim': pad_array(dmpim),
@@ -128,25 +245,105 @@ def perform_calculations(inputs):
         },
         'total_costs': pad_array(total_costs),
         'baseline_costs': pad_array(baseline_costs),
+        'baseline_component_costs': {k: pad_array(v) for k, v in baseline_component_costs.items()},
         'efficiency_gains': pad_array(efficiency_gains)
     }
+    results.update(as_lists(outcome_series(results['populations'], results['costs'], results['total_costs'])))
+    return results
+
+def perform_dynamic_calculations(inputs):
+    """Perform calculations with year-over-year conversion (dashboard_dynamic.py).
+
+    Conversion rates apply to the users remaining on DMPA-IM and NET-EN at the
+    end of the previous year, and the baseline is the cost of the starting
+    populations in every year. The result has the same structure as
+    perform_calculations.
+    """
+    neten_start_pop, dmpim_start_pop, dmpsc_start_pop = inputs['start_pops']
+    neten_num_visits, neten_product_cost = inputs['neten_costs']
+    dmpim_num_visits, dmpim_product_cost = inputs['dmpim_costs']
+    dmpsc_num_visits, dmpsc_product_cost = inputs['dmpsc_costs']
+    cost_per_visit = inputs['cost_per_visit']
+    dmpsc_first_visit_multiplier = inputs.get('dmpsc_first_visit_multiplier', 1)
+    user_pop_sizes = inputs['user_pop_sizes']
+
+    # Convert rates to decimals
+    dmpim_conv_rates = [rate / 100 for rate in inputs['dmpim_conv_rates']]
+    neten_conv_rates = [rate / 100 for rate in inputs['neten_conv_rates']]
+
+    years = YEARS
+    n_neten, n_dmpim, n_dmpsc = neten_start_pop, dmpim_start_pop, dmpsc_start_pop
+    dmpim, dmpsc, neten = [n_dmpim], [n_dmpsc], [n_neten]
+
+    for i in range(years):
+        if user_pop_sizes[i] is not None:
+            n_neten, n_dmpim, n_dmpsc = user_pop_sizes[i]
+        else:
+            n_dmpim, n_dmpsc = convert_population(n_dmpim, n_dmpsc, dmpim_conv_rates[i])
+            n_neten, n_dmpsc = convert_population(n_neten, n_dmpsc, neten_conv_rates[i])
+
+        dmpim.append(n_dmpim)
+        neten.append(n_neten)
+        dmpsc.append(n_dmpsc)
+
+    # Calculate costs
+    dmpim_visit_costs = [d * dmpim_num_visits * cost_per_visit for d in dmpim]
+    dmpsc_visit_costs = [d * dmpsc_num_visits * cost_per_visit for d in dmpsc]
+    neten_visit_costs = [n * neten_num_visits * cost_per_visit for n in neten]
+
+    dmpim_product_costs = [d * dmpim_product_cost for d in dmpim]
+    dmpsc_product_costs = [d * dmpsc_product_cost for d in dmpsc]
+    neten_product_costs = [n * neten_product_cost for n in neten]
+
+    for i in range(1, len(dmpsc_visit_costs)):  # Start from index 1 to skip the baseline year
+        dmpsc_visit_costs[i] += dmpsc[i] * cost_per_visit * (dmpsc_first_visit_multiplier - 1)
+
+    costs = {
+        'neten_visit': neten_visit_costs,
+        'neten_product': neten_product_costs,
+        'dmpim_visit': dmpim_visit_costs,
+        'dmpim_product': dmpim_product_costs,
+        'dmpsc_visit': dmpsc_visit_costs,
+        'dmpsc_product': dmpsc_product_costs,
+    }
+    total_costs = [sum(x) for x in zip(dmpim_visit_costs, dmpim_product_costs,
+                                       dmpsc_visit_costs, dmpsc_product_costs,
+                                       neten_visit_costs, neten_product_costs)]
+
+    # The baseline keeps the starting populations (and their costs) in every year
+    baseline_component_costs = {k: [v[0]] * (years + 1) for k, v in costs.items()}
+    baseline_costs = [total_costs[0]] * (years + 1)
+
+    efficiency_gains = [b - t for b, t in zip(baseline_costs, total_costs)]
 
-def create_plot(df, colors):
-    """Create the main plot for the dashboard."""
+    results = {
+        'populations': {
+            'neten': neten,
+            'dmpim': dmpim,
+            'dmpsc': dmpsc
+        },
+        'costs': costs,
+        'total_costs': total_costs,
+        'baseline_costs': baseline_costs,
+        'baseline_component_costs': baseline_component_costs,
+        'efficiency_gains': efficiency_gains
+    }
+    results.update(as_lists(outcome_series(results['populations'], costs, total_costs)))
+    return results
+
+def create_plot(df, colors, country='South Africa', currency='Rand'):
+    """Create the main plot for the dashboard (costs of plot_data, in billions of currency)."""
     fig = go.Figure()
 
     x_labels = ['Baseline<br>(Years 1-4)', 'Intervention<br>Year 1', 'Intervention<br>Year 2', 'Intervention<br>Year 3', 'Intervention<br>Year 4']
 
-    # Create a mapping between column prefixes and color keys
-    color_mapping = {
-        'NET-EN': 'neten',
-        'DMPA-IM': 'dmpim',
-        'DMPA-SC': 'dmpsc',
-        'Efficiency': 'efficiency_gain'
-    }
+    # Create a mapping between column prefixes (method labels) and color keys
+    color_mapping = {method['label']: key for key, method in METHODS.items()}
+    color_mapping['Efficiency'] = 'efficiency_gain'
+    colors = dict({key: method['color'] for key, method in METHODS.items()}, **colors)
 
     for column in df.columns:
-        prefix = column.split()[0]
+        prefix = next((label for label in color_mapping if column.startswith(label + ' ')), None)
         if prefix in color_mapping:
             color_key = color_mapping[prefix]
             if 'Visit' in column:
@@ -182,9 +379,9 @@ def create_plot(df, colors):
 
     fig.update_layout(
         barmode='stack',
-        title='Budget impact analysis of DMPA-SC for self injection introduction in South Africa<br>over 4 years with specified market share conversions from DMPA-IM and NET-EN to DMPA-SC.',
+        title=f'Budget impact analysis of DMPA-SC for self injection introduction in {country}<br>over 4 years with specified market share conversions from DMPA-IM and NET-EN to DMPA-SC.',
         xaxis_title='Year',
-        yaxis_title='Costs in Billions of Rand',
+        yaxis_title=f'Costs in Billions of {currency}',
         yaxis=dict(tickformat=".2f"),
         legend=dict(x=1.05, y=1)
     )
@@ -230,17 +427,39 @@ def create_plot(df, colors):
 
 #     return fig
 
+def result_methods(results):
+    """Methods of a results dict in METHODS (display) order.
+
+    Stored results come back with their keys sorted, so the order of
+    results['populations'] cannot be relied on.
+    """
+    return [key for key in METHODS if key in results['populations']]
+
+def plot_data(results):
+    """Costs in billions (of the results' currency) per method and cost type, total costs and efficiency gain for create_plot."""
+    data = {}
+    for key in result_methods(results):
+        label = METHODS[key]['label']
+        data[f'{label} Product'] = results['costs'][f'{key}_product']
+        data[f'{label} Visit'] = results['costs'][f'{key}_visit']
+    data['Total Costs'] = results['total_costs']
+    data['Efficiency gain'] = results['efficiency_gains']
+    return pd.DataFrame(data) / 1e9
+
 def prepare_combined_data(results, inputs):
     """Prepare combined data for the dashboard table."""
     years = ['Baseline (Year 1-4)', 'Intervention Year 1', 'Intervention Year 2', 'Intervention Year 3', 'Intervention Year 4']
-    
-    df_users = pd.DataFrame({
-        'Year': years,
-        'NET-EN Users': results['populations']['neten'],
-        'DMPA-IM Users': results['populations']['dmpim'],
-        'DMPA-SC Users': results['populations']['dmpsc'],
-        'NET-EN + DMPA-IM Users': [sum(x) for x in zip(results['populations']['neten'], results['populations']['dmpim'])],
-    })
+    methods = result_methods(results)
+    labels = [METHODS[key]['label'] for key in methods]
+    # Methods users switch from (all but the introduced method), summed in combined columns
+    source_methods = [key for key in methods if not METHODS[key]['introduced']]
+    sources = [METHODS[key]['label'] for key in source_methods]
+
+    df_users = pd.DataFrame({'Year': years})
+    df_users[' + '.join(sources) + ' Users'] = [
+        sum(x) for x in zip(*(results['populations'][key] for key in source_methods))]
+    for key, label in zip(methods, labels):
+        df_users[f'{label} Users'] = results['populations'][key]
     
     # Ensure all cost arrays have the same length
     def pad_array(arr, target_length=5):
@@ -248,30 +467,28 @@ def prepare_combined_data(results, inputs):
 
     baseline_costs = pad_array(results['baseline_costs'])
     
-    df_costs = pd.DataFrame({
-        'Year': years,
-        'NET-EN Product': results['costs']['neten_product'],
-        'NET-EN Visit': results['costs']['neten_visit'],
-        'DMPA-IM Product': results['costs']['dmpim_product'],
-        'DMPA-IM Visit': results['costs']['dmpim_visit'],
-        'DMPA-SC Product': results['costs']['dmpsc_product'],
-        'DMPA-SC Visit': results['costs']['dmpsc_visit'],
-        'Total Costs': results['total_costs'],
-        'Total Baseline Costs': baseline_costs,
-        'Efficiency gain': results['efficiency_gains']
-    })
+    df_costs = pd.DataFrame({'Year': years})
+    for kind in ('Visit', 'Product'):
+        columns = {f'{label} {kind}': results['costs'][f'{key}_{kind.lower()}'] for key, label in zip(methods, labels)}
+        df_costs[' + '.join(f'{label} {kind}' for label in sources)] = [
+            sum(x) for x in zip(*(columns[f'{label} {kind}'] for label in sources))]
+        for column, values in columns.items():
+            df_costs[column] = values
+    df_costs['Total Costs'] = results['total_costs']
+    df_costs['Total Baseline Costs'] = baseline_costs
+    df_costs['Efficiency gain'] = results['efficiency_gains']
+
+    # Couple-years of protection and pregnancies averted
+    for key, label in zip(methods, labels):
+        df_costs[f'{label} CYP'] = results['cyp'][key]
+        df_costs[f'{label} Cost per CYP'] = results['cost_per_cyp'][key]
+    df_costs['Total CYP'] = results['total_cyp']
+    df_costs['Cost per CYP'] = results['total_cost_per_cyp']
+    df_costs['Pregnancies Averted'] = results['total_pregnancies_averted']
     
     df_combined = pd.merge(df_users, df_costs, on='Year')
-    
-    df_combined['NET-EN Visit + DMPA-IM Visit'] = df_combined['NET-EN Visit'] + df_combined['DMPA-IM Visit']
-    df_combined['NET-EN Product + DMPA-IM Product'] = df_combined['NET-EN Product'] + df_combined['DMPA-IM Product']
-    
-    df_combined = df_combined[['Year', 'NET-EN + DMPA-IM Users', 'NET-EN Users', 'DMPA-IM Users', 'DMPA-SC Users', 
-                               'NET-EN Visit + DMPA-IM Visit', 'NET-EN Visit', 'DMPA-IM Visit', 'DMPA-SC Visit',
-                               'NET-EN Product + DMPA-IM Product', 'NET-EN Product', 'DMPA-IM Product', 'DMPA-SC Product', 
-                               'Total Costs', 'Total Baseline Costs', 'Efficiency gain']]
     # Round all numeric columns to 2 decimal places
     numeric_columns = df_combined.select_dtypes(include=[np.number]).columns
     df_combined[numeric_columns] = df_combined[numeric_columns].round(2)
     
-    return df_combined
\ No newline at end of file
+    return df_combined
@@ -0,0 +1,70 @@
+import numpy as np
+
+from dashboard_helpers import YEARS
+
+# Cost categories that can carry their own inflation rate
+COST_CATEGORIES = ['visit', 'product']
+
+def year_exponents():
+    """Years elapsed since intervention year 1 for each result column.
+
+    Column 0 is the baseline reference year and, like intervention year 1,
+    is valued at current prices without discounting.
+    """
+    return np.maximum(np.arange(YEARS + 1) - 1, 0)
+
+def adjustment_factors(discount_rate=0.0, inflation_rate=0.0):
+    """Factors turning real annual costs into present values, per result column.
+
+    Rates are fractions (0.03 for 3%) and may be arrays of shape (n,) to give
+    one row of factors per scenario.
+    """
+    growth = (1 + np.asarray(inflation_rate, dtype=float)[..., None]) / (1 + np.asarray(discount_rate, dtype=float)[..., None])
+    return growth ** year_exponents()
+
+def _inflation_rate(inflation_rates, cost_key):
+    """Inflation rate of a cost component, by its own key or its category (visit/product)."""
+    category = cost_key.rsplit('_', 1)[-1]
+    return inflation_rates.get(cost_key, inflation_rates.get(category, 0.0))
+
+def cumulative(stream):
+    """Running total over the intervention years (column 0 is zero)."""
+    stream = np.asarray(stream, dtype=float)
+    totals = np.zeros_like(stream)
+    totals[..., 1:] = np.cumsum(stream[..., 1:], axis=-1)
+    return totals
+
+def apply_discounting(results, discount_rate=0.0, inflation_rates=None):
+    """Present-value and cumulative cost streams for perform_calculations results.
+
+    Works on single results (lists of YEARS + 1 values) and on batched
+    results (arrays of shape (n, YEARS + 1)); rates may also be per-scenario
+    arrays. inflation_rates maps a category ('visit', 'product') or a cost key
+    (e.g. 'dmpsc_product') to an annual rate. Totals, baseline and efficiency
+    gain are rebuilt from the adjusted components so that each component is
+    inflated at its own rate.
+    """
+    inflation_rates = inflation_rates or {}
+
+    costs = {key: np.asarray(values, dtype=float)
+             * adjustment_factors(discount_rate, _inflation_rate(inflation_rates, key))
+             for key, values in results['costs'].items()}
+    baseline_components = {key: np.asarray(values, dtype=float)
+                           * adjustment_factors(discount_rate, _inflation_rate(inflation_rates, key))
+                           for key, values in results['baseline_component_costs'].items()}
+    total_costs = sum(costs.values())
+    baseline_costs = sum(baseline_components.values())
+
+    present_value = {
+        'costs': costs,
+        'total_costs': total_costs,
+        'baseline_costs': baseline_costs,
+        'efficiency_gains': baseline_costs - total_costs,
+    }
+    present_value['cumulative'] = {
+        'costs': {key: cumulative(values) for key, values in costs.items()},
+        'total_costs': cumulative(total_costs),
+        'baseline_costs': cumulative(baseline_costs),
+        'efficiency_gains': cumulative(present_value['efficiency_gains']),
+    }
+    return present_value
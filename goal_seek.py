@@ -0,0 +1,131 @@
+import numpy as np
+
+from batch_calculations import (PARAMETERS, DMPIM_CONV_RATES, NETEN_CONV_RATES, make_batch, batch_size,
+                                perform_batch_calculations, cumulative_efficiency_gain)
+
+# Parameter groups that are solved for as a common scale factor on their current values
+SCHEDULES = {
+    'dmpim_conv_schedule': DMPIM_CONV_RATES,
+    'neten_conv_schedule': NETEN_CONV_RATES,
+}
+
+SCHEDULE_LABELS = {
+    'dmpim_conv_schedule': 'DMPA-IM to DMPA-SC Conversion Schedule (scale)',
+    'neten_conv_schedule': 'NET-EN to DMPA-SC Conversion Schedule (scale)',
+}
+
+def efficiency_gain_in_year(year):
+    """Metric: efficiency gain in a single intervention year (1-4)."""
+    return lambda results: results['efficiency_gains'][:, year]
+
+def default_bounds(batch, parameter):
+    """Search interval for a parameter (or schedule scale factor) over a batch."""
+    if parameter in SCHEDULES:
+        # Scale the schedule up to the point where the largest rate reaches 100%
+        largest = np.max([batch[name] for name in SCHEDULES[parameter]], axis=0)
+        return np.zeros_like(largest), np.where(largest > 0, 100 / np.maximum(largest, 1e-12), 0.0)
+    value = batch[parameter]
+    if parameter in DMPIM_CONV_RATES + NETEN_CONV_RATES:
+        return np.zeros_like(value), np.full_like(value, 100.0)
+    return np.zeros_like(value), np.maximum(10 * np.abs(value), 1.0)
+
+def _set_parameter(batch, base, parameter, values):
+    """Write trial values into a batch (schedules are scaled from their base values)."""
+    if parameter in SCHEDULES:
+        for name in SCHEDULES[parameter]:
+            batch[name] = base[name] * values
+    else:
+        batch[parameter] = values
+
+def _repeat_scenarios(batch, n_targets):
+    """Repeat every scenario of a batch once per target (scenario-major order)."""
+    n = batch_size(batch)
+    repeated = {}
+    for name, value in batch.items():
+        if name in PARAMETERS:
+            value = np.broadcast_to(value, (n,))
+        if isinstance(value, np.ndarray) and value.ndim and value.shape[0] == n:
+            value = np.repeat(value, n_targets, axis=0)
+        repeated[name] = value
+    return repeated
+
+def goal_seek(inputs, parameter, targets=0.0, bounds=None, metric=cumulative_efficiency_gain,
+              batch=None, xtol=1e-14, ftol=1e-3, max_iter=100, grid=False):
+    """Solve for the value of one input that makes the metric hit each target.
+
+    parameter is a name in PARAMETERS, or a key of SCHEDULES to solve for a
+    scale factor applied to a whole conversion schedule. targets may be an
+    array, and batch may hold background scenarios (see make_batch); every
+    (scenario, target) pair is solved at once with a vectorized Illinois
+    (modified regula falsi) iteration, which keeps a sign-changing bracket and
+    so also converges across the integer steps of the conversion model.
+    Targets and scenarios are paired by broadcasting; with grid=True every
+    target is solved for every scenario and the arrays have shape
+    (scenarios, targets).
+
+    Returns a dict of arrays: 'value' (NaN where the target is not bracketed
+    by the bounds), 'residual', 'converged' (bracketed and within ftol of the
+    target, which a jump in the metric can prevent) and the number of
+    'iterations'.
+    """
+    if parameter not in PARAMETERS and parameter not in SCHEDULES:
+        raise KeyError(f"Unknown parameter: {parameter}")
+    targets = np.asarray(targets, dtype=float)
+    if batch is None:
+        batch = make_batch(inputs, 1 if grid else targets.size)
+    if grid:
+        shape = (batch_size(batch), targets.size)
+        batch = _repeat_scenarios(batch, targets.size)
+        targets = np.tile(targets.ravel(), shape[0])
+    n = np.broadcast_shapes((batch_size(batch),), (targets.size,))[0]
+    base = {name: np.broadcast_to(batch[name], (n,)).copy() for name in PARAMETERS}
+    trial = dict(batch, **base)
+    targets = np.broadcast_to(targets.ravel(), (n,))
+
+    if bounds is None:
+        lo, hi = default_bounds(base, parameter)
+    else:
+        lo, hi = (np.broadcast_to(np.asarray(b, dtype=float), (n,)).copy() for b in bounds)
+
+    def residual(values):
+        _set_parameter(trial, base, parameter, values)
+        return metric(perform_batch_calculations(trial)) - targets
+
+    f_lo, f_hi = residual(lo), residual(hi)
+    bracketed = np.sign(f_lo) * np.sign(f_hi) <= 0
+    x = np.where(np.abs(f_lo) < np.abs(f_hi), lo, hi)
+    done = ~bracketed | (np.abs(f_lo) <= ftol) | (np.abs(f_hi) <= ftol)
+    side = np.zeros(n, dtype=int)
+
+    iterations = 0
+    while not done.all() and iterations < max_iter:
+        iterations += 1
+        # Regula falsi step, falling back to bisection where it degenerates
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_new = hi - f_hi * (hi - lo) / (f_hi - f_lo)
+        x_new = np.where(np.isfinite(x_new) & (x_new > np.minimum(lo, hi)) & (x_new < np.maximum(lo, hi)),
+                         x_new, (lo + hi) / 2)
+        x_new = np.where(done, x, x_new)
+        f_new = residual(x_new)
+
+        replace_hi = ~done & (np.sign(f_new) == np.sign(f_hi))
+        replace_lo = ~done & ~replace_hi
+        # Illinois modification: halve the retained end point if the same side is kept twice
+        f_lo = np.where(replace_hi & (side == 1), f_lo / 2, f_lo)
+        f_hi = np.where(replace_lo & (side == -1), f_hi / 2, f_hi)
+        hi, f_hi = np.where(replace_hi, x_new, hi), np.where(replace_hi, f_new, f_hi)
+        lo, f_lo = np.where(replace_lo, x_new, lo), np.where(replace_lo, f_new, f_lo)
+        side = np.where(replace_hi, 1, np.where(replace_lo, -1, side))
+
+        x = np.where(done, x, x_new)
+        done |= (np.abs(f_new) <= ftol) | (np.abs(hi - lo) <= xtol * np.maximum(1.0, np.abs(x_new)))
+
+    final = residual(x)
+    solution = {
+        'value': np.where(bracketed, x, np.nan),
+        'residual': np.where(bracketed, final, np.nan),
+        'converged': bracketed & (np.abs(final) <= ftol),
+    }
+    if grid:
+        solution = {key: value.reshape(shape) for key, value in solution.items()}
+    return dict(solution, iterations=iterations)
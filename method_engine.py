@@ -0,0 +1,375 @@
+import numpy as np
+
+from dashboard_helpers import YEARS, MANUAL_NETEN_POP_SIZES, METHODS, as_lists, outcome_series
+
+# Age groups of the age-stratified mode and their width in years
+AGE_GROUPS = {'15-19': 5, '20-24': 5, '25-34': 10, '35-49': 15}
+
+# Arrays of a method batch and their shape after the scenario axis (y = years, a = age groups,
+# m = number of methods); the age axis is only present in the age-stratified mode
+METHOD_ARRAYS = {
+    'start_pops': ('a', 'm'),
+    'baseline_pop_sizes': ('y', 'a', 'm'),
+    'cost_per_visit': (),
+    'num_visits': ('m',),
+    'product_costs': ('m',),
+    'first_visit_multipliers': ('m',),
+    'conv_rates': ('y', 'a', 'm', 'm'),
+    'continuation_rates': ('y', 'a', 'm'),
+    'new_users': ('y', 'a', 'm'),
+    'growth_rates': ('y',),
+}
+
+# Batch arrays that the baseline projection and the populations depend on (costs affect neither)
+PROJECTION_ARRAYS = ('start_pops', 'baseline_pop_sizes', 'continuation_rates', 'new_users', 'growth_rates')
+POPULATION_ARRAYS = PROJECTION_ARRAYS + ('conv_rates', 'user_pop_sizes')
+
+# Inputs passed through unchanged by method_inputs
+OPTIONAL_INPUTS = ('continuation_rates', 'new_users', 'growth_rates', 'age_groups', 'age_shares', 'age_exit')
+
+def method_inputs(inputs):
+    """Method-axis inputs equivalent to perform_calculations inputs for NET-EN, DMPA-IM and DMPA-SC.
+
+    Optional 'continuation_rates', 'new_users', 'growth_rates', 'age_groups',
+    'age_shares' and 'age_exit' in inputs are passed through (see make_method_batch),
+    and the conversion rates may be given per age group; with population
+    dynamics the static NET-EN baseline is projected rather than taken from
+    the manual population sizes, unless inputs['neten_pop_sizes'] is given.
+    """
+    optional = {name: inputs[name] for name in OPTIONAL_INPUTS if inputs.get(name) is not None}
+    mode = inputs.get('mode', 'static')
+    neten_start_pop, dmpim_start_pop = inputs['start_pops'][:2]
+    dmpsc_start_pop = inputs['start_pops'][2] if mode == 'dynamic' and len(inputs['start_pops']) > 2 else 0
+    neten_pop_sizes = list(inputs.get('neten_pop_sizes') or MANUAL_NETEN_POP_SIZES)
+    projected = inputs.get('neten_pop_sizes') is None and set(optional) - {'age_groups', 'age_shares', 'age_exit'}
+    methods = ['neten', 'dmpim', 'dmpsc']
+    converted = {
+        'methods': methods,
+        'mode': mode,
+        'start_pops': {'neten': neten_start_pop, 'dmpim': dmpim_start_pop, 'dmpsc': dmpsc_start_pop},
+        # The static model applies conversion to the manual NET-EN populations; the rest are projected
+        'baseline_pop_sizes': {'neten': neten_pop_sizes if neten_start_pop > 0 else [0] * YEARS}
+                              if mode == 'static' and not projected else {},
+        'cost_per_visit': inputs['cost_per_visit'],
+        'method_costs': {'neten': list(inputs['neten_costs']), 'dmpim': list(inputs['dmpim_costs']),
+                         'dmpsc': list(inputs['dmpsc_costs'])},
+        'first_visit_multipliers': {'neten': 1, 'dmpim': 1,
+                                    'dmpsc': inputs.get('dmpsc_first_visit_multiplier', 1)},
+        'conv_rates': {'dmpim': {'dmpsc': inputs['dmpim_conv_rates']},
+                       'neten': {'dmpsc': inputs['neten_conv_rates']}},
+        'user_pop_sizes': [None if sizes is None else dict(zip(methods, sizes))
+                           for sizes in inputs.get('user_pop_sizes') or [None] * YEARS],
+    }
+    converted.update(optional)
+    return converted
+
+def make_method_batch(inputs, n=1, years=YEARS, **overrides):
+    """Build a batch of n scenarios over a horizon of years with methods as an array axis.
+
+    inputs names its methods in inputs['methods'] (keys of METHODS) and gives
+    per-method values as dicts keyed by method: 'start_pops', optional
+    'baseline_pop_sizes' (yearly populations conversion applies to in the
+    static mode; default the projection of the starting population),
+    optional 'method_costs' ([visits, product cost]) and
+    'first_visit_multipliers' (default from METHODS), 'conv_rates'
+    ({source: {target: yearly % of source users switching}}) and optional
+    'user_pop_sizes' (per year None or {method: users}).
+
+    Population dynamics are optional: 'continuation_rates' ({method: yearly %
+    of users still using the method a year later}, default 100),
+    'new_users' ({method: yearly users starting the method}, default 0) and
+    'growth_rates' (yearly % growth of all user populations, default 0).
+    Yearly values are a number or a list of years numbers.
+
+    With inputs['age_groups'] (e.g. AGE_GROUPS) the batch is age-stratified:
+    every per-method value may instead be a dict keyed by age group. Users
+    and new users given as a single value are split across age groups by
+    inputs['age_shares'] ({age group: share}, default in proportion to the
+    width of the groups); rates apply to every group. user_pop_sizes stay
+    totals per method. Users ageing out of the oldest group are replaced by
+    an entry cohort of the same size in the youngest, so age groups alone do
+    not change the totals; with inputs['age_exit'] they leave instead.
+
+    Keyword arguments replace whole arrays (see METHOD_ARRAYS) with values
+    broadcastable to their shape.
+    """
+    methods = list(inputs['methods'])
+    m = len(methods)
+    age_groups = inputs.get('age_groups')
+    stratified = age_groups is not None
+    ages = list(age_groups) if stratified else [None]
+    if stratified:
+        shares = inputs.get('age_shares') or age_groups
+        shares = np.array([shares[age] for age in ages], dtype=float)
+        shares /= shares.sum()
+
+    def by_age(value, shape, users=False):
+        """A per-method value as (ages,) + shape."""
+        if isinstance(value, dict):
+            return np.stack([np.broadcast_to(np.asarray(value[age], dtype=float), shape) for age in ages])
+        value = np.broadcast_to(np.asarray(value, dtype=float), shape)
+        if stratified and users:
+            return shares.reshape((-1,) + (1,) * len(shape)) * value
+        return np.broadcast_to(value, (len(ages),) + shape)
+
+    def yearly(values, default, users=False):
+        """Per-method yearly values as (years, ages, m)."""
+        return np.stack([by_age(values.get(key, default), (years,), users) for key in methods], axis=-1
+                        ).transpose(1, 0, 2)
+
+    costs = inputs.get('method_costs', {})
+    multipliers = inputs.get('first_visit_multipliers', {})
+    conv_rates = np.zeros((years, len(ages), m, m))
+    for source, targets in inputs.get('conv_rates', {}).items():
+        for target, rates in targets.items():
+            conv_rates[:, :, methods.index(source), methods.index(target)] = by_age(rates, (years,)).T
+
+    values = {
+        'start_pops': np.stack([by_age(inputs['start_pops'].get(key, 0), (), True) for key in methods], axis=-1),
+        'baseline_pop_sizes': yearly(inputs.get('baseline_pop_sizes', {}), np.nan, True),
+        'cost_per_visit': inputs['cost_per_visit'],
+        'num_visits': [costs.get(key, [METHODS[key]['num_visits']])[0] for key in methods],
+        'product_costs': [costs[key][1] if key in costs else METHODS[key]['product_cost'] for key in methods],
+        'first_visit_multipliers': [multipliers.get(key, METHODS[key]['first_visit_multiplier']) for key in methods],
+        'conv_rates': conv_rates,
+        'continuation_rates': yearly(inputs.get('continuation_rates', {}), 100),
+        'new_users': yearly(inputs.get('new_users', {}), 0, True),
+        'growth_rates': inputs.get('growth_rates', 0),
+    }
+    batch = {}
+    for name, shape in METHOD_ARRAYS.items():
+        if 'a' in shape and not stratified:
+            values[name] = np.squeeze(values[name], axis=shape.index('a'))
+        value = overrides.pop(name, values[name])
+        shape = tuple({'m': m, 'y': years, 'a': len(ages)}[d] for d in shape if stratified or d != 'a')
+        batch[name] = np.broadcast_to(np.asarray(value, dtype=float), (n,) + shape)
+
+    user_pop_sizes = overrides.pop('user_pop_sizes', None)
+    if user_pop_sizes is None and any(s is not None for s in inputs.get('user_pop_sizes') or []):
+        user_pop_sizes = np.full((years, m), np.nan)
+        for i, sizes in enumerate(inputs['user_pop_sizes']):
+            if sizes is not None:
+                user_pop_sizes[i] = [sizes.get(key, 0) for key in methods]
+    if overrides:
+        raise KeyError(f"Unknown arrays: {', '.join(overrides)}")
+    batch['user_pop_sizes'] = (None if user_pop_sizes is None
+                               else np.broadcast_to(np.asarray(user_pop_sizes, dtype=float), (n, years, m)))
+    batch['methods'] = methods
+    batch['mode'] = inputs.get('mode', 'static')
+    if stratified:
+        batch['age_groups'] = dict(age_groups)
+        batch['age_exit'] = bool(inputs.get('age_exit', False))
+    return batch
+
+def _by_age(batch, name):
+    """A batch array with the age axis inserted (length 1) if the batch is not age-stratified."""
+    array = batch[name]
+    if 'age_groups' in batch:
+        return array
+    return np.expand_dims(array, METHOD_ARRAYS[name].index('a') + 1)
+
+def switching_pairs(conv_rates):
+    """Source-target pairs with any switching in conv_rates (n, years, ages, m, m).
+
+    Returns the source method of each pair (p,), the rates of each pair as
+    fractions laid out (year, pair, age, scenario) and the (m, p) matrix of
+    -1 (users leave) and +1 (users join) that maps switched users of each
+    pair back to methods.
+    """
+    n, years, a, m, _ = conv_rates.shape
+    pairs = np.flatnonzero(np.any(conv_rates != 0, axis=(0, 1, 2)))
+    sources, targets = np.divmod(pairs, m)
+    rates = conv_rates.reshape(n, years, a, m * m)[..., pairs].transpose(1, 3, 2, 0) / 100
+    net = (targets == np.arange(m)[:, None]).astype(float) - (sources == np.arange(m)[:, None])
+    return sources, rates, net
+
+def pairs_to_methods(matrix, switched):
+    """Apply an (m, p) matrix over the pair axis of switched (..., p, ages, n)."""
+    shape = switched.shape
+    return (matrix @ switched.reshape(shape[:-2] + (-1,))).reshape(shape[:-3] + (len(matrix),) + shape[-2:])
+
+def next_year_populations(populations, continuation, new_users, growth, switching=None):
+    """Users of each method a year on, as (users, users who discontinued), both (m, ages, n).
+
+    populations, continuation (fractions) and new_users are (m, ages, n)
+    and growth (fraction) is (n,). Users who continue switch between
+    methods as given by switching (sources, that year's (p, ages, n) rates
+    and the net matrix of switching_pairs), then all users grow and new
+    users join. Each step is truncated to whole users.
+    """
+    continuing = np.trunc(populations * continuation)
+    discontinued = populations - continuing
+    users = continuing
+    if switching is not None:
+        sources, rates, net = switching
+        users += pairs_to_methods(net, np.trunc(continuing[sources] * rates))
+    users *= 1 + growth
+    np.trunc(users, out=users)
+    users += new_users
+    return users, discontinued
+
+def age_populations(populations, ageing, exit=False):
+    """Move the fraction ageing (ages,) of each age group's users (m, ages, n) up one group.
+
+    Users ageing out of the last group enter the first as a new cohort of
+    the same size, or with exit leave the population.
+    """
+    moving = np.trunc(populations * ageing[:, None])
+    aged = populations - moving
+    aged[:, 1:] += moving[:, :-1]
+    if not exit:
+        aged[:, 0] += moving[:, -1]
+    return aged
+
+def override_populations(populations, totals):
+    """Scale users (m, ages, n) to totals (m, n) where totals are set (not NaN).
+
+    The age distribution is kept; the remainder after truncation to whole
+    users goes to the first age group.
+    """
+    current = populations.sum(axis=1)
+    ratio = np.divide(totals, current, out=np.zeros_like(current), where=current != 0)
+    scaled = np.trunc(populations * ratio[:, None])
+    scaled[:, 0] += totals - scaled.sum(axis=1)
+    return np.where(np.isnan(totals)[:, None], populations, scaled)
+
+def perform_method_batch(batch):
+    """Populations and costs of every scenario, method and year of a method batch.
+
+    Returns arrays with axes (scenario, method, year) for 'populations',
+    'discontinued', 'visit_costs', 'product_costs', 'baseline_visit_costs'
+    and 'baseline_product_costs', and (scenario, year) for 'total_costs',
+    'baseline_costs' and 'efficiency_gains'; age-stratified batches also
+    return 'populations_by_age' (scenario, method, age, year). The static and
+    dynamic models follow perform_calculations and
+    perform_dynamic_calculations: switching users are truncated to whole
+    users per source and target, and the first visit multiplier applies in
+    intervention years. The baseline is the projection of the starting
+    populations with continuation, new users, growth and ageing but no
+    switching; without those it is the starting populations in every year,
+    as before. In the age-stratified mode a share 1/width of each age
+    group's users moves up a group every year (see age_populations).
+
+    Internally arrays are laid out (year, method, age, scenario), so every
+    method-year is one contiguous vector over ages and scenarios and the
+    year recurrence runs on whole arrays: age groups widen the arrays
+    rather than adding passes. Switching is computed for the source-target
+    pairs in use only, so work grows with the number of methods, pairs and
+    age groups through array width only. Costs are computed on the users
+    summed over age groups, and populations only once when their inputs are
+    shared by every scenario. The returned arrays are (broadcast) views.
+    """
+    n, m = batch['cost_per_visit'].shape[0], len(batch['methods'])
+    years = batch['conv_rates'].shape[1]
+    age_groups = batch.get('age_groups')
+    ageing = 1 / np.array(list(age_groups.values()), dtype=float) if age_groups else None
+    age_exit = batch.get('age_exit', False)
+
+    # Populations do not depend on costs, nor the baseline projection on switching: when their
+    # inputs are the same for every scenario (e.g. a sweep over costs) they are computed once
+    def scenario_width(names):
+        shared = all(batch.get(name) is None or len(batch[name]) == 1 or batch[name].strides[0] == 0
+                     for name in names)
+        return 1 if shared else n
+    width = scenario_width(POPULATION_ARRAYS)
+    projection_width = scenario_width(PROJECTION_ARRAYS)
+    sources, rates, net = switching_pairs(_by_age(batch, 'conv_rates')[:scenario_width(('conv_rates',))])
+    continuation = _by_age(batch, 'continuation_rates')[:projection_width].transpose(1, 3, 2, 0) / 100
+    new_users = _by_age(batch, 'new_users')[:projection_width].transpose(1, 3, 2, 0)
+    growth = batch['growth_rates'][:projection_width].T / 100
+    user_pop_sizes = batch.get('user_pop_sizes')
+    if user_pop_sizes is not None:
+        user_pop_sizes = user_pop_sizes[:width].transpose(1, 2, 0)
+    dynamic = batch.get('mode', 'static') == 'dynamic'
+    a = continuation.shape[2]
+
+    populations = np.empty((years + 1, m, a, width))
+    discontinued = np.zeros((years + 1, m, a, width))
+    projected = np.empty((years + 1, m, a, projection_width))
+    populations[0] = projected[0] = _by_age(batch, 'start_pops')[:projection_width].transpose(2, 1, 0)
+    for i in range(years):
+        projected[i + 1], _ = next_year_populations(projected[i], continuation[i], new_users[i], growth[i])
+        if ageing is not None:
+            projected[i + 1] = age_populations(projected[i + 1], ageing, age_exit)
+        if dynamic:
+            populations[i + 1], discontinued[i + 1] = next_year_populations(
+                populations[i], continuation[i], new_users[i], growth[i], (sources, rates[i], net))
+            if ageing is not None:
+                populations[i + 1] = age_populations(populations[i + 1], ageing, age_exit)
+            if user_pop_sizes is not None:
+                populations[i + 1] = override_populations(populations[i + 1], user_pop_sizes[i])
+
+    # Manual baseline populations replace the projection where given
+    manual = _by_age(batch, 'baseline_pop_sizes')[:projection_width].transpose(1, 3, 2, 0)
+    baseline_pops = projected
+    np.copyto(baseline_pops[1:], manual, where=~np.isnan(manual))
+    if not dynamic:
+        # Conversion applies to each year's baseline users
+        base = baseline_pops[1:]
+        leaving, joining = np.maximum(-net, 0), np.maximum(net, 0)
+        populations[1:] = (np.trunc(base * (1 - pairs_to_methods(leaving, rates)))
+                           + pairs_to_methods(joining, np.trunc(base[:, sources] * rates)))
+        if user_pop_sizes is not None:
+            for i in range(years):
+                populations[i + 1] = override_populations(populations[i + 1], user_pop_sizes[i])
+        np.subtract(baseline_pops[:-1], np.trunc(baseline_pops[:-1] * continuation), out=discontinued[1:])
+
+    populations_by_age = populations
+    populations, baseline_pops = populations.sum(axis=2), baseline_pops.sum(axis=2)
+
+    # Costs per method: visits (with the longer first visit in intervention years) and product
+    cost_per_visit = batch['cost_per_visit']
+    num_visits, product_cost = batch['num_visits'].T, batch['product_costs'].T
+    visit_costs = populations * num_visits * cost_per_visit
+    visit_costs[1:] += populations[1:] * cost_per_visit * (batch['first_visit_multipliers'].T - 1)
+    product_costs = populations * product_cost
+    total_costs = (visit_costs + product_costs).sum(axis=1)
+
+    baseline_visit_costs = baseline_pops * num_visits * cost_per_visit
+    baseline_product_costs = baseline_pops * product_cost
+    baseline_costs = (baseline_visit_costs + baseline_product_costs).sum(axis=1)
+
+    by_scenario = lambda array: np.broadcast_to(array, array.shape[:-1] + (n,)).transpose(2, 1, 0)
+    results = {
+        'methods': list(batch['methods']),
+        'populations': by_scenario(populations),
+        'discontinued': by_scenario(discontinued.sum(axis=2)),
+        'visit_costs': by_scenario(visit_costs),
+        'product_costs': by_scenario(product_costs),
+        'total_costs': total_costs.T,
+        'baseline_visit_costs': by_scenario(baseline_visit_costs),
+        'baseline_product_costs': by_scenario(baseline_product_costs),
+        'baseline_costs': baseline_costs.T,
+        'efficiency_gains': (baseline_costs - total_costs).T,
+    }
+    if age_groups:
+        results['age_groups'] = list(age_groups)
+        results['populations_by_age'] = np.broadcast_to(populations_by_age, populations_by_age.shape[:-1] + (n,)
+                                                        ).transpose(3, 1, 2, 0)
+    return results
+
+def named_results(results, k=None):
+    """Method-axis results in the perform_calculations layout (keys per method).
+
+    With k, scenario k as lists; otherwise arrays with a leading scenario
+    axis. CYP, cost per CYP and pregnancies averted (outcome_series) are added.
+    """
+    row = (lambda a: a[k].tolist()) if k is not None else (lambda a: a)
+    methods = results['methods']
+    named = {
+        'populations': {key: row(results['populations'][:, j]) for j, key in enumerate(methods)},
+        'costs': {f'{key}_{kind}': row(results[f'{kind}_costs'][:, j])
+                  for j, key in enumerate(methods) for kind in ('visit', 'product')},
+        'total_costs': row(results['total_costs']),
+        'baseline_costs': row(results['baseline_costs']),
+        'baseline_component_costs': {f'{key}_{kind}': row(results[f'baseline_{kind}_costs'][:, j])
+                                     for j, key in enumerate(methods) for kind in ('visit', 'product')},
+        'efficiency_gains': row(results['efficiency_gains']),
+    }
+    outcomes = outcome_series(named['populations'], named['costs'], named['total_costs'])
+    named.update(as_lists(outcomes) if k is not None else outcomes)
+    return named
+
+def perform_method_calculations(inputs):
+    """perform_calculations for any set of registered methods (inputs as for make_method_batch)."""
+    return named_results(perform_method_batch(make_method_batch(inputs)), 0)
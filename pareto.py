@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+
+from batch_calculations import (DMPIM_CONV_RATES, NETEN_CONV_RATES, PARAMETER_LABELS, make_batch,
+                                perform_batch_calculations, cumulative_efficiency_gain)
+from sampling import unit_samples
+
+# Inputs searched over: both yearly conversion schedules and the DMPA-SC product cost
+SEARCH_PARAMETERS = DMPIM_CONV_RATES + NETEN_CONV_RATES + ['dmpsc_product_cost']
+
+def peak_annual_spend(results):
+    """Highest total cost of any intervention year (scalar or per scenario)."""
+    return np.max(np.asarray(results['total_costs'])[..., 1:], axis=-1)
+
+def dmpsc_uptake(results):
+    """DMPA-SC users in the final intervention year (scalar or per scenario)."""
+    return np.asarray(results['populations']['dmpsc'])[..., -1]
+
+# Objectives of the search as (result function, sign): +1 is maximised, -1 minimised
+OBJECTIVES = {
+    'efficiency_gain': (cumulative_efficiency_gain, 1),
+    'peak_annual_spend': (peak_annual_spend, -1),
+    'dmpsc_uptake': (dmpsc_uptake, 1),
+}
+
+def pareto_mask(objectives, block_size=1024):
+    """Mask of the rows of objectives (n, k), all maximised, that no other row dominates.
+
+    Rows are sorted lexicographically (best first), so a row can only be
+    dominated by rows before it; they are checked in blocks against the
+    front found so far and against earlier rows of their block. Of
+    identical rows only the first is kept.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    order = np.lexsort(-objectives.T[::-1])
+    ranked = objectives[order]
+    mask = np.zeros(len(objectives), dtype=bool)
+    front = ranked[:0]
+    for start in range(0, len(ranked), block_size):
+        rows = np.arange(start, min(start + block_size, len(ranked)))
+        # Most rows fall to the front so far; only the rest are compared with each other
+        rows = rows[~(front[None] >= ranked[rows][:, None]).all(axis=-1).any(axis=1)]
+        block = ranked[rows]
+        rows = rows[~np.tril((block[None] >= block[:, None]).all(axis=-1), -1).any(axis=1)]
+        mask[order[rows]] = True
+        front = np.concatenate([front, ranked[rows]])
+    return mask
+
+def sample_candidates(n, product_cost_range, method='sobol', seed=None, monotone=True):
+    """n candidate {parameter: values} over SEARCH_PARAMETERS.
+
+    Conversion rates span 0-100%; with monotone, each schedule is sorted so
+    uptake never falls from one year to the next.
+    """
+    unit = unit_samples(n, len(SEARCH_PARAMETERS), method, seed)
+    dmpim_rates = unit[:, :len(DMPIM_CONV_RATES)] * 100
+    neten_rates = unit[:, len(DMPIM_CONV_RATES):-1] * 100
+    if monotone:
+        dmpim_rates, neten_rates = np.sort(dmpim_rates, axis=1), np.sort(neten_rates, axis=1)
+    lo, hi = product_cost_range
+    candidates = {name: dmpim_rates[:, i] for i, name in enumerate(DMPIM_CONV_RATES)}
+    candidates.update({name: neten_rates[:, i] for i, name in enumerate(NETEN_CONV_RATES)})
+    candidates['dmpsc_product_cost'] = lo + unit[:, -1] * (hi - lo)
+    return candidates
+
+def pareto_search(inputs, n_candidates=2 ** 16, product_cost_range=None, objectives=tuple(OBJECTIVES),
+                  monotone=True, seed=None, chunk_size=2 ** 16):
+    """Pareto-optimal conversion schedules and DMPA-SC product costs.
+
+    Candidates from a scrambled Sobol sequence are evaluated chunk by chunk
+    with the batched engine, keeping only the running Pareto front of the
+    given OBJECTIVES: by default 4-year efficiency gain and final-year
+    DMPA-SC uptake (maximised) against peak annual spend (minimised). All
+    other inputs are as given. product_cost_range defaults to +/- 50% of
+    the current DMPA-SC product cost. Returns the front sorted by spend and
+    a sample of all candidates (for plotting).
+    """
+    current = inputs['dmpsc_costs'][1]
+    product_cost_range = product_cost_range or (current * 0.5, current * 1.5)
+    candidates = sample_candidates(n_candidates, product_cost_range, 'sobol', seed, monotone)
+
+    front = pd.DataFrame()
+    samples = []
+    for start in range(0, n_candidates, chunk_size):
+        chunk = {name: values[start:start + chunk_size] for name, values in candidates.items()}
+        results = perform_batch_calculations(make_batch(inputs, len(chunk['dmpsc_product_cost']), **chunk))
+        table = pd.DataFrame(chunk)
+        for name in OBJECTIVES:
+            table[name] = OBJECTIVES[name][0](results)
+        samples.append(table.iloc[:max(5000 * len(table) // n_candidates, 1)])
+        front = pd.concat([front, table], ignore_index=True)
+        signed = np.column_stack([front[name] * OBJECTIVES[name][1] for name in objectives])
+        front = front[pareto_mask(signed)]
+    return front.sort_values('peak_annual_spend').reset_index(drop=True), pd.concat(samples, ignore_index=True)
+
+def create_pareto_plot(front, samples):
+    """Create a scatter of candidates and the Pareto front of efficiency gain against peak annual spend.
+
+    Front points are coloured by DMPA-SC uptake.
+    """
+    fig = go.Figure()
+
+    fig.add_trace(go.Scattergl(x=samples['peak_annual_spend'] / 1e9, y=samples['efficiency_gain'] / 1e9,
+                               mode='markers', marker=dict(color='#bbbbbb', size=4), name='Candidates',
+                               hoverinfo='skip'))
+    hover = ['<br>'.join([f"DMPA-SC users in year 4: {row['dmpsc_uptake']:,.0f}"]
+                         + [f"{PARAMETER_LABELS[name]}: {row[name]:,.1f}" for name in SEARCH_PARAMETERS])
+             for _, row in front.iterrows()]
+    fig.add_trace(go.Scatter(x=front['peak_annual_spend'] / 1e9, y=front['efficiency_gain'] / 1e9,
+                             mode='markers', name='Pareto front', text=hover,
+                             marker=dict(color=front['dmpsc_uptake'], colorscale='Viridis', size=7,
+                                         colorbar=dict(title='DMPA-SC users<br>in year 4')),
+                             hovertemplate='Peak spend: R%{x:.3f}bn<br>Gain: R%{y:.3f}bn<br>%{text}<extra></extra>'))
+
+    fig.update_layout(
+        title='Efficiency gain against peak annual spend',
+        xaxis_title='Peak Annual Spend in Billions of Rand',
+        yaxis_title='4-Year Efficiency Gain in Billions of Rand',
+        yaxis=dict(tickformat=".2f"),
+        legend=dict(x=1.05, y=1)
+    )
+
+    return fig
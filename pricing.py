@@ -0,0 +1,119 @@
+import numpy as np
+
+from dashboard_helpers import METHODS, outcome_series
+
+# Kinds of price-volume curve: 'tiered' charges the price of the tier a volume falls in
+# (all-units discount), 'continuous' interpolates linearly between the curve's points
+CURVE_KINDS = ['tiered', 'continuous']
+
+def price_curve(volumes, prices, kind='tiered'):
+    """A price-volume curve: unit prices (Rand per user per year) at annual volumes (users).
+
+    volumes are increasing tier thresholds (the first usually 0); prices[i]
+    applies from volumes[i]. prices may have leading axes (e.g. (n, k), one
+    curve per scenario for PSA) sharing the same volumes. Below the first
+    volume the first price applies, above the last the last price.
+    """
+    volumes = np.asarray(volumes, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    if kind not in CURVE_KINDS:
+        raise ValueError(f"Unknown price curve kind {kind!r}, expected one of {', '.join(CURVE_KINDS)}")
+    if volumes.ndim != 1 or len(volumes) == 0 or prices.shape[-1:] != volumes.shape:
+        raise ValueError("A price curve needs one price per volume")
+    if np.any(np.diff(volumes) <= 0):
+        raise ValueError("Price curve volumes must be increasing")
+    return {'volumes': volumes, 'prices': prices, 'kind': kind}
+
+def parse_price_curve(volumes_str, prices_str, kind='tiered'):
+    """Price curve from comma-separated volumes and prices (dashboard inputs), or None if either is empty.
+
+    Raises ValueError with a message for the user if the curve is malformed.
+    """
+    if not volumes_str or not prices_str:
+        return None
+    try:
+        volumes = [float(x.strip()) for x in volumes_str.split(',')]
+        prices = [float(x.strip()) for x in prices_str.split(',')]
+    except ValueError:
+        raise ValueError("Price curve volumes and prices must be comma-separated numbers") from None
+    return price_curve(volumes, prices, kind)
+
+def unit_prices(curve, users):
+    """Unit price at each volume of users (any shape, e.g. (n, YEARS + 1)), looked up with searchsorted.
+
+    Per-scenario prices (n, k) broadcast against users (n, ...).
+    """
+    volumes, prices = curve['volumes'], curve['prices']
+    users = np.asarray(users, dtype=float)
+    tier = np.searchsorted(volumes, users, side='right') - 1
+    if curve['kind'] == 'tiered' or len(volumes) == 1:
+        return _take(prices, np.maximum(tier, 0), users.ndim)
+
+    lower = np.clip(tier, 0, len(volumes) - 2)
+    fraction = np.clip((users - volumes[lower]) / (volumes[lower + 1] - volumes[lower]), 0, 1)
+    low, high = _take(prices, lower, users.ndim), _take(prices, lower + 1, users.ndim)
+    return low + fraction * (high - low)
+
+def _take(prices, index, ndim):
+    """prices[..., index] for 1-D prices, else gathered per scenario along the last axis."""
+    if prices.ndim == 1:
+        return prices[index]
+    prices = prices.reshape(prices.shape[:-1] + (1,) * (ndim - prices.ndim + 1) + prices.shape[-1:])
+    shape = np.broadcast_shapes(prices.shape[:-1], index.shape)
+    return np.take_along_axis(np.broadcast_to(prices, shape + prices.shape[-1:]),
+                              np.broadcast_to(index, shape)[..., None], axis=-1)[..., 0]
+
+def apply_price_curves(results, curves, product_costs, baseline_populations=None):
+    """perform_calculations (or batched) results with product costs priced from price-volume curves.
+
+    curves maps a method key to a price_curve; methods without a curve keep
+    their flat product cost. The volume of a year is the method's users in
+    that year, so the price falls as uptake grows. The baseline users of a
+    method with a curve are taken from baseline_populations (method key to
+    users per year) if given, else recovered from the baseline product costs
+    with product_costs, the flat product costs of the run (numbers or (n,)
+    arrays); that needs a positive flat cost, so a ValueError is raised
+    otherwise rather than pricing the baseline at zero users. Totals,
+    baseline, efficiency gain and cost per CYP are rebuilt from the
+    components. Returns a results dict of arrays with the same keys, plus the
+    'unit_prices' used for each method with a curve.
+    """
+    costs = {key: np.asarray(values, dtype=float) for key, values in results['costs'].items()}
+    baseline_components = {key: np.asarray(values, dtype=float)
+                           for key, values in results['baseline_component_costs'].items()}
+    prices = {}
+    for key, curve in curves.items():
+        if key not in results['populations']:
+            raise KeyError(f"No users of {METHODS.get(key, {}).get('label', key)} in the results")
+        users = np.asarray(results['populations'][key], dtype=float)
+        prices[key] = unit_prices(curve, users)
+        costs[f'{key}_product'] = users * prices[key]
+
+        if baseline_populations is not None and key in baseline_populations:
+            baseline_users = np.broadcast_to(np.asarray(baseline_populations[key], dtype=float), users.shape)
+        else:
+            flat = np.asarray(product_costs[key], dtype=float)[..., None]
+            if np.any(flat <= 0):
+                raise ValueError(f"The baseline users of {METHODS.get(key, {}).get('label', key)} cannot be "
+                                 "recovered from a flat product cost of 0; pass baseline_populations")
+            baseline_users = baseline_components[f'{key}_product'] / flat
+        baseline_components[f'{key}_product'] = baseline_users * unit_prices(curve, baseline_users)
+
+    total_costs = sum(costs.values())
+    baseline_costs = sum(baseline_components.values())
+    populations = {key: np.asarray(values) for key, values in results['populations'].items()}
+    return dict(results, **{
+        'populations': populations,
+        'costs': costs,
+        'total_costs': total_costs,
+        'baseline_costs': baseline_costs,
+        'baseline_component_costs': baseline_components,
+        'efficiency_gains': baseline_costs - total_costs,
+        'unit_prices': prices,
+    }, **outcome_series(populations, costs, total_costs))
+
+def product_costs(inputs):
+    """Flat product cost of each method of a perform_calculations inputs dict (or a batch)."""
+    if 'neten_costs' in inputs:
+        return {key: inputs[f'{key}_costs'][1] for key in ('neten', 'dmpim', 'dmpsc')}
+    return {key: inputs[f'{key}_product_cost'] for key in ('neten', 'dmpim', 'dmpsc')}
@@ -0,0 +1,251 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, rankdata
+
+from batch_calculations import (PARAMETERS, PARAMETER_LABELS, make_batch, perform_batch_calculations,
+                                cumulative_efficiency_gain)
+from sampling import default_bounds, varied_parameters, sample_inputs, scale_to_bounds
+
+# Number of draws generated from one SeedSequence child
+BLOCK_SIZE = 4096
+
+def run_psa(inputs, n_draws, bounds=None, method='random', seed=None):
+    """Probabilistic sensitivity analysis: sampled input batch and its batched results."""
+    batch = sample_inputs(inputs, n_draws, bounds or default_bounds(inputs), method, seed)
+    return batch, perform_batch_calculations(batch)
+
+def draw_uniforms(seed, start, stop):
+    """Uniform draws for PSA draws start..stop-1, one column per input in PARAMETERS.
+
+    Draws are generated in blocks of BLOCK_SIZE; block b comes from the
+    SeedSequence child (seed, b), so every draw depends only on the master
+    seed and its index, not on how the run is chunked or split across
+    workers.
+    """
+    first_block, last_block = start // BLOCK_SIZE, (stop - 1) // BLOCK_SIZE
+    blocks = [np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+              .random((BLOCK_SIZE, len(PARAMETERS)))
+              for block in range(first_block, last_block + 1)]
+    offset = first_block * BLOCK_SIZE
+    return np.concatenate(blocks)[start - offset:stop - offset]
+
+def psa_range(inputs, seed, start, stop, bounds=None):
+    """Evaluate PSA draws start..stop-1 and return (start, batch, results)."""
+    bounds = bounds or default_bounds(inputs)
+    parameters = varied_parameters(bounds)
+    u = draw_uniforms(seed, start, stop)[:, [PARAMETERS.index(name) for name in parameters]]
+    batch = make_batch(inputs, stop - start, **scale_to_bounds(u, bounds, parameters))
+    return start, batch, perform_batch_calculations(batch)
+
+def iter_psa_chunks(inputs, n_draws, bounds=None, seed=0, chunk_size=2 ** 16, start=0):
+    """Yield (start, batch, results) for successive chunks of PSA draws from draw start on.
+
+    The draws are those of draw_uniforms, so the chunk size does not change
+    the results.
+    """
+    for chunk_start in range(start, n_draws, chunk_size):
+        yield psa_range(inputs, seed, chunk_start, min(chunk_start + chunk_size, n_draws), bounds)
+
+def split_draws(n_draws, n_parts):
+    """Split draws 0..n_draws-1 into n_parts contiguous (start, stop) ranges aligned to blocks."""
+    n_blocks = -(-n_draws // BLOCK_SIZE)
+    edges = np.minimum(np.linspace(0, n_blocks, n_parts + 1).round().astype(int) * BLOCK_SIZE, n_draws)
+    edges[-1] = n_draws
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+def merge_psa_parts(parts):
+    """Merge (start, batch, results) parts from workers into a single run.
+
+    Parts may arrive in any order but must cover contiguous draws without
+    gaps or overlaps; the merged batch and results are identical to those of
+    a single-process run over the same draws.
+    """
+    parts = sorted(parts, key=lambda part: part[0])
+    expected = parts[0][0]
+    for start, batch, _ in parts:
+        if start != expected:
+            raise ValueError(f"PSA parts are not contiguous at draw {expected}")
+        expected += len(batch[PARAMETERS[0]])
+
+    def merge(values):
+        if isinstance(values[0], dict):
+            return {key: merge([v[key] for v in values]) for key in values[0]}
+        if values[0] is None or isinstance(values[0], str):
+            return values[0]
+        return np.concatenate([np.broadcast_to(v, np.shape(v)) for v in values])
+
+    batch = merge([part[1] for part in parts])
+    results = merge([part[2] for part in parts])
+    return batch, results
+
+def run_psa_parallel(inputs, n_draws, n_workers=None, bounds=None, seed=0):
+    """Run a PSA across worker processes; the result does not depend on n_workers."""
+    n_workers = n_workers or os.cpu_count() or 1
+    ranges = split_draws(n_draws, n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(psa_range, inputs, seed, start, stop, bounds) for start, stop in ranges]
+        return merge_psa_parts([future.result() for future in futures])
+
+def _batch_means_error(values, qs, n_groups=20):
+    """Standard errors of quantiles of values by batch means over n_groups equal groups."""
+    size = len(values) // n_groups
+    groups = np.quantile(values[:size * n_groups].reshape(n_groups, size), qs, axis=1)
+    return groups.std(axis=1, ddof=1) / np.sqrt(n_groups)
+
+def adaptive_psa(inputs, precision=None, relative_precision=0.01, bounds=None, seed=0,
+                 metric=cumulative_efficiency_gain, qs=(0.05, 0.5, 0.95), batch_size=BLOCK_SIZE,
+                 min_draws=4 * BLOCK_SIZE, max_draws=2 ** 22, confidence=0.95):
+    """PSA that draws batches until the estimates of the metric reach a given precision.
+
+    After each batch the confidence half-widths of the mean (from its
+    standard error) and of the quantiles qs (from batch means) are compared
+    with the larger of precision (in Rand) and relative_precision times the
+    absolute mean. Batches start at batch_size draws and grow to a quarter
+    of the draws so far. Draws are those of iter_psa_chunks with the same
+    seed, so a stopped run is a prefix of a longer one.
+    """
+    z = norm.ppf(0.5 + confidence / 2)
+    values = np.empty(0)
+    while len(values) < max_draws:
+        # Batches grow with the run so the checks stay a small share of the work
+        start = len(values)
+        stop = min(start + max(batch_size, start // 4), max_draws)
+        _, _, results = psa_range(inputs, seed, start, stop, bounds)
+        values = np.concatenate([values, metric(results)])
+        mean = values.mean()
+        standard_error = values.std(ddof=1) / np.sqrt(len(values))
+        quantile_errors = _batch_means_error(values, qs)
+        tolerance = max(precision or 0.0, relative_precision * abs(mean))
+        converged = z * max(standard_error, quantile_errors.max()) <= tolerance
+        if converged and len(values) >= min_draws:
+            break
+    return {
+        'mean': mean,
+        'standard_error': standard_error,
+        'quantiles': dict(zip(qs, np.quantile(values, qs))),
+        'quantile_standard_errors': dict(zip(qs, quantile_errors)),
+        'n_draws': len(values),
+        'converged': bool(converged),
+    }
+
+def compare_scenarios(inputs_a, inputs_b, n_draws, spread=0.2, seed=None, common_random_numbers=True,
+                      antithetic=False, metric=cumulative_efficiency_gain):
+    """Monte Carlo comparison of two uncertain scenarios (B minus A).
+
+    Each scenario's inputs vary uniformly within +/- spread of its own
+    values. With common random numbers both scenarios map the same uniform
+    draw of each input onto their own ranges, so shared uncertainty cancels
+    in the difference. With antithetic variates draws come in (u, 1 - u)
+    pairs. Returns the mean difference, its standard error, and the standard
+    error that independent sampling would give from the same number of draws.
+    The squared ratio of the two is the reduction in draws for equal
+    precision.
+    """
+    rng = np.random.default_rng(seed)
+    bounds_a, bounds_b = default_bounds(inputs_a, spread), default_bounds(inputs_b, spread)
+    n_base = (n_draws + 1) // 2 if antithetic else n_draws
+
+    def draw():
+        u = rng.random((n_base, len(PARAMETERS)))
+        return np.concatenate([u, 1 - u]) if antithetic else u
+
+    u_a = draw()
+    u_b = u_a if common_random_numbers else draw()
+    outputs = []
+    for inputs, bounds, u in ((inputs_a, bounds_a, u_a), (inputs_b, bounds_b, u_b)):
+        parameters = varied_parameters(bounds)
+        columns = u[:, [PARAMETERS.index(name) for name in parameters]]
+        batch = make_batch(inputs, len(u), **scale_to_bounds(columns, bounds, parameters))
+        outputs.append(metric(perform_batch_calculations(batch)))
+    f_a, f_b = outputs
+
+    difference = f_b - f_a
+    if antithetic:
+        # Pairs are independent of each other, their two halves are not
+        difference = (difference[:n_base] + difference[n_base:]) / 2
+    standard_error = difference.std(ddof=1) / np.sqrt(len(difference))
+    independent_standard_error = np.sqrt((f_a.var(ddof=1) + f_b.var(ddof=1)) / len(f_a))
+    return {
+        'mean_difference': difference.mean(),
+        'standard_error': standard_error,
+        'independent_standard_error': independent_standard_error,
+        'variance_reduction': (independent_standard_error / standard_error) ** 2,
+        'n_draws': len(f_a),
+    }
+
+def net_benefits(results):
+    """Net benefit of each decision per draw: columns (do not adopt, adopt DMPA-SC).
+
+    Net benefit is minus the 4-year cost, so adopting is worth the efficiency
+    gain relative to not adopting (the baseline).
+    """
+    total = np.asarray(results['total_costs'])[..., 1:].sum(axis=-1)
+    baseline = np.asarray(results['baseline_costs'])[..., 1:].sum(axis=-1)
+    return np.stack([-baseline, -total], axis=-1)
+
+def evpi(nb):
+    """Expected value of perfect information from per-draw net benefits (n, decisions)."""
+    return nb.max(axis=1).mean() - nb.mean(axis=0).max()
+
+def evppi_binning(values, nb, n_bins=None):
+    """EVPPI for each column of values (n, k) by equal-count binning.
+
+    Net benefits are averaged within quantile bins of each parameter to
+    estimate their conditional expectation. All parameters are binned at
+    once with a single bincount. Equal values share a bin, so a parameter
+    that does not vary has an EVPPI of 0. Small bins bias the estimate
+    upwards, so it is capped at the EVPI.
+    """
+    n, k = values.shape
+    n_bins = n_bins or max(int(np.sqrt(n)), 1)
+    ranks = rankdata(values, method='min', axis=0).astype(int) - 1
+    index = (ranks * n_bins // n + np.arange(k) * n_bins).ravel()
+    counts = np.bincount(index, minlength=k * n_bins).reshape(k, n_bins)
+    sums = np.stack([np.bincount(index, weights=np.repeat(nb[:, d], k), minlength=k * n_bins)
+                     for d in range(nb.shape[1])], axis=-1).reshape(k, n_bins, -1)
+    # Bins left empty by ties get no weight
+    conditional = np.divide(sums, counts[..., None], out=np.zeros_like(sums), where=counts[..., None] > 0)
+    expected_max = (conditional.max(axis=-1) * counts).sum(axis=1) / n
+    return np.minimum(expected_max - nb.mean(axis=0).max(), evpi(nb))
+
+
+def evppi_regression(values, nb, degree=3):
+    """EVPPI for each column of values (n, k) by polynomial regression.
+
+    The incremental net benefit of each decision over the first is regressed
+    on each (standardised) parameter; all k regressions are solved together
+    through their normal equations, with a pseudo-inverse so that a
+    parameter that does not vary fits a constant (EVPPI 0). Like the EVPPI,
+    estimates are capped at the EVPI.
+    """
+    n, k = values.shape
+    scaled = (values - values.mean(axis=0)) / np.where(values.std(axis=0) > 0, values.std(axis=0), 1)
+    design = scaled.T[..., None] ** np.arange(degree + 1)  # (k, n, degree + 1)
+    incremental = nb[:, 1:] - nb[:, :1]
+    gram = np.einsum('knd,kne->kde', design, design)
+    coefficients = np.linalg.pinv(gram) @ np.einsum('knd,nj->kdj', design, incremental)
+    fitted = np.einsum('knd,kdj->knj', design, coefficients)
+    expected_max = np.maximum(fitted.max(axis=-1), 0).mean(axis=1)
+    return np.minimum(expected_max - np.maximum(incremental.mean(axis=0).max(), 0), evpi(nb))
+
+def value_of_information(batch, results, bounds=None, method='binning'):
+    """EVPI and per-parameter EVPPI of adopting DMPA-SC, from PSA draws.
+
+    Only parameters that vary across the draws (per bounds, if given) are
+    included. Values are in Rand over 4 years.
+    """
+    nb = net_benefits(results)
+    if bounds is not None:
+        parameters = varied_parameters(bounds)
+    else:
+        parameters = [name for name in PARAMETER_LABELS if np.ptp(batch[name]) > 0]
+    values = np.column_stack([batch[name] for name in parameters])
+    estimate = evppi_binning if method == 'binning' else evppi_regression
+    return pd.DataFrame({
+        'Input': ['All inputs (EVPI)'] + [PARAMETER_LABELS[name] for name in parameters],
+        'Parameter': ['evpi'] + parameters,
+        'Value of Information': np.concatenate([[evpi(nb)], estimate(values, nb)]),
+    })
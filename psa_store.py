@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from batch_calculations import PARAMETERS
+from dashboard_helpers import MODEL_VERSION, YEARS
+from psa import BLOCK_SIZE, psa_range
+from sampling import default_bounds
+
+DEFAULT_STORE_DIR = 'psa_runs'
+
+# Result series kept per draw, in the order of the outputs array's second axis
+SERIES = ([f'populations.{k}' for k in ('neten', 'dmpim', 'dmpsc')]
+          + [f'costs.{k}' for k in ('neten_visit', 'neten_product', 'dmpim_visit', 'dmpim_product',
+                                     'dmpsc_visit', 'dmpsc_product')]
+          + ['total_costs', 'baseline_costs', 'efficiency_gains']
+          + ['total_cyp', 'total_cost_per_cyp', 'total_pregnancies_averted'])
+
+def series_values(results, name):
+    """Look up a (possibly nested, dot separated) result series."""
+    value = results
+    for key in name.split('.'):
+        value = value[key]
+    return value
+
+def run_id(inputs, n_draws, bounds, seed, dtype='float64'):
+    """Identifier of a PSA run: the same inputs, bounds, size and seed give the same draws.
+
+    The storage dtype is part of the identifier, so runs stored in single
+    and double precision are kept apart.
+    """
+    spec = {'inputs': {k: v for k, v in inputs.items() if k != 'colors'}, 'n_draws': n_draws,
+            'bounds': bounds, 'seed': seed, 'model_version': MODEL_VERSION, 'block_size': BLOCK_SIZE,
+            'dtype': np.dtype(dtype).name}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+def _write_json(path, value):
+    """Write JSON to path atomically: to a temporary file in the same directory, then os.replace."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(value, f, default=str)
+    os.replace(tmp, path)
+
+class PSAStore:
+    """On-disk PSA draws: memory-mapped .npy arrays of sampled inputs and result series.
+
+    parameters.npy holds (n_draws, len(PARAMETERS)) inputs and outputs.npy
+    (n_draws, len(SERIES), YEARS + 1) results; meta.json records the run.
+    Draws are written in chunks of the store's chunk_size, and a marker file
+    in done/ records each finished chunk, so an interrupted run resumes
+    where it stopped and a finished run is reused by any process. Several
+    processes may fill the same store at once: a chunk is the same whoever
+    computes it, so at worst a chunk is written twice with the same values.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.parameters = np.load(os.path.join(path, 'parameters.npy'), mmap_mode='r')
+        self.outputs = np.load(os.path.join(path, 'outputs.npy'), mmap_mode='r')
+
+    @classmethod
+    def create(cls, path, inputs, n_draws, bounds, seed, chunk_size, dtype='float64'):
+        """Create an empty store for n_draws draws, or open the store already at path.
+
+        The store is built in a temporary directory and renamed into place,
+        which fails if another process got there first; its store is then
+        used as it is, never truncated.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix='.creating-')
+        try:
+            open_memmap(os.path.join(tmp, 'parameters.npy'), mode='w+', dtype=dtype,
+                        shape=(n_draws, len(PARAMETERS))).flush()
+            open_memmap(os.path.join(tmp, 'outputs.npy'), mode='w+', dtype=dtype,
+                        shape=(n_draws, len(SERIES), YEARS + 1)).flush()
+            os.makedirs(os.path.join(tmp, 'done'))
+            meta = {'inputs': {k: v for k, v in inputs.items() if k != 'colors'}, 'n_draws': n_draws,
+                    'bounds': bounds, 'seed': seed, 'chunk_size': chunk_size, 'model_version': MODEL_VERSION,
+                    'dtype': np.dtype(dtype).name}
+            _write_json(os.path.join(tmp, 'meta.json'), meta)
+            os.rename(tmp, path)
+        except OSError:
+            if not os.path.exists(os.path.join(path, 'meta.json')):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return cls(path)
+
+    def chunks(self):
+        """(start, stop) of every chunk of the store."""
+        n_draws, chunk_size = self.meta['n_draws'], self.meta['chunk_size']
+        return [(start, min(start + chunk_size, n_draws)) for start in range(0, n_draws, chunk_size)]
+
+    def done_chunks(self):
+        """Starts of the chunks written so far (by any process)."""
+        return {int(name.split('-')[0]) for name in os.listdir(os.path.join(self.path, 'done'))}
+
+    @property
+    def n_written(self):
+        """Number of leading draws written without gaps."""
+        done = self.done_chunks()
+        written = 0
+        for start, stop in self.chunks():
+            if start not in done:
+                break
+            written = stop
+        return written
+
+    @property
+    def complete(self):
+        return self.n_written == self.meta['n_draws']
+
+    def write_chunk(self, start, batch, results):
+        """Write one chunk of evaluated draws starting at row start and mark it done."""
+        stop = start + len(batch[PARAMETERS[0]])
+        parameters = open_memmap(os.path.join(self.path, 'parameters.npy'), mode='r+')
+        outputs = open_memmap(os.path.join(self.path, 'outputs.npy'), mode='r+')
+        parameters[start:stop] = np.column_stack([batch[name] for name in PARAMETERS])
+        for j, name in enumerate(SERIES):
+            outputs[start:stop, j] = series_values(results, name)
+        parameters.flush()
+        outputs.flush()
+        del parameters, outputs
+        # The marker is created only once the draws are on disk
+        os.close(os.open(os.path.join(self.path, 'done', f'{start}-{stop}'), os.O_CREAT | os.O_WRONLY))
+
+    def series(self, name):
+        """Lazy (n_written, YEARS + 1) view of one result series."""
+        return self.outputs[:self.n_written, SERIES.index(name)]
+
+    def batch_view(self):
+        """Lazy {parameter: (n_written,) view} of the sampled inputs."""
+        return {name: self.parameters[:self.n_written, j] for j, name in enumerate(PARAMETERS)}
+
+    def results_view(self):
+        """Lazy results dict in the perform_batch_calculations layout."""
+        results = {}
+        for name in SERIES:
+            *groups, key = name.split('.')
+            target = results
+            for group in groups:
+                target = target.setdefault(group, {})
+            target[key] = self.series(name)
+        return results
+
+    def iter_chunks(self, chunk_size=2 ** 16):
+        """Yield (start, outputs chunk) pairs read from disk one chunk at a time."""
+        for start in range(0, self.n_written, chunk_size):
+            yield start, np.asarray(self.outputs[start:min(start + chunk_size, self.n_written)])
+
+    def summary(self, chunk_size=2 ** 16):
+        """Mean, standard deviation, min and max of every series and year, read chunk by chunk.
+
+        Returns a dict of (len(SERIES), YEARS + 1) arrays.
+        """
+        count = 0
+        mean = np.zeros((len(SERIES), YEARS + 1))
+        m2 = np.zeros_like(mean)
+        lo = np.full_like(mean, np.inf)
+        hi = np.full_like(mean, -np.inf)
+        for _, chunk in self.iter_chunks(chunk_size):
+            # Chan et al. parallel update of mean and sum of squared deviations
+            n = len(chunk)
+            chunk_mean = chunk.mean(axis=0)
+            delta = chunk_mean - mean
+            m2 += ((chunk - chunk_mean) ** 2).sum(axis=0) + delta ** 2 * count * n / (count + n)
+            mean += delta * n / (count + n)
+            count += n
+            lo = np.minimum(lo, chunk.min(axis=0))
+            hi = np.maximum(hi, chunk.max(axis=0))
+        return {'mean': mean, 'std': np.sqrt(m2 / max(count - 1, 1)), 'min': lo, 'max': hi}
+
+def run_psa_to_store(inputs, n_draws, bounds=None, seed=0, chunk_size=2 ** 16, store_dir=DEFAULT_STORE_DIR,
+                     dtype='float64'):
+    """Run a PSA chunk by chunk into an on-disk store and return the store.
+
+    Chunks of draws are written to disk as they are evaluated, so memory use
+    is bounded by chunk_size. A finished run with the same specification is
+    reused without recomputation; an unfinished one is resumed, in the chunks
+    of the store, from the chunks not yet written, also while another
+    process is filling it.
+    """
+    bounds = bounds or default_bounds(inputs)
+    path = os.path.join(store_dir, run_id(inputs, n_draws, bounds, seed, dtype))
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        store = PSAStore(path)
+    else:
+        store = PSAStore.create(path, inputs, n_draws, bounds, seed, chunk_size, dtype)
+
+    # Draws depend only on the seed and their index, so any chunk can be (re)computed exactly
+    for start, stop in store.chunks():
+        if start not in store.done_chunks():
+            store.write_chunk(*psa_range(inputs, seed, start, stop, bounds))
+    return PSAStore(path)
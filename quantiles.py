@@ -0,0 +1,139 @@
+import numpy as np
+import plotly.graph_objs as go
+
+from dashboard_helpers import YEARS
+from psa import iter_psa_chunks
+from psa_store import SERIES, series_values
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+class QuantileSketch:
+    """Streaming quantile sketch for a fixed grid of cells (e.g. series x year).
+
+    A merging t-digest: every cell keeps at most `compression` weighted
+    centroids. Each update merges a chunk of observations into the
+    centroids of all cells at once, and quantiles are interpolated between
+    centroids. Memory is bounded by the number of cells times `compression`,
+    whatever the number of draws. The arcsine scale keeps centroids small
+    in the tails, where fan-chart bands are read.
+    """
+
+    def __init__(self, shape, compression=200):
+        self.shape = tuple(shape)
+        self.compression = compression
+        cells = int(np.prod(self.shape))
+        self.means = np.zeros((cells, 0))
+        self.weights = np.zeros((cells, 0))
+        self.min = np.full(cells, np.inf)
+        self.max = np.full(cells, -np.inf)
+        self.count = 0
+
+    def update(self, chunk):
+        """Add a chunk of observations with shape (n, *shape)."""
+        chunk = np.asarray(chunk, dtype=float).reshape(len(chunk), -1).T
+        self.min = np.minimum(self.min, chunk.min(axis=1))
+        self.max = np.maximum(self.max, chunk.max(axis=1))
+        self.count += chunk.shape[1]
+
+        self._compress(np.concatenate([self.means, chunk], axis=1),
+                       np.concatenate([self.weights, np.ones_like(chunk)], axis=1))
+
+    def merge(self, other):
+        """Fold another sketch of the same cells into this one (e.g. from a parallel worker)."""
+        if other.shape != self.shape:
+            raise ValueError(f'Cannot merge a sketch of shape {other.shape} into {self.shape}')
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.count += other.count
+        self._compress(np.concatenate([self.means, other.means], axis=1),
+                       np.concatenate([self.weights, other.weights], axis=1))
+        return self
+
+    def _compress(self, means, weights):
+        """Merge weighted points (cells, m) into at most `compression` centroids per cell."""
+        cells = means.shape[0]
+        order = np.argsort(means, axis=1, kind='stable')
+        means = np.take_along_axis(means, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+
+        # Assign every point to a centroid by the arcsine scale of its quantile
+        cumulative = np.cumsum(weights, axis=1)
+        q = (cumulative - weights / 2) / cumulative[:, -1:]
+        group = np.floor((np.arcsin(2 * q - 1) / np.pi + 0.5) * self.compression)
+        index = (np.clip(group, 0, self.compression - 1) + np.arange(cells)[:, None] * self.compression).astype(int)
+
+        size = cells * self.compression
+        self.weights = np.bincount(index.ravel(), weights.ravel(), size).reshape(cells, -1)
+        totals = np.bincount(index.ravel(), (weights * means).ravel(), size).reshape(cells, -1)
+        with np.errstate(invalid='ignore'):
+            self.means = np.where(self.weights > 0, totals / self.weights, 0.0)
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        """Estimated quantiles, an array of shape (len(qs), *shape)."""
+        qs = np.asarray(qs, dtype=float)
+        out = np.empty((len(qs), self.means.shape[0]))
+        for cell in range(self.means.shape[0]):
+            filled = self.weights[cell] > 0
+            weights, means = self.weights[cell, filled], self.means[cell, filled]
+            cumulative = np.cumsum(weights)
+            ranks = np.concatenate([[0], cumulative - weights / 2, [cumulative[-1]]])
+            values = np.concatenate([[self.min[cell]], means, [self.max[cell]]])
+            out[:, cell] = np.interp(qs * cumulative[-1], ranks, values)
+        return out.reshape((len(qs),) + self.shape)
+
+def stream_quantiles(chunks, qs=DEFAULT_QUANTILES, compression=200):
+    """Quantile bands of every result series and year from an iterable of result chunks.
+
+    Returns {series: (len(qs), YEARS + 1) array}.
+    """
+    sketch = QuantileSketch((len(SERIES), YEARS + 1), compression)
+    for results in chunks:
+        sketch.update(np.stack([series_values(results, name) for name in SERIES], axis=1))
+    bands = sketch.quantiles(qs)
+    return {name: bands[:, j] for j, name in enumerate(SERIES)}
+
+def psa_quantiles(inputs, n_draws, bounds=None, seed=0, chunk_size=2 ** 14, qs=DEFAULT_QUANTILES):
+    """Quantile bands of a PSA, aggregated while its chunks are produced."""
+    chunks = (results for _, _, results in iter_psa_chunks(inputs, n_draws, bounds, seed, chunk_size))
+    return stream_quantiles(chunks, qs)
+
+def store_quantiles(store, chunk_size=2 ** 16, qs=DEFAULT_QUANTILES, compression=200):
+    """Quantile bands of every series in a PSAStore, read from disk chunk by chunk."""
+    sketch = QuantileSketch((len(SERIES), YEARS + 1), compression)
+    for _, chunk in store.iter_chunks(chunk_size):
+        sketch.update(chunk)
+    bands = sketch.quantiles(qs)
+    return {name: bands[:, j] for j, name in enumerate(SERIES)}
+
+def create_fan_chart(bands, qs=DEFAULT_QUANTILES, colors=None):
+    """Create a fan chart of total costs and efficiency gain from quantile bands."""
+    fig = go.Figure()
+    colors = colors or {}
+
+    x_labels = ['Baseline<br>(Years 1-4)', 'Intervention<br>Year 1', 'Intervention<br>Year 2', 'Intervention<br>Year 3', 'Intervention<br>Year 4']
+
+    series = {'Total Costs': ('total_costs', colors.get('total_costs', '#003f5c')),
+              'Efficiency gain': ('efficiency_gains', colors.get('efficiency_gain', '#ffa600'))}
+    for name, (key, color) in series.items():
+        band = bands[key] / 1e9
+        # Nested bands from the outermost quantile pair inwards
+        for i in range(len(qs) // 2):
+            lower, upper = band[i], band[len(qs) - 1 - i]
+            fig.add_trace(go.Scatter(x=x_labels, y=upper, mode='lines', line=dict(width=0, color=color),
+                                     showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=x_labels, y=lower, mode='lines', line=dict(width=0, color=color),
+                                     fill='tonexty', opacity=0.3,
+                                     name=f'{name} {qs[i]:.0%}-{qs[len(qs) - 1 - i]:.0%}'))
+        if len(qs) % 2:
+            fig.add_trace(go.Scatter(x=x_labels, y=band[len(qs) // 2], mode='lines+markers',
+                                     line=dict(color=color), name=f'{name} median'))
+
+    fig.update_layout(
+        title='Uncertainty in total costs and efficiency gain',
+        xaxis_title='Year',
+        yaxis_title='Costs in Billions of Rand',
+        yaxis=dict(tickformat=".2f"),
+        legend=dict(x=1.05, y=1)
+    )
+
+    return fig
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, qmc
+
+from batch_calculations import (PARAMETERS, PARAMETER_LABELS, DMPIM_CONV_RATES, NETEN_CONV_RATES,
+                                make_batch, perform_batch_calculations, cumulative_efficiency_gain)
+
+def default_bounds(inputs, spread=0.2):
+    """Uniform ranges of +/- spread (a fraction) around each input.
+
+    Conversion rates are kept within 0-100%. Inputs that are zero get an empty
+    range and are therefore not varied.
+    """
+    bounds = {}
+    for name, value in make_batch(inputs).items():
+        if name not in PARAMETERS:
+            continue
+        value = float(value[0])
+        lo, hi = sorted([value * (1 - spread), value * (1 + spread)])
+        if name in DMPIM_CONV_RATES + NETEN_CONV_RATES:
+            lo, hi = max(lo, 0.0), min(hi, 100.0)
+        bounds[name] = (lo, hi)
+    return bounds
+
+def varied_parameters(bounds):
+    """Parameters whose range is not empty, in PARAMETERS order."""
+    return [name for name in PARAMETERS if name in bounds and bounds[name][1] > bounds[name][0]]
+
+def scale_to_bounds(unit, bounds, parameters):
+    """Map points in the unit hypercube (n, len(parameters)) to {parameter: values}."""
+    lo = np.array([bounds[name][0] for name in parameters])
+    hi = np.array([bounds[name][1] for name in parameters])
+    values = qmc.scale(unit, lo, hi) if len(parameters) else unit
+    return {name: values[:, j] for j, name in enumerate(parameters)}
+
+def unit_samples(n, d, method='lhs', seed=None):
+    """n points in the d-dimensional unit hypercube ('random', 'lhs' or 'sobol')."""
+    if method == 'random':
+        return np.random.default_rng(seed).random((n, d))
+    if method == 'lhs':
+        return qmc.LatinHypercube(d=d, seed=seed).random(n)
+    if method == 'sobol':
+        return qmc.Sobol(d=d, scramble=True, seed=seed).random(n)
+    raise ValueError(f"Unknown sampling method: {method}")
+
+def sample_inputs(inputs, n, bounds=None, method='lhs', seed=None):
+    """Batch of n scenarios with the varied inputs drawn uniformly within bounds."""
+    bounds = bounds or default_bounds(inputs)
+    parameters = varied_parameters(bounds)
+    return make_batch(inputs, n, **scale_to_bounds(unit_samples(n, len(parameters), method, seed),
+                                                   bounds, parameters))
+
+def _ratio_interval(numerator, denominator, z):
+    """Estimate mean(numerator) / mean(denominator) with a delta-method confidence half-width."""
+    n = numerator.shape[0]
+    ratio = numerator.mean(axis=0) / denominator.mean(axis=0)
+    residual = numerator - ratio * denominator
+    half_width = z * residual.std(axis=0, ddof=1) / (np.sqrt(n) * np.abs(denominator.mean(axis=0)))
+    return ratio, half_width
+
+def sobol_indices(inputs, n, bounds=None, metric=cumulative_efficiency_gain, seed=None,
+                  chunk_size=2 ** 14, confidence=0.95):
+    """First-order and total-order Sobol indices of a model output.
+
+    Uses a Saltelli design built from a scrambled Sobol sequence of twice the
+    number of varied inputs: base matrices A and B plus one matrix AB_i per
+    input (A with column i taken from B), so n * (d + 2) model runs. The
+    design is generated and evaluated in chunks of chunk_size rows through the
+    batched engine, so only the model outputs are kept in memory. First-order
+    indices use the Saltelli (2010) estimator and total-order indices the
+    Jansen estimator; confidence intervals use the delta method. n and
+    chunk_size are rounded up to powers of two.
+    """
+    bounds = bounds or default_bounds(inputs)
+    parameters = varied_parameters(bounds)
+    d = len(parameters)
+    n = 2 ** int(np.ceil(np.log2(n)))
+    chunk_size = min(2 ** int(np.ceil(np.log2(chunk_size))), n)
+
+    sampler = qmc.Sobol(d=2 * d, scramble=True, seed=seed)
+    f_a, f_b = np.empty(n), np.empty(n)
+    f_ab = np.empty((n, d))
+    for start in range(0, n, chunk_size):
+        points = sampler.random(chunk_size)
+        a, b = points[:, :d], points[:, d:]
+        ab = np.repeat(a[None], d, axis=0)
+        ab[np.arange(d), :, np.arange(d)] = b.T
+        design = np.concatenate([a, b, ab.reshape(-1, d)])
+        outputs = metric(perform_batch_calculations(
+            make_batch(inputs, len(design), **scale_to_bounds(design, bounds, parameters))))
+        rows = slice(start, start + chunk_size)
+        f_a[rows], f_b[rows] = outputs[:chunk_size], outputs[chunk_size:2 * chunk_size]
+        f_ab[rows] = outputs[2 * chunk_size:].reshape(d, chunk_size).T
+
+    # Per-row contributions to the output variance over the A and B samples
+    mean = (f_a.mean() + f_b.mean()) / 2
+    variance_terms = ((f_a - mean) ** 2 + (f_b - mean) ** 2)[:, None] / 2
+    z = norm.ppf(0.5 + confidence / 2)
+    first, first_ci = _ratio_interval(f_b[:, None] * (f_ab - f_a[:, None]), variance_terms, z)
+    total, total_ci = _ratio_interval((f_a[:, None] - f_ab) ** 2 / 2, variance_terms, z)
+
+    return pd.DataFrame({
+        'Input': [PARAMETER_LABELS[name] for name in parameters],
+        'Parameter': parameters,
+        'First-order Index': first,
+        'First-order CI': first_ci,
+        'Total-order Index': total,
+        'Total-order CI': total_ci,
+    })
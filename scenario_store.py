@@ -0,0 +1,197 @@
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+
+import numpy as np
+import plotly.graph_objs as go
+
+from dashboard_helpers import MODEL_VERSION, METHODS, YEARS, perform_calculations
+
+DEFAULT_DB_PATH = 'scenarios.db'
+
+# Dashboard defaults shared by the README scenarios; per-method visits and costs come from the registry
+_DEFAULT_COST_INPUTS = dict(
+    {f'{key}_costs': [METHODS[key]['num_visits'], METHODS[key]['product_cost']] for key in ('neten', 'dmpim', 'dmpsc')},
+    cost_per_visit=329,
+    dmpsc_first_visit_multiplier=METHODS['dmpsc']['first_visit_multiplier'],
+    user_pop_sizes=[None] * YEARS,
+)
+
+# Scenarios examined in the README
+README_SCENARIOS = {
+    'Scenario 1': {
+        'description': 'Rapid adoption of DMPA-IM users without considering NET-EN users',
+        'inputs': dict(_DEFAULT_COST_INPUTS,
+                       start_pops=[0, 1701061],
+                       dmpim_conv_rates=[15.8417599, 35, 50, 65],
+                       neten_conv_rates=[0, 0, 0, 0]),
+    },
+    'Scenario 2': {
+        'description': 'Slower but consistent adoption of DMPA-IM users and NET-EN users',
+        'inputs': dict(_DEFAULT_COST_INPUTS,
+                       start_pops=[552108, 1701061],
+                       dmpim_conv_rates=[10, 15, 20, 25],
+                       neten_conv_rates=[10, 15, 20, 25]),
+    },
+    'Scenario 3': {
+        'description': 'Slower adoption of DMPA-IM users and fast adoption of NET-EN users',
+        'inputs': dict(_DEFAULT_COST_INPUTS,
+                       start_pops=[552108, 1701061],
+                       dmpim_conv_rates=[10, 15, 20, 25],
+                       neten_conv_rates=[25, 35, 50, 65]),
+    },
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    description TEXT,
+    content_hash TEXT NOT NULL,
+    model_version INTEGER NOT NULL,
+    inputs TEXT NOT NULL,
+    results TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scenarios_hash ON scenarios (content_hash, model_version);
+CREATE TABLE IF NOT EXISTS scenario_tags (
+    scenario_id INTEGER NOT NULL REFERENCES scenarios (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (scenario_id, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_scenario_tags_tag ON scenario_tags (tag);
+"""
+
+def _to_json(value):
+    """Serialize model inputs or results, converting numpy scalars to plain numbers."""
+    return json.dumps(value, sort_keys=True, default=lambda x: x.item() if hasattr(x, 'item') else str(x))
+
+def model_inputs(inputs):
+    """Return the inputs that affect the calculations (plot colors are excluded)."""
+    return {k: v for k, v in inputs.items() if k != 'colors'}
+
+def _as_floats(value):
+    """Numbers as floats, in nested dicts and lists, so that e.g. 100 and 100.0 hash alike."""
+    if isinstance(value, dict):
+        return {k: _as_floats(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_as_floats(v) for v in value]
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)):
+        return float(value)
+    return value
+
+def inputs_hash(inputs):
+    """Content hash identifying a set of model inputs (numbers compare by value)."""
+    return hashlib.sha256(_to_json(_as_floats(model_inputs(inputs))).encode('utf-8')).hexdigest()
+
+class ScenarioStore:
+    """SQLite store of named input sets and their computed results."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # Refresh hashes written before numbers were compared by value
+            for scenario_id, inputs, content_hash in conn.execute('SELECT id, inputs, content_hash FROM scenarios').fetchall():
+                current = inputs_hash(json.loads(inputs))
+                if current != content_hash:
+                    conn.execute('UPDATE scenarios SET content_hash = ? WHERE id = ?', (current, scenario_id))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    def save(self, name, inputs, results=None, tags=(), description=None):
+        """Save (or overwrite) a named scenario and return its content hash."""
+        inputs = model_inputs(inputs)
+        if results is None:
+            results = perform_calculations(inputs)
+        content_hash = inputs_hash(inputs)
+        with self._connect() as conn:
+            conn.execute('DELETE FROM scenarios WHERE name = ?', (name,))
+            cursor = conn.execute(
+                'INSERT INTO scenarios (name, description, content_hash, model_version, inputs, results, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (name, description, content_hash, MODEL_VERSION, _to_json(inputs), _to_json(results),
+                 datetime.now(timezone.utc).isoformat()))
+            conn.executemany('INSERT OR IGNORE INTO scenario_tags (scenario_id, tag) VALUES (?, ?)',
+                             [(cursor.lastrowid, tag.strip()) for tag in tags if tag.strip()])
+        return content_hash
+
+    def delete(self, name):
+        """Remove a saved scenario."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM scenarios WHERE name = ?', (name,))
+
+    def list_scenarios(self, tag=None):
+        """List saved scenarios, optionally only those carrying the given tag."""
+        query = ('SELECT s.id, s.name, s.description, s.content_hash, s.model_version, s.created_at '
+                 'FROM scenarios s')
+        params = ()
+        if tag is not None:
+            query += ' JOIN scenario_tags t ON t.scenario_id = s.id WHERE t.tag = ?'
+            params = (tag,)
+        with self._connect() as conn:
+            rows = conn.execute(query + ' ORDER BY s.name', params).fetchall()
+            tags = {}
+            for scenario_id, scenario_tag in conn.execute('SELECT scenario_id, tag FROM scenario_tags ORDER BY tag'):
+                tags.setdefault(scenario_id, []).append(scenario_tag)
+        return [{'name': name, 'description': description, 'content_hash': content_hash,
+                 'model_version': model_version, 'created_at': created_at, 'tags': tags.get(scenario_id, [])}
+                for scenario_id, name, description, content_hash, model_version, created_at in rows]
+
+    def load(self, name):
+        """Return the stored (inputs, results) of a named scenario.
+
+        Results saved by an older model version are recomputed and written back.
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT id, inputs, results, model_version FROM scenarios WHERE name = ?',
+                               (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+            scenario_id, inputs, results, model_version = row
+            inputs = json.loads(inputs)
+            if model_version != MODEL_VERSION:
+                results = perform_calculations(inputs)
+                conn.execute('UPDATE scenarios SET results = ?, model_version = ? WHERE id = ?',
+                             (_to_json(results), MODEL_VERSION, scenario_id))
+                return inputs, results
+        return inputs, json.loads(results)
+
+    def find_results(self, inputs):
+        """Look up stored results for inputs by content hash; None if not stored."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT results FROM scenarios WHERE content_hash = ? AND model_version = ? LIMIT 1',
+                               (inputs_hash(inputs), MODEL_VERSION)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def seed_readme_scenarios(self):
+        """Add the README scenarios to the store if they are missing."""
+        existing = {s['name'] for s in self.list_scenarios()}
+        for name, scenario in README_SCENARIOS.items():
+            if name not in existing:
+                self.save(name, scenario['inputs'], tags=['readme'], description=scenario['description'])
+
+def create_comparison_plot(scenario_results, metric='efficiency_gains', currency='Rand'):
+    """Create a grouped bar plot comparing one result series across scenarios (in billions of currency)."""
+    fig = go.Figure()
+
+    x_labels = ['Baseline<br>(Years 1-4)', 'Intervention<br>Year 1', 'Intervention<br>Year 2', 'Intervention<br>Year 3', 'Intervention<br>Year 4']
+
+    for name, results in scenario_results.items():
+        values = results[metric] if metric in results else results['costs'][metric]
+        fig.add_trace(go.Bar(x=x_labels, y=[v / 1e9 for v in values], name=name))
+
+    fig.update_layout(
+        barmode='group',
+        title=f"Scenario comparison: {metric.replace('_', ' ')}",
+        xaxis_title='Year',
+        yaxis_title=f'Billions of {currency}',
+        yaxis=dict(tickformat=".2f"),
+        legend=dict(x=1.05, y=1)
+    )
+
+    return fig
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from batch_calculations import (PARAMETERS, PARAMETER_LABELS, DMPIM_CONV_RATES, NETEN_CONV_RATES,
+                                make_batch, batch_size, neten_pop_sizes_array, perform_batch_calculations)
+from dashboard_helpers import YEARS
+
+def partial_derivatives(batch, results=None):
+    """Exact partial derivatives of total, baseline cost and efficiency gain per year.
+
+    With populations fixed the cost model is linear in the visit cost, visit
+    counts, product costs and first visit multiplier, so these derivatives are
+    exact. Populations depend on the starting populations and conversion rates
+    through integer truncation; for those the derivative of the untruncated
+    expression is used. Years with manually defined population sizes do not
+    depend on either.
+
+    Returns {'total_costs' | 'baseline_costs' | 'efficiency_gains': {parameter: (n, YEARS + 1) array}}.
+    """
+    if batch.get('mode', 'static') != 'static':
+        raise ValueError("Analytic derivatives are only available for the static conversion model")
+    if results is None:
+        results = perform_batch_calculations(batch)
+    n = batch_size(batch)
+    p = {name: np.broadcast_to(np.asarray(batch[name], dtype=float), (n,))[:, None] for name in PARAMETERS}
+    c, m = p['cost_per_visit'], p['dmpsc_first_visit_multiplier']
+    neten, dmpim, dmpsc = (results['populations'][k] for k in ('neten', 'dmpim', 'dmpsc'))
+    neten = np.where(neten > 0, neten, 0)
+
+    intervention = (np.arange(YEARS + 1) >= 1)[None, :]
+    extra_first_visit = np.where(intervention, m - 1, 0)
+    has_dmpim = p['dmpim_start_pop'] > 0
+    has_neten = p['neten_start_pop'] > 0
+    neten_pop_sizes = neten_pop_sizes_array(batch, n)
+    neten_populations = np.column_stack([p['neten_start_pop'][:, 0], neten_pop_sizes])
+    baseline_dmpim = np.where(has_dmpim, p['dmpim_start_pop'], 0)
+    baseline_neten = np.where(has_neten, neten_populations, 0)
+
+    # Annual cost per user of each method (DMPA-SC includes the longer first visit)
+    unit_dmpim = p['dmpim_num_visits'] * c + p['dmpim_product_cost']
+    unit_neten = p['neten_num_visits'] * c + p['neten_product_cost']
+    unit_dmpsc = p['dmpsc_num_visits'] * c + p['dmpsc_product_cost'] + c * extra_first_visit
+
+    # Years that follow the conversion rates rather than manually defined sizes
+    modelled = np.ones((n, YEARS + 1), dtype=bool)
+    if batch.get('user_pop_sizes') is not None:
+        modelled[:, 1:] = np.isnan(batch['user_pop_sizes'][..., 0])
+    year0 = ~intervention & np.ones((n, 1), dtype=bool)
+
+    zeros = np.zeros((n, YEARS + 1))
+    d_total = {
+        'cost_per_visit': p['dmpim_num_visits'] * dmpim + p['dmpsc_num_visits'] * dmpsc
+                          + p['neten_num_visits'] * neten + dmpsc * extra_first_visit,
+        'neten_num_visits': c * neten,
+        'neten_product_cost': neten + zeros,
+        'dmpim_num_visits': c * dmpim,
+        'dmpim_product_cost': dmpim + zeros,
+        'dmpsc_num_visits': c * dmpsc,
+        'dmpsc_product_cost': dmpsc + zeros,
+        'dmpsc_first_visit_multiplier': c * np.where(intervention, dmpsc, 0),
+        'dmpim_start_pop': np.where(year0, unit_dmpim, 0),
+        'neten_start_pop': np.where(year0, unit_neten, 0),
+    }
+    rates = np.stack([p[name][:, 0] for name in DMPIM_CONV_RATES], axis=1) / 100
+    d_start = (1 - rates) * unit_dmpim + rates * unit_dmpsc[:, 1:]
+    d_total['dmpim_start_pop'][:, 1:] = np.where(modelled[:, 1:], d_start, 0)
+    for i, name in enumerate(DMPIM_CONV_RATES):
+        d = zeros.copy()
+        d[:, i + 1] = np.where(modelled[:, i + 1], p['dmpim_start_pop'][:, 0] / 100
+                               * (unit_dmpsc[:, i + 1] - unit_dmpim[:, 0]), 0)
+        d_total[name] = d
+    for i, name in enumerate(NETEN_CONV_RATES):
+        d = zeros.copy()
+        d[:, i + 1] = np.where(modelled[:, i + 1] & has_neten[:, 0], neten_pop_sizes[:, i] / 100
+                               * (unit_dmpsc[:, i + 1] - unit_neten[:, 0]), 0)
+        d_total[name] = d
+
+    d_baseline = {name: zeros for name in PARAMETERS}
+    d_baseline.update({
+        'cost_per_visit': baseline_dmpim * p['dmpim_num_visits'] + baseline_neten * p['neten_num_visits'],
+        'dmpim_num_visits': baseline_dmpim * c + zeros,
+        'dmpim_product_cost': baseline_dmpim + zeros,
+        'neten_num_visits': baseline_neten * c,
+        'neten_product_cost': baseline_neten,
+        'dmpim_start_pop': unit_dmpim + zeros,
+        'neten_start_pop': np.where(year0, unit_neten, 0),
+    })
+
+    return {
+        'total_costs': d_total,
+        'baseline_costs': d_baseline,
+        'efficiency_gains': {name: d_baseline[name] - d_total[name] for name in PARAMETERS},
+    }
+
+def elasticities(batch, derivatives, values):
+    """Elasticities dY/dx * x / Y of the output series values (NaN where Y is zero)."""
+    n = batch_size(batch)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {name: np.where(values != 0,
+                               derivatives[name] * np.broadcast_to(batch[name], (n,))[:, None] / values, np.nan)
+                for name in PARAMETERS}
+
+def break_even_thresholds(batch, derivatives, results):
+    """Value of each input at which the 4-year efficiency gain is zero, others held fixed.
+
+    Exact for the cost inputs; for starting populations and conversion rates
+    it is exact up to the integer truncation of converted users. NaN where the
+    efficiency gain does not depend on the input or the break-even value is
+    infeasible (negative, or a conversion rate above 100%).
+    """
+    n = batch_size(batch)
+    gain = results['efficiency_gains'][:, 1:].sum(axis=1)
+    thresholds = {}
+    for name in PARAMETERS:
+        slope = derivatives['efficiency_gains'][name][:, 1:].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            threshold = np.broadcast_to(batch[name], (n,)) - gain / slope
+        upper = 100 if name in DMPIM_CONV_RATES + NETEN_CONV_RATES else np.inf
+        thresholds[name] = np.where((slope != 0) & (threshold >= 0) & (threshold <= upper), threshold, np.nan)
+    return thresholds
+
+def sensitivity_table(inputs):
+    """Sensitivity readout of the 4-year total cost and efficiency gain for one scenario."""
+    batch = make_batch(inputs)
+    results = perform_batch_calculations(batch)
+    derivatives = partial_derivatives(batch, results)
+    thresholds = break_even_thresholds(batch, derivatives, results)
+
+    # 4-year totals over the intervention years
+    cumulative = {key: {name: d[:, 1:].sum(axis=1, keepdims=True) for name, d in derivatives[key].items()}
+                  for key in ('total_costs', 'efficiency_gains')}
+    total = results['total_costs'][:, 1:].sum(axis=1, keepdims=True)
+    gain = results['efficiency_gains'][:, 1:].sum(axis=1, keepdims=True)
+    total_elasticity = elasticities(batch, cumulative['total_costs'], total)
+    gain_elasticity = elasticities(batch, cumulative['efficiency_gains'], gain)
+
+    return pd.DataFrame({
+        'Input': [PARAMETER_LABELS[name] for name in PARAMETERS],
+        'Value': [batch[name][0] for name in PARAMETERS],
+        'd(Total Costs)/d(Input)': [cumulative['total_costs'][name][0, 0] for name in PARAMETERS],
+        'Total Costs Elasticity': [total_elasticity[name][0, 0] for name in PARAMETERS],
+        'd(Efficiency gain)/d(Input)': [cumulative['efficiency_gains'][name][0, 0] for name in PARAMETERS],
+        'Efficiency gain Elasticity': [gain_elasticity[name][0, 0] for name in PARAMETERS],
+        'Break-even Value': [thresholds[name][0] for name in PARAMETERS],
+    }).round(4)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from batch_calculations import PARAMETERS, flatten_inputs, make_batch
+from dashboard_helpers import YEARS
+
+
+def random_scenario(rng, mode='static', user_pop_sizes=None):
+    """perform_calculations inputs with random populations, costs and conversion rates."""
+    inputs = {
+        'mode': mode,
+        'start_pops': [float(rng.choice([0, rng.integers(1, 10 ** 6)])), float(rng.integers(1, 2 * 10 ** 6))],
+        'cost_per_visit': float(rng.uniform(50, 400)),
+        'neten_costs': [float(rng.integers(1, 8)), float(rng.uniform(10, 200))],
+        'dmpim_costs': [float(rng.integers(1, 8)), float(rng.uniform(10, 200))],
+        'dmpsc_costs': [float(rng.integers(1, 8)), float(rng.uniform(10, 200))],
+        'dmpsc_first_visit_multiplier': float(rng.uniform(1, 3)),
+        'dmpim_conv_rates': rng.uniform(0, 100, YEARS).tolist(),
+        'neten_conv_rates': rng.uniform(0, 100, YEARS).tolist(),
+        'user_pop_sizes': user_pop_sizes or [None] * YEARS,
+    }
+    if mode == 'dynamic':
+        inputs['start_pops'].append(float(rng.integers(0, 10 ** 5)))
+    return inputs
+
+
+@pytest.fixture
+def scenarios():
+    """Factory of n random scenarios of a conversion mode."""
+    def make(n=50, mode='static', user_pop_sizes=None, seed=0):
+        rng = np.random.default_rng(seed)
+        return [random_scenario(rng, mode, user_pop_sizes) for _ in range(n)]
+    return make
+
+
+@pytest.fixture
+def scenario_batch():
+    """Build one batch (make_batch) holding a list of scenarios of the same mode and population sizes."""
+    def make(cases):
+        flat = [flatten_inputs(inputs) for inputs in cases]
+        overrides = {name: [f[name] for f in flat] for name in PARAMETERS}
+        overrides['dmpsc_start_pop'] = [inputs['start_pops'][2] if len(inputs['start_pops']) > 2 else 0
+                                        for inputs in cases]
+        return make_batch(cases[0], len(cases), **overrides)
+    return make
@@ -0,0 +1,34 @@
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from attribution import attribute_change, shapley_values
+from batch_calculations import cumulative_efficiency_gain
+from dashboard_helpers import perform_calculations
+
+
+def test_shapley_values_match_permutation_average():
+    rng = np.random.default_rng(0)
+    k = 4
+    values = rng.normal(size=2 ** k)
+    expected = np.zeros(k)
+    orders = list(permutations(range(k)))
+    for order in orders:
+        coalition = 0
+        for j in order:
+            expected[j] += values[coalition | 1 << j] - values[coalition]
+            coalition |= 1 << j
+    np.testing.assert_allclose(shapley_values(values, k), expected / len(orders))
+
+
+@pytest.mark.parametrize('mode', ['static', 'dynamic'])
+def test_contributions_sum_to_the_change(scenarios, mode):
+    cases = scenarios(20, mode, seed=1)
+    for inputs_a, inputs_b in zip(cases[::2], cases[1::2]):
+        attribution = attribute_change(inputs_a, inputs_b)
+        start = cumulative_efficiency_gain(perform_calculations(inputs_a))
+        end = cumulative_efficiency_gain(perform_calculations(inputs_b))
+        np.testing.assert_allclose([attribution['start'], attribution['end']], [start, end], rtol=1e-12)
+        np.testing.assert_allclose(sum(attribution['contributions'].values()), end - start,
+                                   rtol=1e-9, atol=1e-3)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from batch_calculations import batch_results_row, make_batch, perform_batch_calculations, perform_chunked_calculations
+from dashboard_helpers import perform_calculations
+from scenario_store import README_SCENARIOS
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+
+
+@pytest.mark.parametrize('mode', ['static', 'dynamic'])
+@pytest.mark.parametrize('user_pop_sizes', [None, [None, [100000, 1500000, 500000], None, None]])
+def test_batch_matches_perform_calculations(scenarios, scenario_batch, mode, user_pop_sizes):
+    cases = scenarios(200, mode, user_pop_sizes)
+    results = perform_batch_calculations(scenario_batch(cases))
+
+    for k, inputs in enumerate(cases):
+        expected = perform_calculations(inputs)
+        row = batch_results_row(results, k)
+        assert row == {key: expected[key] for key in row}
+
+
+def test_chunked_matches_batch():
+    rng = np.random.default_rng(0)
+    batch = make_batch(INPUTS, 1000, cost_per_visit=rng.uniform(200, 400, 1000))
+    expected = perform_batch_calculations(batch)
+    results, report = perform_chunked_calculations(batch, memory_limit=2 * 2 ** 20, trace_memory=False)
+    assert report['n_chunks'] > 1
+    np.testing.assert_allclose(results['total_costs'], expected['total_costs'])
+    np.testing.assert_array_equal(results['populations']['dmpsc'], expected['populations']['dmpsc'])
+
+
+@pytest.mark.parametrize('dtype, suggests_float32', [('float64', True), ('float32', False)])
+def test_memory_error_suggests_float32_only_when_it_helps(dtype, suggests_float32):
+    batch = make_batch(INPUTS, 100000)
+    with pytest.raises(ValueError) as error:
+        perform_chunked_calculations(batch, memory_limit=2 ** 20, dtype=dtype, trace_memory=False)
+    assert ("float32" in str(error.value)) == suggests_float32
+    assert 'PSAStore' in str(error.value)
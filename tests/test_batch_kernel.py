@@ -0,0 +1,26 @@
+import pytest
+
+from batch_calculations import batch_results_row
+from batch_kernel import _compiled_kernel, _scenario_kernel, perform_kernel_calculations
+from dashboard_helpers import perform_calculations
+
+KERNELS = {
+    'numpy': lambda batch: perform_kernel_calculations(batch, use_numba=False),
+    'python': lambda batch: perform_kernel_calculations(batch, kernel=_scenario_kernel),
+    'numba': lambda batch: perform_kernel_calculations(batch, kernel=_compiled_kernel),
+}
+
+
+@pytest.mark.parametrize('kernel', list(KERNELS))
+@pytest.mark.parametrize('mode', ['static', 'dynamic'])
+@pytest.mark.parametrize('user_pop_sizes', [None, [None, [100000, 1500000, 500000], None, None]])
+def test_kernel_matches_perform_calculations(scenarios, scenario_batch, kernel, mode, user_pop_sizes):
+    if kernel == 'numba' and _compiled_kernel is None:
+        pytest.skip('Numba is not installed')
+    cases = scenarios(200, mode, user_pop_sizes)
+    results = KERNELS[kernel](scenario_batch(cases))
+
+    for k, inputs in enumerate(cases):
+        expected = perform_calculations(inputs)
+        row = batch_results_row(results, k)
+        assert row == {key: expected[key] for key in row}
@@ -0,0 +1,36 @@
+import numpy as np
+
+from commodities import commodity_forecast, forecast_inventory, forecast_table, units_required
+from dashboard_helpers import perform_calculations
+from scenario_store import README_SCENARIOS, ScenarioStore
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+
+
+def test_stored_results_give_the_same_commodity_rows(tmp_path):
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    store.save('Scenario 3', INPUTS)
+    stored, fresh = store.find_results(INPUTS), perform_calculations(INPUTS)
+    commodities, demand = units_required(stored)
+    fresh_commodities, fresh_demand = units_required(fresh)
+    assert commodities == fresh_commodities
+    assert commodities[:2] == ['NET-EN vials', 'Syringes']
+    np.testing.assert_array_equal(demand, fresh_demand)
+    assert forecast_table(commodity_forecast(stored)).equals(forecast_table(commodity_forecast(fresh)))
+
+
+def test_units_required_from_users():
+    results = perform_calculations(INPUTS)
+    commodities, demand = units_required(results)
+    dmpsc = np.array(results['populations']['dmpsc'][1:], dtype=float)
+    np.testing.assert_allclose(demand[:, commodities.index('DMPA-SC devices')], np.repeat(dmpsc * 4 / 12, 12))
+    syringes = 6 * np.array(results['populations']['neten'][1:]) + 4 * np.array(results['populations']['dmpim'][1:])
+    np.testing.assert_allclose(demand[:, commodities.index('Syringes')], np.repeat(syringes / 12, 12))
+
+
+def test_min_max_orders_keep_stock_without_stockouts():
+    demand = np.full(24, 100.0)
+    forecast = forecast_inventory(demand, 600, min_months=3, max_months=6, lead_time_months=2, review_months=1)
+    assert forecast['stockouts'].sum() == 0
+    assert (forecast['closing_stock'] >= 0).all()
+    assert forecast['demand'].sum() == 2400
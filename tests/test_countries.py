@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from countries import SOUTH_AFRICA, country_results, country_row
+from dashboard_helpers import perform_calculations
+from scenario_store import README_SCENARIOS
+
+
+def test_country_matches_perform_calculations():
+    names, results = country_results([SOUTH_AFRICA, dict(SOUTH_AFRICA, country='Copy', exchange_rate=1)])
+    expected = perform_calculations(README_SCENARIOS['Scenario 3']['inputs'])
+    assert names == ['South Africa', 'Copy']
+    assert country_row(results['local'], 0)['populations'] == expected['populations']
+    np.testing.assert_allclose(country_row(results['usd'], 0)['total_costs'],
+                               np.array(expected['total_costs']) / SOUTH_AFRICA['exchange_rate'])
+    np.testing.assert_allclose(country_row(results['usd'], 1)['total_costs'], expected['total_costs'])
+
+
+@pytest.mark.parametrize('column, value', [('neten_start_pop', None), ('neten_start_pop', 'many'),
+                                           ('exchange_rate', 'x'), ('exchange_rate', 0), ('cost_per_visit', '')])
+def test_missing_required_values_are_rejected(column, value):
+    with pytest.raises(ValueError, match='Lesotho'):
+        country_results([SOUTH_AFRICA, dict(SOUTH_AFRICA, country='Lesotho', **{column: value})])
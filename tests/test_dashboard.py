@@ -0,0 +1,49 @@
+import pytest
+
+from scenario_store import README_SCENARIOS, ScenarioStore
+
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    # The app opens its scenario store in the working directory
+    monkeypatch.chdir(tmp_path)
+    import dashboard
+    monkeypatch.setattr(dashboard, 'scenario_store', ScenarioStore(str(tmp_path / 'scenarios.db')))
+    return dashboard
+
+
+def update_graph(dashboard, **values):
+    """Run the main callback on the form defaults, with some fields replaced (by component id)."""
+    callback = next(cb for key, cb in dashboard.app.callback_map.items() if 'price-curve-error' in key)
+    defaults = {component.id: getattr(component, 'value', None)
+                for component in dashboard.app.layout._traverse() if getattr(component, 'id', None)}
+    args = [values.get(state['id'], defaults[state['id']]) for state in callback['state']]
+    outputs = dashboard.update_graph(1, 0, *args)
+    return dict(zip(['figure', 'csv', 'table', 'columns'], outputs), error=outputs[-1])
+
+
+@pytest.mark.parametrize('volumes, prices, message', [
+    ('0, lots', '116, 105', 'comma-separated numbers'),
+    ('0, 250000', '116', 'one price per volume'),
+    ('250000, 0', '116, 105', 'must be increasing'),
+])
+def test_malformed_price_curve_is_reported(dashboard, volumes, prices, message):
+    outputs = update_graph(dashboard, **{'dmpsc-price-volumes': volumes, 'dmpsc-price-tiers': prices})
+    assert message in outputs['error']
+    # The flat product cost is used instead
+    assert 'DMPA-SC Unit Price' not in [column['id'] for column in outputs['columns']]
+
+
+def test_valid_price_curve_has_no_error(dashboard):
+    outputs = update_graph(dashboard, **{'dmpsc-price-volumes': '0, 250000', 'dmpsc-price-tiers': '116, 105'})
+    assert outputs['error'] is None
+    assert 'DMPA-SC Unit Price' in [column['id'] for column in outputs['columns']]
+    assert update_graph(dashboard)['error'] is None
+
+
+def test_scenario_comparison_takes_the_currency_of_the_inputs(dashboard):
+    inputs = README_SCENARIOS['Scenario 3']['inputs']
+    dashboard.scenario_store.save('Kenya', dict(inputs, currency='KES'))
+    dashboard.scenario_store.save('South Africa', inputs)
+    assert dashboard.compare_scenarios(1, ['Kenya']).layout.yaxis.title.text == 'Billions of KES'
+    assert dashboard.compare_scenarios(1, ['Kenya', 'South Africa']).layout.yaxis.title.text == 'Billions of KES / Rand'
@@ -0,0 +1,43 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scenario_store import ScenarioStore
+
+# Form defaults of dashboard_dynamic.py: start populations, (annual visit cost, product cost) per
+# method, conversion rates, population overrides and colours
+FORM = ([500000, 1700000, 0, 1974, 144, 1316, 63, 658, 116, 15.6, 35, 50, 65, 25, 35, 50, 65]
+        + [None] * 4 + [dict(hex=color) for color in ('#003f5c', '#7a5195', '#ef5675', '#ffa600')])
+
+
+@pytest.fixture
+def update_graph(tmp_path, monkeypatch):
+    # The app opens its scenario store in the working directory
+    monkeypatch.chdir(tmp_path)
+    import dashboard_dynamic
+    monkeypatch.setattr(dashboard_dynamic, 'scenario_store', ScenarioStore(str(tmp_path / 'scenarios.db')))
+    return dashboard_dynamic.update_graph
+
+
+def efficiency_bars(fig):
+    return next(trace for trace in fig.data if trace.name == 'Efficiency gain')
+
+
+def test_efficiency_gain_is_positive_when_dmpsc_saves(update_graph):
+    bars = efficiency_bars(update_graph(1, 0, *FORM)[0])
+    assert (np.array(bars.y[1:]) > 0).all()
+
+
+def test_efficiency_gain_keeps_its_sign_when_dmpsc_costs_more(update_graph):
+    # DMPA-SC at R2,000 a year costs more than the methods it replaces
+    form = list(FORM)
+    form[8] = 2000
+    fig, csv = update_graph(1, 1, *form)
+    bars = efficiency_bars(fig)
+    assert (np.array(bars.y[1:]) < 0).all()
+    assert list(bars.marker.color[1:]) == ['#9b2226'] * 4
+    table = pd.read_csv(io.StringIO(csv['content']))
+    np.testing.assert_allclose(table['Efficiency gain'], table['Total Baseline Costs'] - table['Total Costs'])
+    assert (table['Efficiency gain'][1:] < 0).all()
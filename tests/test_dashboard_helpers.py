@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from dashboard_helpers import (METHODS, NO_METHOD_PREGNANCY_RATE, outcome_series, perform_calculations, plot_data,
+                               prepare_combined_data, register_method)
+from method_engine import method_inputs
+from scenario_store import README_SCENARIOS, ScenarioStore
+
+
+def test_stored_results_give_the_same_table_and_plot_columns(tmp_path):
+    inputs = README_SCENARIOS['Scenario 3']['inputs']
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    store.save('Scenario 3', inputs)
+    stored = store.find_results(inputs)
+    fresh = perform_calculations(inputs)
+
+    assert list(stored['populations']) != list(fresh['populations'])
+    assert list(prepare_combined_data(stored, inputs).columns) == list(prepare_combined_data(fresh, inputs).columns)
+    assert list(plot_data(stored).columns) == list(plot_data(fresh).columns)
+    assert list(prepare_combined_data(fresh, inputs).columns)[:3] == ['Year', 'NET-EN + DMPA-IM Users', 'NET-EN Users']
+
+
+@pytest.fixture
+def implant():
+    register_method('implant', 'Implant', 1, 300, commodities={'Implants': 1}, cyp_per_user=2.5, failure_rate=0.001)
+    yield 'implant'
+    del METHODS['implant']
+
+
+def test_registered_method_runs_through_perform_calculations(implant):
+    inputs = method_inputs(README_SCENARIOS['Scenario 3']['inputs'])
+    inputs = dict(inputs, methods=['neten', 'dmpim', implant, 'dmpsc'],
+                  start_pops=dict(inputs['start_pops'], implant=200000),
+                  conv_rates=dict(inputs['conv_rates'], implant={'dmpsc': [5, 10, 15, 20]}))
+    results = perform_calculations(inputs)
+    assert set(results['populations']) == {'neten', 'dmpim', implant, 'dmpsc'}
+    assert results['populations'][implant][:2] == [200000, 190000]
+
+    table = prepare_combined_data(results, inputs)
+    # Columns follow the registry (display) order
+    assert list(table.columns[:6]) == ['Year', 'NET-EN + DMPA-IM + Implant Users', 'NET-EN Users',
+                                       'DMPA-IM Users', 'DMPA-SC Users', 'Implant Users']
+    assert 'Implant CYP' in table.columns
+    np.testing.assert_allclose(table['Implant CYP'], np.round(np.array(results['populations'][implant]) * 2.5, 2))
+    assert 'Implant Product' in plot_data(results).columns
+
+
+def assert_outcomes_add_up(results):
+    """Per-method CYP and pregnancies averted sum to the totals, which match users and costs."""
+    populations = {key: np.asarray(users, dtype=float) for key, users in results['populations'].items()}
+    cyp = {key: np.asarray(values) for key, values in results['cyp'].items()}
+    total_cyp = np.asarray(results['total_cyp'])
+    np.testing.assert_allclose(sum(cyp.values()), total_cyp, rtol=1e-12)
+    np.testing.assert_allclose(sum(np.asarray(v) for v in results['pregnancies_averted'].values()),
+                               results['total_pregnancies_averted'], rtol=1e-12)
+    expected = sum(populations[key] * METHODS[key]['cyp_per_user'] * METHODS[key]['continuation'] for key in populations)
+    np.testing.assert_allclose(total_cyp, expected, rtol=1e-12)
+    delivered = total_cyp > 0
+    np.testing.assert_allclose((np.asarray(results['total_cost_per_cyp']) * total_cyp)[delivered],
+                               np.asarray(results['total_costs'])[delivered], rtol=1e-9)
+    for key in cyp:
+        costs = np.asarray(results['costs'][f'{key}_visit']) + results['costs'][f'{key}_product']
+        np.testing.assert_allclose((np.asarray(results['cost_per_cyp'][key]) * cyp[key])[cyp[key] > 0],
+                                   costs[cyp[key] > 0], rtol=1e-9)
+
+
+@pytest.mark.parametrize('mode', ['static', 'dynamic'])
+def test_outcome_series_add_up_to_the_totals(scenarios, mode):
+    for inputs in scenarios(20, mode):
+        assert_outcomes_add_up(perform_calculations(inputs))
+
+
+def test_outcome_series_of_a_registered_method_add_up(implant):
+    inputs = method_inputs(README_SCENARIOS['Scenario 3']['inputs'])
+    inputs = dict(inputs, methods=['neten', 'dmpim', implant, 'dmpsc'],
+                  start_pops=dict(inputs['start_pops'], implant=200000),
+                  conv_rates=dict(inputs['conv_rates'], implant={'dmpsc': [5, 10, 15, 20]}))
+    results = perform_calculations(inputs)
+    assert_outcomes_add_up(results)
+    averted = np.asarray(results['pregnancies_averted'][implant])
+    np.testing.assert_allclose(averted, np.asarray(results['cyp'][implant]) * (NO_METHOD_PREGNANCY_RATE - 0.001))
+
+
+def test_outcome_series_broadcast_over_scenarios():
+    populations = {'neten': np.array([[10.0, 0.0], [5.0, 2.0]]), 'dmpsc': np.array([[0.0, 0.0], [1.0, 3.0]])}
+    costs = {f'{key}_{part}': users * 100 for key, users in populations.items() for part in ('visit', 'product')}
+    outcomes = outcome_series(populations, costs, sum(costs.values()))
+    np.testing.assert_array_equal(outcomes['total_cyp'], [[10.0, 0.0], [6.0, 5.0]])
+    # No CYP delivered, no cost per CYP
+    np.testing.assert_array_equal(outcomes['total_cost_per_cyp'], [[200.0, 0.0], [200.0, 200.0]])
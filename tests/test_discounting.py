@@ -0,0 +1,31 @@
+import numpy as np
+
+from batch_calculations import make_batch, perform_batch_calculations
+from dashboard_helpers import perform_calculations
+from discounting import adjustment_factors, apply_discounting
+from scenario_store import README_SCENARIOS
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+
+
+def test_adjustment_factors():
+    # Baseline and intervention year 1 at current prices, then one factor per year elapsed
+    np.testing.assert_allclose(adjustment_factors(0.03), [1, 1, 1 / 1.03, 1 / 1.03 ** 2, 1 / 1.03 ** 3])
+    np.testing.assert_allclose(adjustment_factors(0.03, 0.03), np.ones(5))
+    np.testing.assert_allclose(adjustment_factors([0, 0.05])[1], [1, 1, 1 / 1.05, 1 / 1.05 ** 2, 1 / 1.05 ** 3])
+
+
+def test_rate_zero_matches_undiscounted_totals():
+    results = perform_calculations(INPUTS)
+    present_value = apply_discounting(results)
+    for key in ('total_costs', 'baseline_costs', 'efficiency_gains'):
+        np.testing.assert_allclose(present_value[key], results[key], atol=1e-3)
+        np.testing.assert_allclose(present_value['cumulative'][key][-1], np.sum(results[key][1:]))
+
+
+def test_components_are_inflated_at_their_own_rate():
+    results = perform_batch_calculations(make_batch(INPUTS, 3))
+    present_value = apply_discounting(results, np.array([0.0, 0.03, 0.05]), {'product': 0.06})
+    factors = adjustment_factors(np.array([0.0, 0.03, 0.05]), 0.06)
+    np.testing.assert_allclose(present_value['costs']['dmpsc_product'], results['costs']['dmpsc_product'] * factors)
+    np.testing.assert_allclose(present_value['total_costs'], sum(present_value['costs'].values()))
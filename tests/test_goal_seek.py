@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from batch_calculations import PARAMETER_LABELS, cumulative_efficiency_gain, make_batch
+from goal_seek import goal_seek
+from scenario_store import README_SCENARIOS
+from sensitivity import sensitivity_table
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+
+# Inputs the efficiency gain is linear in, so the sensitivity break-even values are exact
+COST_PARAMETERS = ['cost_per_visit', 'neten_num_visits', 'neten_product_cost', 'dmpim_num_visits',
+                   'dmpim_product_cost', 'dmpsc_num_visits', 'dmpsc_product_cost', 'dmpsc_first_visit_multiplier']
+
+
+@pytest.mark.parametrize('user_pop_sizes', [None, [None, [100000, 1500000, 500000], None, None]])
+def test_break_even_matches_sensitivity_table(scenarios, user_pop_sizes):
+    # The sensitivity table is analytic for the static model only
+    for inputs in scenarios(20, 'static', user_pop_sizes):
+        table = sensitivity_table(inputs).set_index('Input')['Break-even Value']
+        for parameter in COST_PARAMETERS:
+            solution = goal_seek(inputs, parameter, 0.0, bounds=(0, 1e6))
+            expected = table[PARAMETER_LABELS[parameter]]
+            np.testing.assert_allclose(solution['value'][0], expected, rtol=1e-6, atol=1e-4)
+            assert solution['converged'][0] == np.isfinite(expected)
+
+
+def test_a_jump_over_the_target_is_not_converged():
+    # The metric jumps from -1e6 to 1e6 at the break-even cost, so no value meets ftol
+    step = lambda results: 1e6 * np.sign(cumulative_efficiency_gain(results))
+    smooth = goal_seek(INPUTS, 'dmpsc_product_cost', 0.0, bounds=(0, 1e6))
+    jump = goal_seek(INPUTS, 'dmpsc_product_cost', 0.0, bounds=(0, 1e6), metric=step)
+    assert smooth['converged'][0]
+    assert not jump['converged'][0]
+    assert abs(jump['residual'][0]) == 1e6
+    np.testing.assert_allclose(jump['value'][0], smooth['value'][0], rtol=1e-6)
+
+
+def test_grid_solves_every_target_for_every_scenario():
+    costs, targets = [200, 329, 400], np.array([-1e8, 0.0, 1e8])
+    batch = make_batch(INPUTS, len(costs), cost_per_visit=costs)
+    solution = goal_seek(None, 'dmpsc_product_cost', targets, bounds=(0, 1e6), batch=batch, grid=True)
+    assert solution['value'].shape == (len(costs), len(targets))
+    for row, cost in enumerate(costs):
+        pairwise = goal_seek(dict(INPUTS, cost_per_visit=cost), 'dmpsc_product_cost', targets, bounds=(0, 1e6))
+        np.testing.assert_allclose(solution['value'][row], pairwise['value'], rtol=1e-9)
+        assert solution['converged'][row].all() and pairwise['converged'].all()
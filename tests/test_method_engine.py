@@ -0,0 +1,56 @@
+import sys
+
+import numpy as np
+import pytest
+
+from dashboard_helpers import perform_calculations
+from method_engine import AGE_GROUPS, make_method_batch, method_inputs, perform_method_batch, perform_method_calculations
+from scenario_store import README_SCENARIOS
+
+
+@pytest.mark.parametrize('mode', ['static', 'dynamic'])
+@pytest.mark.parametrize('user_pop_sizes', [None, [None, [100000, 1500000, 500000], None, None]])
+def test_method_engine_matches_perform_calculations(scenarios, mode, user_pop_sizes):
+    for inputs in scenarios(100, mode, user_pop_sizes):
+        expected = perform_calculations(inputs)
+        results = perform_method_calculations(method_inputs(inputs))
+        assert results['populations'] == expected['populations']
+        for key in ('total_costs', 'baseline_costs', 'efficiency_gains'):
+            np.testing.assert_allclose(results[key], expected[key], rtol=1e-12, atol=1e-4)
+        for group in ('costs', 'baseline_component_costs'):
+            for key, values in expected[group].items():
+                np.testing.assert_allclose(results[group][key], values, rtol=1e-12, atol=1e-4)
+
+
+@pytest.mark.parametrize('mode', ['static', 'dynamic'])
+@pytest.mark.parametrize('dynamics', [{}, {'continuation_rates': {'neten': 80, 'dmpim': 70, 'dmpsc': 90},
+                                           'new_users': {'dmpsc': 10000}, 'growth_rates': 2}])
+def test_uniform_age_groups_match_unstratified(scenarios, mode, dynamics):
+    # Only truncation to whole users per age group separates the two
+    for inputs in scenarios(50, mode):
+        inputs = method_inputs(dict(inputs, **dynamics))
+        expected = perform_method_calculations(inputs)
+        results = perform_method_calculations(dict(inputs, age_groups=AGE_GROUPS))
+        for key, users in expected['populations'].items():
+            np.testing.assert_allclose(results['populations'][key], users, rtol=1e-4, atol=100)
+        for key in ('total_costs', 'baseline_costs'):
+            np.testing.assert_allclose(results[key], expected[key], rtol=1e-4, atol=1e5)
+
+
+@pytest.mark.parametrize('mode', ['static', 'dynamic'])
+def test_age_groups_add_no_operations(mode):
+    # Age groups widen the arrays of a single pass: the operations run do not depend on their number
+    def operations(age_groups):
+        batch = make_method_batch(dict(method_inputs(dict(README_SCENARIOS['Scenario 3']['inputs'], mode=mode)),
+                                       age_groups=age_groups), 1000)
+        calls = []
+        sys.setprofile(lambda frame, event, arg: calls.append(event) if event in ('call', 'c_call') else None)
+        try:
+            perform_method_batch(batch)
+        finally:
+            sys.setprofile(None)
+        return len(calls)
+
+    groups = list(AGE_GROUPS.items())
+    counts = {k: operations(dict(groups[:k])) for k in (1, 2, len(groups))}
+    assert len(set(counts.values())) == 1, counts
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from pareto import pareto_mask
+
+
+def brute_force_mask(objectives):
+    """Rows no other row dominates; of identical rows the first."""
+    mask = np.ones(len(objectives), dtype=bool)
+    for i, row in enumerate(objectives):
+        at_least = (objectives >= row).all(axis=1)
+        dominated = at_least & (objectives > row).any(axis=1)
+        mask[i] = not dominated.any() and not (at_least & (objectives == row).all(axis=1))[:i].any()
+    return mask
+
+
+@pytest.mark.parametrize('k', [2, 3])
+@pytest.mark.parametrize('block_size', [1, 7, 1024])
+def test_pareto_mask_matches_brute_force(k, block_size):
+    rng = np.random.default_rng(k)
+    for objectives in (rng.normal(size=(500, k)), rng.integers(0, 6, size=(500, k)).astype(float)):
+        np.testing.assert_array_equal(pareto_mask(objectives, block_size), brute_force_mask(objectives))
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from dashboard_helpers import perform_calculations
+from pricing import apply_price_curves, price_curve, product_costs
+from scenario_store import README_SCENARIOS
+
+
+@pytest.mark.parametrize('mode, start_pops', [('static', [552108, 1701061]), ('dynamic', [552108, 1701061, 20000])])
+def test_flat_curve_reproduces_flat_pricing(mode, start_pops):
+    inputs = dict(README_SCENARIOS['Scenario 3']['inputs'], mode=mode, start_pops=start_pops)
+    results = perform_calculations(inputs)
+    users = results['populations']['dmpsc']
+    curve = price_curve([0], [inputs['dmpsc_costs'][1]])
+    for baseline in (None, {'dmpsc': [users[0]] * len(users)}):
+        priced = apply_price_curves(results, {'dmpsc': curve}, product_costs(inputs), baseline)
+        for key in ('total_costs', 'baseline_costs', 'efficiency_gains'):
+            np.testing.assert_allclose(priced[key], results[key], atol=1e-3)
+
+
+def test_zero_flat_cost_needs_baseline_populations():
+    inputs = dict(README_SCENARIOS['Scenario 3']['inputs'], mode='dynamic', start_pops=[552108, 1701061, 20000],
+                  dmpsc_costs=[2, 0])
+    results = perform_calculations(inputs)
+    curve = price_curve([0, 1000000], [120, 100])
+    with pytest.raises(ValueError, match='baseline_populations'):
+        apply_price_curves(results, {'dmpsc': curve}, product_costs(inputs))
+    priced = apply_price_curves(results, {'dmpsc': curve}, product_costs(inputs), {'dmpsc': [20000] * 5})
+    np.testing.assert_allclose(priced['baseline_component_costs']['dmpsc_product'], 20000 * 120)
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from scipy.stats import norm
+
+from psa import (BLOCK_SIZE, adaptive_psa, compare_scenarios, cumulative_efficiency_gain, merge_psa_parts,
+                 psa_range, run_psa_parallel, split_draws)
+from scenario_store import README_SCENARIOS, ScenarioStore
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+
+
+def assert_same(actual, expected):
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            assert_same(actual[key], expected[key])
+    elif isinstance(expected, (str, list)) or expected is None:
+        assert actual == expected
+    else:
+        np.testing.assert_array_equal(np.broadcast_to(actual, np.shape(actual)), expected)
+
+
+@pytest.mark.parametrize('n_draws', [100, 5000, 10000])
+def test_split_draws_covers_every_draw_once(n_draws):
+    for n_parts in range(1, 9):
+        ranges = split_draws(n_draws, n_parts)
+        assert ranges[0][0] == 0 and ranges[-1][1] == n_draws
+        assert all(stop > start for start, stop in ranges)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+@pytest.mark.parametrize('n_draws', [100, 5000, 10000])
+def test_merged_parts_match_a_single_run(n_draws):
+    _, batch, results = psa_range(INPUTS, 7, 0, n_draws)
+    for n_parts in (1, 2, 3, 4, 8):
+        parts = [psa_range(INPUTS, 7, start, stop) for start, stop in split_draws(n_draws, n_parts)]
+        merged_batch, merged_results = merge_psa_parts(parts[::-1])
+        assert len(merged_results['total_costs']) == n_draws
+        assert_same(merged_batch, {key: np.broadcast_to(value, (n_draws,) + np.shape(value)[1:])
+                                   if isinstance(value, np.ndarray) else value for key, value in batch.items()})
+        assert_same(merged_results, results)
+
+
+@pytest.mark.parametrize('n_workers', [1, 2, 3, 4, 8])
+@pytest.mark.parametrize('n_draws', [100, 5000, 10000])
+def test_parallel_run_matches_a_single_run(n_workers, n_draws):
+    _, _, expected = psa_range(INPUTS, 7, 0, n_draws)
+    _, results = run_psa_parallel(INPUTS, n_draws, n_workers=n_workers, seed=7)
+    assert len(results['total_costs']) == n_draws
+    assert_same(results, expected)
+
+
+@pytest.fixture
+def stored_pair(tmp_path):
+    """Inputs and results of two README scenarios, loaded from a scenario store."""
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    store.seed_readme_scenarios()
+    return store.load('Scenario 2'), store.load('Scenario 3')
+
+
+@pytest.mark.parametrize('options', [{}, {'antithetic': True}, {'common_random_numbers': False}])
+def test_compare_stored_scenarios(stored_pair, options):
+    (inputs_a, results_a), (inputs_b, results_b) = stored_pair
+    comparison = compare_scenarios(inputs_a, inputs_b, 4000, seed=0, **options)
+    # Inputs vary symmetrically about the stored values and the gain is close
+    # to linear in them, so the mean difference centres on the stored one
+    stored = sum(results_b['efficiency_gains'][1:]) - sum(results_a['efficiency_gains'][1:])
+    assert abs(comparison['mean_difference'] - stored) < 4 * comparison['standard_error']
+    assert comparison['n_draws'] == 4000
+    if options.get('common_random_numbers', True):
+        assert comparison['variance_reduction'] > 2
+    else:
+        assert 0.5 < comparison['variance_reduction'] < 2
+    assert compare_scenarios(inputs_a, inputs_b, 4000, seed=0, **options) == comparison
+
+
+def test_antithetic_pairs_reduce_variance_further(stored_pair):
+    (inputs_a, _), (inputs_b, _) = stored_pair
+    common = compare_scenarios(inputs_a, inputs_b, 4000, seed=0)
+    antithetic = compare_scenarios(inputs_a, inputs_b, 4000, seed=0, antithetic=True)
+    assert antithetic['standard_error'] < common['standard_error']
+
+
+def checkpoints(stop, batch_size=BLOCK_SIZE):
+    """Draw counts at which adaptive_psa checks its precision, up to stop."""
+    sizes = [batch_size]
+    while sizes[-1] < stop:
+        sizes.append(sizes[-1] + max(batch_size, sizes[-1] // 4))
+    return sizes
+
+
+@pytest.mark.parametrize('relative_precision', [0.01, 0.003])
+def test_adaptive_psa_stops_once_precise(relative_precision):
+    run = adaptive_psa(INPUTS, relative_precision=relative_precision)
+    half_width = norm.ppf(0.975) * max(run['standard_error'], *run['quantile_standard_errors'].values())
+    assert run['converged'] and run['n_draws'] >= 4 * BLOCK_SIZE
+    assert half_width <= relative_precision * abs(run['mean'])
+    _, _, results = psa_range(INPUTS, 0, 0, run['n_draws'], None)
+    assert run['mean'] == pytest.approx(cumulative_efficiency_gain(results).mean(), rel=1e-12)
+
+    # It stopped at the first check past min_draws that met the precision
+    earlier = checkpoints(run['n_draws'])[-2]
+    if earlier >= 4 * BLOCK_SIZE:
+        shorter = adaptive_psa(INPUTS, relative_precision=relative_precision, max_draws=earlier)
+        assert shorter['n_draws'] == earlier and not shorter['converged']
+
+
+def test_adaptive_psa_absolute_precision_stops_at_min_draws():
+    run = adaptive_psa(INPUTS, precision=1e12, min_draws=2 * BLOCK_SIZE)
+    assert run['converged'] and run['n_draws'] == 2 * BLOCK_SIZE
+
+
+def test_adaptive_psa_respects_the_draw_cap():
+    run = adaptive_psa(INPUTS, relative_precision=1e-6, max_draws=3 * BLOCK_SIZE + 100)
+    assert run['n_draws'] == 3 * BLOCK_SIZE + 100
+    assert not run['converged']
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from psa import psa_range
+from psa_store import PSAStore, run_id, run_psa_to_store
+from scenario_store import README_SCENARIOS
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+
+
+def test_stores_are_kept_apart_by_dtype(tmp_path):
+    assert run_id(INPUTS, 100, None, 0) != run_id(INPUTS, 100, None, 0, 'float32')
+    double = run_psa_to_store(INPUTS, 100, seed=0, chunk_size=40, store_dir=str(tmp_path))
+    single = run_psa_to_store(INPUTS, 100, seed=0, chunk_size=40, store_dir=str(tmp_path), dtype='float32')
+    assert double.path != single.path
+    assert double.outputs.dtype == np.float64 and single.outputs.dtype == np.float32
+    assert double.complete and single.complete
+    np.testing.assert_allclose(single.outputs, double.outputs, rtol=1e-6)
+
+
+def test_concurrent_writers_fill_one_store(tmp_path):
+    _, _, expected = psa_range(INPUTS, 3, 0, 3000)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(run_psa_to_store, INPUTS, 3000, None, 3, 250, str(tmp_path)) for _ in range(2)]
+        paths = {future.result().path for future in futures}
+    assert len(paths) == 1
+    store = PSAStore(paths.pop())
+    assert store.complete and store.n_written == 3000
+    np.testing.assert_array_equal(store.series('total_costs'), expected['total_costs'])
+    np.testing.assert_array_equal(store.series('populations.dmpsc'), expected['populations']['dmpsc'])
+    assert os.listdir(tmp_path) == [os.path.basename(store.path)]
+
+
+def test_create_never_truncates_an_existing_store(tmp_path):
+    store = run_psa_to_store(INPUTS, 500, seed=0, chunk_size=200, store_dir=str(tmp_path))
+    written = np.array(store.outputs)
+    again = PSAStore.create(store.path, INPUTS, 500, store.meta['bounds'], 0, 200)
+    assert again.complete
+    np.testing.assert_array_equal(again.outputs, written)
+
+
+def test_interrupted_run_resumes_from_missing_chunks(tmp_path):
+    store = run_psa_to_store(INPUTS, 1000, seed=0, chunk_size=300, store_dir=str(tmp_path))
+    os.remove(os.path.join(store.path, 'done', '300-600'))
+    assert PSAStore(store.path).n_written == 300
+    resumed = run_psa_to_store(INPUTS, 1000, seed=0, chunk_size=300, store_dir=str(tmp_path))
+    assert resumed.complete
+    np.testing.assert_array_equal(resumed.outputs, store.outputs)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from quantiles import QuantileSketch
+
+QS = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+def sample(seed, n=20000):
+    """Draws for three cells: a normal, a skewed and a bounded distribution."""
+    rng = np.random.default_rng(seed)
+    return np.stack([rng.normal(size=n), rng.lognormal(size=n), rng.uniform(size=n)], axis=1).reshape(n, 3, 1)
+
+
+def rank_error(data, estimates):
+    """Largest gap between the requested and the empirical quantile of each estimate."""
+    flat = data.reshape(len(data), -1)
+    ranks = (flat[None] < estimates.reshape(len(QS), 1, -1)).mean(axis=1)
+    return np.abs(ranks - np.asarray(QS)[:, None]).max()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sketch_matches_exact_quantiles(seed):
+    data = sample(seed)
+    sketch = QuantileSketch((3, 1))
+    for chunk in np.array_split(data, 7):
+        sketch.update(chunk)
+    estimates = sketch.quantiles(QS)
+    assert estimates.shape == (len(QS), 3, 1)
+    assert sketch.count == len(data)
+    assert rank_error(data, estimates) < 0.005
+    assert np.allclose(estimates[:, 2], np.quantile(data[:, 2], QS, axis=0), atol=0.005)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_merged_sketches_match_a_single_sketch(seed):
+    data = sample(seed)
+    single = QuantileSketch((3, 1))
+    single.update(data)
+    parts = [QuantileSketch((3, 1)) for _ in range(4)]
+    for part, chunk in zip(parts, np.array_split(data, 4)):
+        part.update(chunk)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.count == single.count
+    assert np.array_equal(merged.min, single.min) and np.array_equal(merged.max, single.max)
+    assert rank_error(data, merged.quantiles(QS)) < 0.005
+    assert np.allclose(merged.quantiles(QS)[:, 2], single.quantiles(QS)[:, 2], atol=0.005)
+
+
+def test_merge_rejects_a_different_shape():
+    with pytest.raises(ValueError):
+        QuantileSketch((3, 1)).merge(QuantileSketch((2, 1)))
@@ -0,0 +1,27 @@
+import numpy as np
+
+from batch_calculations import make_batch, perform_batch_calculations
+from sampling import sobol_indices
+from scenario_store import README_SCENARIOS
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+# With populations fixed, the 4-year total cost is linear and additive in these inputs
+BOUNDS = {'cost_per_visit': (250, 400), 'neten_product_cost': (100, 200), 'dmpsc_product_cost': (50, 300)}
+
+
+def total_cost(results):
+    return np.asarray(results['total_costs'])[:, 1:].sum(axis=1)
+
+
+def test_sobol_indices_of_an_additive_model():
+    # Coefficients from unit steps; variance of a uniform input is (hi - lo)^2 / 12
+    variances = {}
+    for name, (lo, hi) in BOUNDS.items():
+        costs = total_cost(perform_batch_calculations(make_batch(INPUTS, 2, **{name: [lo, lo + 1]})))
+        step = costs[1] - costs[0]
+        variances[name] = step ** 2 * (hi - lo) ** 2 / 12
+    expected = np.array(list(variances.values())) / sum(variances.values())
+
+    indices = sobol_indices(INPUTS, 2 ** 13, BOUNDS, metric=total_cost, seed=0).set_index('Parameter')
+    np.testing.assert_allclose(indices.loc[list(BOUNDS), 'First-order Index'], expected, atol=0.02)
+    np.testing.assert_allclose(indices.loc[list(BOUNDS), 'Total-order Index'], expected, atol=0.02)
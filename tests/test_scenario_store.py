@@ -0,0 +1,52 @@
+import hashlib
+import sqlite3
+
+import numpy as np
+
+from dashboard_helpers import METHODS
+from scenario_store import (README_SCENARIOS, ScenarioStore, _DEFAULT_COST_INPUTS, _to_json, create_comparison_plot,
+                            inputs_hash)
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+
+
+def test_hash_compares_numbers_by_value():
+    as_ints = dict(INPUTS, start_pops=[552108, 1701061], cost_per_visit=329)
+    as_floats = dict(INPUTS, start_pops=[552108.0, 1701061.0], cost_per_visit=np.float64(329))
+    assert inputs_hash(as_ints) == inputs_hash(as_floats)
+    assert inputs_hash(as_ints) != inputs_hash(dict(INPUTS, cost_per_visit=330))
+    # Plot colours do not change the hash
+    assert inputs_hash(dict(as_ints, colors={'neten': '#000000'})) == inputs_hash(as_ints)
+
+
+def test_stored_results_are_found_for_equal_numbers(tmp_path):
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    store.save('Scenario 3', dict(INPUTS, cost_per_visit=329))
+    assert store.find_results(dict(INPUTS, cost_per_visit=329.0)) is not None
+    assert store.find_results(dict(INPUTS, cost_per_visit=330)) is None
+
+
+def test_hashes_of_older_stores_are_refreshed(tmp_path):
+    path = str(tmp_path / 'scenarios.db')
+    ScenarioStore(path).save('Scenario 3', INPUTS)
+    # Hash as written before numbers were compared by value
+    with sqlite3.connect(path) as conn:
+        conn.execute('UPDATE scenarios SET content_hash = ?', (hashlib.sha256(_to_json(INPUTS).encode()).hexdigest(),))
+    assert ScenarioStore(path).find_results(INPUTS) is not None
+
+
+def test_default_costs_follow_the_registry():
+    for key in ('neten', 'dmpim', 'dmpsc'):
+        assert _DEFAULT_COST_INPUTS[f'{key}_costs'] == [METHODS[key]['num_visits'], METHODS[key]['product_cost']]
+    assert _DEFAULT_COST_INPUTS['dmpsc_first_visit_multiplier'] == METHODS['dmpsc']['first_visit_multiplier']
+    assert INPUTS['dmpsc_costs'] == [2, 116]
+
+
+def test_comparison_plot_labels_the_currency(tmp_path):
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    store.save('Kenya', dict(INPUTS, currency='KES'))
+    inputs, results = store.load('Kenya')
+    assert inputs['currency'] == 'KES'
+    fig = create_comparison_plot({'Kenya': results}, currency=inputs['currency'])
+    assert fig.layout.yaxis.title.text == 'Billions of KES'
+    assert create_comparison_plot({'Kenya': results}).layout.yaxis.title.text == 'Billions of Rand'
@@ -0,0 +1,21 @@
+import numpy as np
+
+from scenario_store import README_SCENARIOS
+from uptake_optimizer import optimize_uptake
+
+RATE_COLUMNS = ['DMPA-IM to DMPA-SC Conversion (%)', 'NET-EN to DMPA-SC Conversion (%)']
+
+
+def test_schedules_are_non_decreasing_and_within_caps():
+    inputs = dict(README_SCENARIOS['Scenario 3']['inputs'], dmpsc_costs=[4, 800])
+    caps = {'Tight': [3.3e9, 3.2e9, 3.5e9, 3.3e9], 'Falling': [3.9e9, 3.8e9, 3.7e9, 3.6e9],
+            'Gap': [3.9e9, 2e9, 3.7e9, 3.6e9]}
+    schedule = optimize_uptake({name: inputs for name in caps}, caps)
+    for name, rows in schedule.groupby('Region'):
+        feasible = rows[rows['Feasible']]
+        assert (feasible['Total Cost'] <= feasible['Budget Cap']).all()
+        for column in RATE_COLUMNS:
+            assert (np.diff(feasible[column]) >= 0).all()
+            assert rows.loc[~rows['Feasible'], column].isna().all()
+    assert schedule.loc[schedule['Region'] == 'Gap', 'Feasible'].tolist() == [True, False, True, True]
+    assert not schedule.loc[schedule['Region'] == 'Tight', 'Feasible'].any()
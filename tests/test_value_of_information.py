@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from psa import evpi, evppi_binning, evppi_regression, run_psa, value_of_information
+from scenario_store import README_SCENARIOS
+
+
+def synthetic(seed, n=4000, decisions=2):
+    """Parameters (one of them constant) and net benefits that depend on the first two."""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(n, 4))
+    values[:, 2] = 5.0
+    incremental = 2 * values[:, :1] + values[:, 1:2] + rng.normal(size=(n, decisions - 1))
+    return values, np.column_stack([np.zeros(n), incremental])
+
+
+@pytest.mark.parametrize('estimator', [evppi_binning, evppi_regression])
+@pytest.mark.parametrize('decisions', [2, 3])
+def test_evppi_is_within_evpi_and_zero_for_a_constant(estimator, decisions):
+    for seed in range(5):
+        values, nb = synthetic(seed, decisions=decisions)
+        evppi = estimator(values, nb)
+        assert (evppi <= evpi(nb) + 1e-12).all()
+        assert (evppi >= -1e-12).all()
+        assert evppi[2] == pytest.approx(0, abs=1e-9)
+        assert evppi[0] > evppi[1] > evppi[3]
+
+
+@pytest.mark.parametrize('method', ['binning', 'regression'])
+def test_value_of_information_of_a_psa(method):
+    batch, results = run_psa(README_SCENARIOS['Scenario 3']['inputs'], 2000, seed=0)
+    table = value_of_information(batch, results, method=method)
+    assert np.isfinite(table.select_dtypes('number').to_numpy()).all()
+    information = table.set_index('Parameter')['Value of Information']
+    assert (information.drop('evpi') <= information['evpi'] + 1e-6).all()
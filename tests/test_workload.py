@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from dashboard_helpers import perform_calculations
+from scenario_store import README_SCENARIOS, ScenarioStore
+from workload import MINUTES_PER_FTE, facility_shares, facility_workload, visit_counts
+
+INPUTS = README_SCENARIOS['Scenario 3']['inputs']
+FACILITIES = pd.DataFrame({'Facility': ['A', 'B'], 'NET-EN Users': [300000, 252108],
+                           'DMPA-IM Users': [1000000, 701061], 'FTE Available': [500, 400]})
+
+
+def test_stored_results_give_the_same_visit_rows(tmp_path):
+    store = ScenarioStore(str(tmp_path / 'scenarios.db'))
+    store.save('Scenario 3', INPUTS)
+    stored, fresh = store.find_results(INPUTS), perform_calculations(INPUTS)
+    methods, visits, baseline_visits = visit_counts(stored, INPUTS['cost_per_visit'])
+    fresh_methods, fresh_visits, fresh_baseline_visits = visit_counts(fresh, INPUTS['cost_per_visit'])
+    assert methods == fresh_methods == ['neten', 'dmpim', 'dmpsc']
+    np.testing.assert_array_equal(visits, fresh_visits)
+    np.testing.assert_array_equal(baseline_visits, fresh_baseline_visits)
+
+
+def test_visits_include_the_longer_first_visit():
+    results = perform_calculations(INPUTS)
+    _, visits, _ = visit_counts(results, INPUTS['cost_per_visit'])
+    dmpsc = np.array(results['populations']['dmpsc'], dtype=float)
+    expected = dmpsc * INPUTS['dmpsc_costs'][0]
+    expected[1:] += dmpsc[1:] * (INPUTS['dmpsc_first_visit_multiplier'] - 1)
+    np.testing.assert_allclose(visits[2], expected)
+
+
+def test_facility_minutes_add_up_to_all_visits():
+    results = perform_calculations(INPUTS)
+    _, visits, _ = visit_counts(results, INPUTS['cost_per_visit'])
+    workload = facility_workload(results, INPUTS['cost_per_visit'], FACILITIES, minutes_per_visit=20)
+    np.testing.assert_allclose(workload['minutes'].sum(axis=0), 20 * visits.sum(axis=0))
+    np.testing.assert_allclose(workload['fte_required'], workload['minutes'] / MINUTES_PER_FTE)
+
+
+def test_facilities_without_users_share_equally():
+    facilities = FACILITIES.assign(**{'NET-EN Users': 0, 'DMPA-IM Users': 0})
+    shares = facility_shares(facilities, ['neten', 'dmpim', 'dmpsc'])
+    assert np.isfinite(shares).all()
+    np.testing.assert_allclose(shares, 0.5)
+    workload = facility_workload(perform_calculations(INPUTS), INPUTS['cost_per_visit'], facilities)
+    assert np.isfinite(workload['minutes']).all()
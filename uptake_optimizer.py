@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from batch_calculations import (PARAMETERS, DMPIM_CONV_RATES, NETEN_CONV_RATES, flatten_inputs, make_batch,
+                                neten_pop_sizes_array, perform_batch_calculations)
+from dashboard_helpers import YEARS, MANUAL_NETEN_POP_SIZES
+
+def unit_costs(batch):
+    """Annual cost per user of NET-EN, DMPA-IM and DMPA-SC (with the first visit multiplier), each (n,)."""
+    p = batch
+    neten = p['neten_num_visits'] * p['cost_per_visit'] + p['neten_product_cost']
+    dmpim = p['dmpim_num_visits'] * p['cost_per_visit'] + p['dmpim_product_cost']
+    dmpsc = (p['dmpsc_num_visits'] * p['cost_per_visit'] + p['dmpsc_product_cost']
+             + p['cost_per_visit'] * (p['dmpsc_first_visit_multiplier'] - 1))
+    return neten, dmpim, dmpsc
+
+def regions_batch(regions):
+    """One batch holding the static-mode inputs of every region (a dict of name: inputs)."""
+    flat = [flatten_inputs(inputs) for inputs in regions.values()]
+    overrides = {name: np.array([f[name] for f in flat], dtype=float) for name in PARAMETERS}
+    overrides['neten_pop_sizes'] = np.array([inputs.get('neten_pop_sizes') or MANUAL_NETEN_POP_SIZES
+                                             for inputs in regions.values()], dtype=float)
+    first = next(iter(regions.values()))
+    return make_batch(dict(first, mode='static', user_pop_sizes=None), len(regions), **overrides)
+
+def max_uptake_schedule(batch, budget_caps):
+    """Largest non-decreasing conversion rates (%) whose total cost stays within budget_caps (n, YEARS).
+
+    With populations fixed by the baseline (the static model) the cost of
+    each year is linear in the two conversion rates, so the problem is a
+    fractional knapsack per region and year: users whose switch saves money
+    all convert, then the cheaper-to-switch method converts as far as the
+    remaining budget allows, then the other. A margin of three users' cost
+    covers the truncation to whole users. Conversion rates must not fall
+    from one year to the next, so each year's rate is then capped by the
+    rates of the later years; lowering a rate whose switch costs money only
+    lowers that year's cost. Returns the two (n, YEARS) rate arrays and a
+    mask of region-years whose cap is below even the cheapest schedule,
+    whose rates are NaN.
+    """
+    n = len(batch['cost_per_visit'])
+    neten_cost, dmpim_cost, dmpsc_cost = (c[:, None] for c in unit_costs(batch))
+    dmpim_users = np.broadcast_to(batch['dmpim_start_pop'][:, None], (n, YEARS))
+    neten_users = np.where(batch['neten_start_pop'][:, None] > 0, neten_pop_sizes_array(batch, n), 0)
+
+    margin = 3 * np.maximum(np.maximum(neten_cost, dmpim_cost), dmpsc_cost)
+    room = budget_caps - margin - (dmpim_users * dmpim_cost + neten_users * neten_cost)
+    extra = {'dmpim': dmpsc_cost - dmpim_cost, 'neten': dmpsc_cost - neten_cost}
+    size = {'dmpim': dmpim_users, 'neten': neten_users}
+
+    # Switches that save money are made in full
+    converted = {k: np.where(extra[k] <= 0, size[k], 0.0) for k in extra}
+    room = room - sum(converted[k] * extra[k] for k in extra)
+    infeasible = room < 0
+
+    # Then the cheaper switch, then the dearer, as far as the budget allows
+    dmpim_first = extra['dmpim'] <= extra['neten']
+    for first in (True, False):
+        for k in extra:
+            take = (dmpim_first if k == 'dmpim' else ~dmpim_first) == first
+            with np.errstate(divide='ignore', invalid='ignore'):
+                affordable = np.clip(room / extra[k], 0, size[k])
+            add = np.where(take & (extra[k] > 0), affordable, 0.0)
+            converted[k] = converted[k] + add
+            room = room - add * np.where(extra[k] > 0, extra[k], 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dmpim_rates = np.where(dmpim_users > 0, converted['dmpim'] / dmpim_users * 100, 0.0)
+        neten_rates = np.where(neten_users > 0, converted['neten'] / neten_users * 100, 0.0)
+    return non_decreasing(dmpim_rates, infeasible), non_decreasing(neten_rates, infeasible), infeasible
+
+def non_decreasing(rates, infeasible):
+    """Rates (n, YEARS) capped by every later year's rate, with infeasible years NaN and ignored."""
+    rates = np.where(infeasible, np.nan, np.clip(rates, 0, 100))
+    return np.where(infeasible, np.nan, np.fmin.accumulate(rates[:, ::-1], axis=1)[:, ::-1])
+
+def optimize_uptake(regions, budget_caps):
+    """Fastest conversion schedules within per-year budget caps for several regions at once.
+
+    regions maps a name (e.g. 'National', then provinces) to its inputs;
+    give subnational regions their own yearly NET-EN populations in
+    inputs['neten_pop_sizes']. budget_caps maps each name to a cap in Rand
+    for every intervention year (a number or a list of YEARS numbers).
+    Manually defined population sizes are ignored, since they fix uptake. All
+    regions are solved together in one batch and the schedules checked with
+    the batched engine. Returns a DataFrame with one row per region and year;
+    years whose cap is below even the cheapest schedule are marked not
+    feasible, with NaN rates, users and cost.
+    """
+    batch = regions_batch(regions)
+    caps = np.array([np.broadcast_to(np.asarray(budget_caps[name], dtype=float), (YEARS,)) for name in regions])
+    dmpim_rates, neten_rates, infeasible = max_uptake_schedule(batch, caps)
+
+    # Static-mode years are independent, so infeasible years are evaluated at 0% and then blanked
+    batch.update({name: np.nan_to_num(dmpim_rates[:, i]) for i, name in enumerate(DMPIM_CONV_RATES)})
+    batch.update({name: np.nan_to_num(neten_rates[:, i]) for i, name in enumerate(NETEN_CONV_RATES)})
+    results = perform_batch_calculations(batch)
+    total_costs = np.where(infeasible, np.nan, results['total_costs'][:, 1:])
+    dmpsc_users = np.where(infeasible, np.nan, results['populations']['dmpsc'][:, 1:])
+
+    return pd.DataFrame({
+        'Region': np.repeat(list(regions), YEARS),
+        'Year': np.tile(np.arange(1, YEARS + 1), len(regions)),
+        'DMPA-IM to DMPA-SC Conversion (%)': dmpim_rates.ravel(),
+        'NET-EN to DMPA-SC Conversion (%)': neten_rates.ravel(),
+        'DMPA-SC Users': dmpsc_users.ravel(),
+        'Total Cost': total_costs.ravel(),
+        'Budget Cap': caps.ravel(),
+        'Feasible': ~infeasible.ravel(),
+        'Within Cap': (total_costs <= caps).ravel(),
+    })
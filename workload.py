@@ -0,0 +1,110 @@
+import base64
+import io
+
+import numpy as np
+import pandas as pd
+
+from dashboard_helpers import YEARS, METHODS, result_methods
+
+# Health-worker time: minutes per (standard length) visit and working minutes per FTE per year
+# (40-hour weeks, 44 working weeks after leave, training and public holidays)
+MINUTES_PER_VISIT = 20
+MINUTES_PER_FTE = 40 * 60 * 44
+
+def visit_counts(results, cost_per_visit):
+    """Visits per method and year, as standard-length visit equivalents, and the same for the baseline.
+
+    Visits are recovered from the visit costs, so they include the longer
+    first DMPA-SC visit (the first visit multiplier) and any changed number
+    of visits. Works on single and batched results; cost_per_visit may be
+    an (n,) array. Returns (methods, visits, baseline_visits), the arrays
+    (..., m, YEARS + 1).
+    """
+    methods = result_methods(results)
+    cost_per_visit = np.asarray(cost_per_visit, dtype=float)[..., None, None]
+    visit_costs = np.stack([np.asarray(results['costs'][f'{key}_visit'], dtype=float) for key in methods], axis=-2)
+    baseline_costs = np.stack([np.asarray(results['baseline_component_costs'][f'{key}_visit'], dtype=float)
+                               for key in methods], axis=-2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        visits = np.where(cost_per_visit > 0, visit_costs / cost_per_visit, 0)
+        baseline_visits = np.where(cost_per_visit > 0, baseline_costs / cost_per_visit, 0)
+    return methods, visits, baseline_visits
+
+def facility_shares(facilities, methods):
+    """Share of each method's users seen at each facility, (facilities, m).
+
+    facilities has a '{label} Users' column for some methods (e.g. 'NET-EN
+    Users'); users of a method without one (such as DMPA-SC before
+    introduction) are shared in proportion to all users of a facility. If
+    the table has no users at all, users are shared equally between
+    facilities.
+    """
+    columns = {key: f"{METHODS[key]['label']} Users" for key in methods}
+    available = [column for column in columns.values() if column in facilities]
+    if not available:
+        raise ValueError(f"The facility table needs at least one of the columns {', '.join(columns.values())}")
+    users = facilities[available].to_numpy(dtype=float)
+    total = users.sum()
+    all_users = np.divide(users.sum(axis=1), total, out=np.full(len(facilities), 1 / len(facilities)),
+                          where=total > 0)
+    shares = np.empty((len(facilities), len(methods)))
+    for j, key in enumerate(methods):
+        column = facilities[columns[key]].to_numpy(dtype=float) if columns[key] in facilities else None
+        shares[:, j] = column / column.sum() if column is not None and column.sum() > 0 else all_users
+    return shares
+
+def facility_workload(results, cost_per_visit, facilities, minutes_per_visit=MINUTES_PER_VISIT,
+                      minutes_per_fte=MINUTES_PER_FTE):
+    """Health-worker minutes and FTEs per facility and year, with capacity flags.
+
+    facilities is a table with one row per facility, its users per method
+    (see facility_shares) and the FTEs available for family planning in an
+    'FTE Available' column. minutes_per_visit is a number or a dict by
+    method. All facilities, methods and years (and scenarios of batched
+    results) are computed as arrays at once. Returns arrays
+    (..., facilities, YEARS + 1) of 'minutes', 'baseline_minutes',
+    'fte_required', 'fte_freed' and 'utilisation' (FTE required over
+    available), and 'over_capacity'.
+    """
+    methods, visits, baseline_visits = visit_counts(results, cost_per_visit)
+    if not isinstance(minutes_per_visit, dict):
+        minutes_per_visit = {key: minutes_per_visit for key in methods}
+    minutes_by_method = np.array([minutes_per_visit.get(key, MINUTES_PER_VISIT) for key in methods], dtype=float)
+    weights = facility_shares(facilities, methods) * minutes_by_method
+
+    minutes = weights @ visits
+    baseline_minutes = weights @ baseline_visits
+    fte_required = minutes / minutes_per_fte
+    fte_available = facilities['FTE Available'].to_numpy(dtype=float)[:, None]
+    utilisation = np.divide(fte_required, fte_available, out=np.where(fte_required > 0, np.inf, 0.0),
+                            where=fte_available > 0)
+    return {
+        'minutes': minutes,
+        'baseline_minutes': baseline_minutes,
+        'fte_required': fte_required,
+        'fte_freed': (baseline_minutes - minutes) / minutes_per_fte,
+        'utilisation': utilisation,
+        'over_capacity': utilisation > 1,
+    }
+
+def workload_table(facilities, workload, name_column='Facility'):
+    """One row per facility: FTEs available, and per intervention year the FTEs required and freed and utilisation."""
+    table = pd.DataFrame({
+        name_column: facilities[name_column] if name_column in facilities else np.arange(1, len(facilities) + 1),
+        'FTE Available': facilities['FTE Available'].to_numpy(dtype=float),
+        'Baseline FTE Required': workload['fte_required'][:, 0],
+    })
+    for year in range(1, YEARS + 1):
+        table[f'FTE Required Year {year}'] = workload['fte_required'][:, year]
+        table[f'FTE Freed Year {year}'] = workload['fte_freed'][:, year]
+        table[f'Utilisation Year {year} (%)'] = workload['utilisation'][:, year] * 100
+    table['Over Capacity'] = workload['over_capacity'][:, 1:].any(axis=1)
+    return table
+
+def parse_facility_table(contents, filename=''):
+    """Read an uploaded facility table (dcc.Upload contents of a CSV or Excel file) into a DataFrame."""
+    _, data = contents.split(',', 1)
+    raw = base64.b64decode(data)
+    if filename.lower().endswith(('.xls', '.xlsx')):
+        return pd.read_excel(io.BytesIO(raw))
+    return pd.read_csv(io.StringIO(raw.decode('utf-8')))